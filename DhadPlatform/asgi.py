@@ -5,6 +5,17 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+قناة الرسائل الفورية (messaging:conversation_stream) تعتمد على Server-Sent Events
+وتحتاج خادم ASGI حتى يبقى الاتصال مفتوحاً دون حجز عامل (worker) كامل، مثلاً:
+
+    gunicorn DhadPlatform.asgi:application -k uvicorn.workers.UvicornWorker
+
+تحت WSGI تعيد القناة 204 فتعود الواجهة تلقائياً إلى الاستطلاع الدوري.
+الناشر الافتراضي (messaging.pubsub.InProcessBroker) يدفع الرسائل فوراً داخل العملية نفسها فقط.
+مع عدة عمليات تصل رسالة حُفظت في عامل آخر عند نبضة keep-alive التالية عبر علامة المد
+في الكاش (messaging/watermarks.py)، فيجب أن يكون CACHE_URL مشتركاً (file أو redis)؛
+وللدفع الفوري بين العمليات اضبط MESSAGING_PUBSUB_BACKEND على ناشر مشترك.
 """
 
 import os
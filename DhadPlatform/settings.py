@@ -52,6 +52,7 @@ INSTALLED_APPS = [
     'payments',      # لإدارة الاشتراكات والدفع
     'contacts',
     'dashboard',
+    'jobs',          # طابور المهام الخلفية (البريد والإشعارات)
     
 ]
 
@@ -59,6 +60,7 @@ INSTALLED_APPS = [
 # هذه البرامج تقوم بمعالجة الطلبات والاستجابات
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware', # حماية أمنية
+    'core.middleware.QueryBudgetMiddleware', # عد الاستعلامات لكل طلب واكتشاف N+1 (قبل الجلسات حتى تُحسب استعلاماتها)
     'django.contrib.sessions.middleware.SessionMiddleware', # لإدارة جلسات المستخدمين
     'django.middleware.common.CommonMiddleware', # إعدادات عامة للطلبات/الاستجابات
     'django.middleware.csrf.CsrfViewMiddleware', # حماية ضد هجمات CSRF
@@ -82,6 +84,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'messaging.context_processors.unread_messages', # عدد الرسائل غير المقروءة في الشريط العلوي
             ],
         },
     },
@@ -194,4 +197,74 @@ PLACEMENT_TEST_THRESHOLDS = {
     'beginner_max_score': 39,      # أي درجة أقل من أو تساوي 39 = مبتدئ
     'intermediate_max_score': 79,  # أي درجة بين 40 و 79 = متوسط
     # أعلى من 79 = متقدم
-}
\ No newline at end of file
+}
+
+# تجهيز حسابات الطلاب عند الموافقة على طلبات التسجيل (core/provisioning.py):
+# 'activation' يرسل رابط تفعيل لمرة واحدة (صالح لمدة PASSWORD_RESET_TIMEOUT) ولا يشفّر شيئاً وقت الموافقة،
+# و'password' يولد كلمة مرور لكل حساب ويشفّرها عامل المهام عند إرسال البريد.
+ACCOUNT_PROVISIONING_MODE = config('ACCOUNT_PROVISIONING_MODE', default='activation')
+# عدد العمليات لتشفير كلمات المرور دفعة واحدة في أوامر الإدارة (None = عدد أنوية المعالج)
+PROVISIONING_HASH_WORKERS = config('PROVISIONING_HASH_WORKERS', default=None, cast=lambda value: int(value) if value else None)
+
+# ==============================================================================
+# البريد الإلكتروني والمهام الخلفية
+# ==============================================================================
+
+# يُرسل البريد من عامل المهام (python manage.py run_jobs) وليس أثناء الطلب.
+# للتجربة محلياً: EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend مع EMAIL_FILE_PATH،
+# أو django.core.mail.backends.locmem.EmailBackend / console.EmailBackend.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=os.path.join(BASE_DIR, 'sent_emails'))
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=30, cast=int)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='webmaster@localhost')
+
+JOBS_MAX_ATTEMPTS = 5             # عدد المحاولات قبل نقل المهمة إلى "فشلت نهائياً"
+JOBS_BACKOFF_BASE_SECONDS = 30    # تأخير المحاولة الثانية، ويتضاعف مع كل فشل
+JOBS_BACKOFF_MAX_SECONDS = 60 * 60
+JOBS_LOCK_TIMEOUT_SECONDS = 10 * 60  # بعدها تُعتبر المهمة "قيد التنفيذ" عالقة ويعاد حجزها
+
+# ==============================================================================
+# الكاش (core/cache.py)
+# ==============================================================================
+
+# CACHE_URL يحدد الخادم: locmem:// (الافتراضي، ذاكرة العملية)، أو file:///var/tmp/dhad_cache،
+# أو redis://localhost:6379/1 (أي خادم متوافق مع Redis، ويتطلب حزمة redis).
+# في بيئة الإنتاج مع أكثر من عامل يجب استخدام file أو redis حتى يُشارك الكاش ويعمل الإبطال بين العمليات.
+# الاختبارات تفرض ذاكرة العملية عبر core.testing.DhadTestCase.
+CACHE_URL = config('CACHE_URL', default='locmem://')
+
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    _cache_backend, _cache_location = 'django.core.cache.backends.redis.RedisCache', CACHE_URL
+elif CACHE_URL.startswith('file://'):
+    _cache_backend, _cache_location = 'django.core.cache.backends.filebased.FileBasedCache', CACHE_URL[len('file://'):]
+else:
+    _cache_backend, _cache_location = 'django.core.cache.backends.locmem.LocMemCache', 'dhad'
+
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backend,
+        'LOCATION': _cache_location,
+        'KEY_PREFIX': 'dhad',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000} if _cache_backend.endswith('LocMemCache') else {},
+    }
+}
+
+# مدة تخزين الصفحات العامة (الرئيسية، عن المنصة، اتصل بنا) للزوار غير المسجلين؛ 0 لتعطيل التخزين
+PUBLIC_PAGE_CACHE_SECONDS = config('PUBLIC_PAGE_CACHE_SECONDS', default=600, cast=int)
+# رمز اختياري لقراءة /metrics/cache/ من أداة المراقبة (ترويسة Authorization: Bearer <الرمز>)؛ المشرفون يقرؤونها دائماً
+CACHE_METRICS_TOKEN = config('CACHE_METRICS_TOKEN', default='')
+
+# ==============================================================================
+# ميزانية الاستعلامات (core/middleware.py)
+# ==============================================================================
+
+# شكل SQL يتكرر هذا العدد من المرات في طلب واحد يُسجَّل كـ N+1 محتمل (المسجل core.queries)
+QUERY_BUDGET_REPEAT_THRESHOLD = config('QUERY_BUDGET_REPEAT_THRESHOLD', default=5, cast=int)
+# تجاوز @query_budget يُسجَّل فقط في التطوير والإنتاج؛ الاختبارات (core.testing.DhadTestCase) تفعّل الرفع
+QUERY_BUDGET_RAISE = config('QUERY_BUDGET_RAISE', default=False, cast=bool)
@@ -1,10 +1,17 @@
-from django.contrib import admin
+import io
+
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import render
 from django.utils.html import format_html # لاستخدام HTML في list_display
-from django.urls import reverse
+from django.urls import path, reverse
+from dashboard.exports import EXPORTS, export_actions
+from .forms import CSVImportForm
+from .imports import ImportFileError, import_csv, permitted_kinds
 from .models import (
     Program, Course, Class, Lesson, EducationalFile,
     Assignment, Submission,
-    Test, Question, Option, TestResult
+    Test, Question, Option, TestResult, StudentCourseProgress
 )
 
 # 1. تكوين عرض نموذج Program في لوحة الإدارة
@@ -28,10 +35,48 @@ class ClassAdmin(admin.ModelAdmin):
     date_hierarchy = 'start_time' # للتنقل الزمني حسب تاريخ البدء
     filter_horizontal = ('students',) # لجعل اختيار الطلاب أسهل في شاشة الإضافة/التعديل
     autocomplete_fields = ['course', 'teacher'] # لتحسين البحث عن المادة والمعلم
+    change_list_template = 'admin/academic/class/change_list.html' # زر استيراد CSV
+
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_csv_view), name='academic_class_import_csv'),
+        ]
+        return urls + super().get_urls()
+
+    def import_csv_view(self, request):
+        # استيراد المستخدمين والحلقات والتسجيل من ملفات CSV (انظر academic/imports.py)
+        # لكل نوع صلاحيته: core.add_user للمستخدمين، وacademic.add_class للحلقات، وacademic.change_class للتسجيل
+        kinds = permitted_kinds(request.user)
+        if not kinds:
+            raise PermissionDenied
+        result = None
+        form = CSVImportForm(request.POST or None, request.FILES or None, kinds=kinds)
+        if request.method == 'POST' and form.is_valid():
+            stream = io.TextIOWrapper(form.cleaned_data['csv_file'].file, encoding='utf-8-sig', newline='')
+            try:
+                result = import_csv(
+                    form.cleaned_data['kind'], stream, dry_run=form.cleaned_data['dry_run'],
+                    site_url=request.build_absolute_uri('/').rstrip('/'), user=request.user,
+                )
+            except (ImportFileError, UnicodeDecodeError) as e:
+                messages.error(request, f'تعذر قراءة الملف: {e}')
+            else:
+                level = messages.WARNING if result.errors else messages.SUCCESS
+                verb = 'صالح للإضافة' if result.dry_run else 'تمت إضافته'
+                messages.add_message(request, level, f'{result.created} من {result.rows} صف {verb}، و{len(result.errors)} صف فيه أخطاء.')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'استيراد من ملف CSV',
+            'form': form,
+            'result': result,
+        }
+        return render(request, 'admin/academic/class/import_csv.html', context)
 
     def current_students_count(self, obj):
-        return obj.students.count()
+        return obj.enrolled_count
     current_students_count.short_description = 'عدد الطلاب الحاليين'
+    current_students_count.admin_order_field = 'enrolled_count'
 
     def available_slots(self, obj):
         return obj.available_slots()
@@ -173,6 +218,7 @@ class TestResultAdmin(admin.ModelAdmin):
     readonly_fields = ('end_time',) # 'answers' لا يوجد في النموذج
     list_editable = ('status', 'score',) # للسماح بتعديل الحالة والدرجة مباشرة
     autocomplete_fields = ['test', 'student'] # لتحسين البحث عن الاختبار والطالب
+    actions = export_actions(EXPORTS['test_results'])
 
 
 # -----------------------------------------------------------------------------
@@ -188,4 +234,15 @@ admin.site.register(Submission, SubmissionAdmin)
 admin.site.register(Test, TestAdmin)
 admin.site.register(Question, QuestionAdmin)
 admin.site.register(Option, OptionAdmin)
-admin.site.register(TestResult, TestResultAdmin)
\ No newline at end of file
+admin.site.register(TestResult, TestResultAdmin)
+
+# 14. عرض جدول تقدم الطلاب المجمع (للقراءة فقط، يُحدّث تلقائياً)
+class StudentCourseProgressAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'completed_lessons', 'total_lessons', 'test_score_sum', 'test_max_sum', 'updated_at')
+    search_fields = ('student__username', 'course__name')
+    list_filter = ('course',)
+    list_select_related = ('student', 'course')
+    readonly_fields = ('student', 'course', 'total_lessons', 'completed_lessons', 'test_score_sum', 'test_max_sum', 'updated_at')
+
+
+admin.site.register(StudentCourseProgress, StudentCourseProgressAdmin)
@@ -0,0 +1,194 @@
+# academic/allocation.py
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from core.models import User
+from . import progress
+from .notifications import notify_class_assignment
+from .models import Class, Course
+
+# عدد المحاولات قبل الاستسلام إذا امتلأت الحلقة المختارة بسبب طلب متزامن
+MAX_ALLOCATION_ATTEMPTS = 5
+
+
+def get_placement_course():
+    """
+    المادة الأساسية لاختبار تحديد المستوى: حسب ARABIC_PLACEMENT_COURSE_ID في الإعدادات،
+    وإلا أول مادة معلمة بـ is_placement_course.
+    """
+    course_id = getattr(settings, 'ARABIC_PLACEMENT_COURSE_ID', None)
+    if course_id:
+        course = Course.objects.filter(id=course_id).first()
+        if course:
+            return course
+    return Course.objects.filter(is_placement_course=True).first()
+
+
+def _enrolled_subquery():
+    through = Class.students.through.objects.filter(class_id=OuterRef('pk'))
+    return Coalesce(
+        Subquery(through.order_by().values('class_id').annotate(n=Count('*')).values('n')[:1]),
+        0,
+    )
+
+
+def reconcile_enrolled_counts(class_ids=None):
+    """
+    يعيد حساب enrolled_count من جدول الربط الفعلي بعبارة UPDATE واحدة لإصلاح أي انحراف.
+    يرجع قائمة (class_id, القيمة القديمة, القيمة الصحيحة) للحلقات التي كانت منحرفة.
+    """
+    classes = Class.objects.all()
+    if class_ids is not None:
+        classes = classes.filter(id__in=class_ids)
+    drift = [
+        (class_id, stored, actual)
+        for class_id, stored, actual in classes.annotate(actual=_enrolled_subquery())
+        .values_list('id', 'enrolled_count', 'actual')
+        if stored != actual
+    ]
+    if drift:
+        Class.objects.filter(id__in=[class_id for class_id, _, _ in drift]).update(enrolled_count=_enrolled_subquery())
+    return drift
+
+
+def enroll_students(cls, student_ids):
+    """
+    يضيف الطلاب إلى جدول الربط مباشرة (بعد حجز المقاعد في enrolled_count)،
+    وينشئ صفوف التقدم وإشعارات التسجيل يدوياً لأن bulk_create لا يطلق m2m_changed.
+    """
+    Through = Class.students.through
+    Through.objects.bulk_create(
+        [Through(class_id=cls.id, user_id=student_id) for student_id in student_ids],
+        ignore_conflicts=True,
+    )
+    progress.ensure_progress_rows({(student_id, cls.course_id) for student_id in student_ids})
+    notify_class_assignment(cls, student_ids)
+
+
+def available_classes(course, levels, now=None):
+    """
+    الحلقات المستقبلية في المادة التي تطابق أحد المستويات (أو 'any') وفيها مقاعد شاغرة،
+    مع نسبة الامتلاء محسوبة من العمود enrolled_count.
+    """
+    now = now or timezone.now()
+    return (
+        Class.objects.filter(
+            course=course,
+            required_arabic_level__in=list(levels) + ['any'],
+            start_time__gt=now,
+            capacity__gt=0,
+        )
+        .filter(enrolled_count__lt=F('capacity'))
+        .annotate(fill_ratio=Cast(F('enrolled_count'), FloatField()) / Cast(F('capacity'), FloatField()))
+    )
+
+
+def allocate_seat(student, level, course=None):
+    """
+    يختار للطالب مقعداً في الحلقة الأقل امتلاءً (ثم الأقرب موعداً) ويسجله فيها.
+    يتم حجز المقعد بعبارة UPDATE مشروطة على enrolled_count < capacity،
+    فلا يمكن لطالبين متزامنين أن يحجزا المقعد الأخير نفسه.
+    يرجع الحلقة أو None إذا لم تتوفر حلقة مناسبة.
+    """
+    course = course or get_placement_course()
+    if course is None:
+        return None
+
+    for _ in range(MAX_ALLOCATION_ATTEMPTS):
+        with transaction.atomic():
+            candidate = (
+                available_classes(course, [level])
+                .exclude(students=student)
+                .select_related('course', 'teacher')
+                .order_by('fill_ratio', 'start_time', 'id')
+                .first()
+            )
+            if candidate is None:
+                return None
+
+            # حجز المقعد بعداد ذري: ينجح فقط إذا بقي مقعد شاغر لحظة التنفيذ
+            reserved = Class.objects.filter(pk=candidate.pk, enrolled_count__lt=F('capacity')).update(
+                enrolled_count=F('enrolled_count') + 1
+            )
+            if not reserved:
+                # امتلأت الحلقة بسبب طلب متزامن؛ نعيد المحاولة مع الحلقة التالية
+                continue
+
+            enroll_students(candidate, [student.id])
+            candidate.enrolled_count += 1
+            return candidate
+    return None
+
+
+def allocate_backlog(course=None, dry_run=False):
+    """
+    يوزع دفعة واحدة جميع الطلاب المجمدين الذين حُدد مستواهم ولم يُسجلوا بعد في حلقة.
+    التوزيع عادل: كل طالب يذهب للحلقة الأقل امتلاءً، ثم للمعلم الأقل حصولاً على طلاب
+    في هذه الدفعة، ثم للموعد الأقرب.
+    يرجع (assignments, unassigned) حيث assignments قائمة (student, class).
+    """
+    course = course or get_placement_course()
+    if course is None:
+        return [], []
+
+    with transaction.atomic():
+        students = list(
+            User.objects.filter(role='student', is_active=False)
+            .exclude(determined_arabic_level__in=['unassigned', ''])
+            .exclude(determined_arabic_level__isnull=True)
+            .exclude(enrolled_classes__course=course)
+            .order_by('date_joined', 'id')
+        )
+        if not students:
+            return [], []
+
+        levels = {student.determined_arabic_level for student in students}
+        classes = list(
+            available_classes(course, levels)
+            .select_for_update(of=('self',))
+            .select_related('course', 'teacher')
+            .order_by('start_time', 'id')
+        )
+        enrolled = {cls.id: cls.enrolled_count for cls in classes}
+        teacher_load = {}
+
+        assignments = []
+        unassigned = []
+        for student in students:
+            candidates = [
+                cls for cls in classes
+                if cls.required_arabic_level in (student.determined_arabic_level, 'any')
+                and enrolled[cls.id] < cls.capacity
+            ]
+            if not candidates:
+                unassigned.append(student)
+                continue
+
+            chosen = min(candidates, key=lambda cls: (
+                enrolled[cls.id] / cls.capacity,
+                teacher_load.get(cls.teacher_id, 0),
+                cls.start_time,
+                cls.id,
+            ))
+            enrolled[chosen.id] += 1
+            teacher_load[chosen.teacher_id] = teacher_load.get(chosen.teacher_id, 0) + 1
+            assignments.append((student, chosen))
+
+        if dry_run or not assignments:
+            return assignments, unassigned
+
+        # إدخال جماعي في جدول الربط لكل حلقة، ثم تفعيل الطلاب بعبارة UPDATE واحدة
+        students_by_class = {}
+        for student, cls in assignments:
+            students_by_class.setdefault(cls, []).append(student.id)
+        for cls, student_ids in students_by_class.items():
+            Class.objects.filter(pk=cls.pk).update(enrolled_count=F('enrolled_count') + len(student_ids))
+            enroll_students(cls, student_ids)
+        User.objects.filter(id__in=[student.id for student, _ in assignments]).update(is_active=True)
+
+    return assignments, unassigned
+
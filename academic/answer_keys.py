@@ -0,0 +1,68 @@
+# academic/answer_keys.py
+
+from core.cache import bump_namespace, get_or_compute, versioned_key
+from .models import Question
+
+# يُرفع هذا الرقم عند تغيير شكل مفتاح الإجابات المخزن حتى لا تُقرأ نسخ قديمة من الكاش
+ANSWER_KEY_SCHEMA = 1
+ANSWER_KEY_TIMEOUT = 60 * 60 * 24
+
+
+def _answer_key_namespace(test_id):
+    return f'academic:answer_key:{test_id}'
+
+
+def invalidate_answer_key(test_id):
+    """يرفع إصدار مفتاح الإجابات للاختبار، فتُهمل النسخة المخزنة تلقائياً."""
+    bump_namespace(_answer_key_namespace(test_id))
+
+
+def compile_answer_key(test_id):
+    """
+    يبني مفتاح الإجابات للاختبار باستعلامين فقط (الأسئلة + prefetch للخيارات):
+    {question_id: {'type', 'points', 'options', 'option_ids', 'correct_option_ids', 'correct_texts'}}
+    """
+    answer_key = {}
+    for question in Question.objects.filter(test_id=test_id).prefetch_related('options'):
+        options = sorted(question.options.all(), key=lambda option: option.id)
+        answer_key[question.id] = {
+            'type': question.question_type,
+            'points': question.score_points,
+            'options': [(option.id, option.text) for option in options],
+            'option_ids': frozenset(option.id for option in options),
+            'correct_option_ids': frozenset(option.id for option in options if option.is_correct),
+            'correct_texts': frozenset(option.text for option in options if option.is_correct),
+        }
+    return answer_key
+
+
+def get_answer_key(test_id):
+    cache_key = versioned_key(_answer_key_namespace(test_id), ANSWER_KEY_SCHEMA)
+    return get_or_compute(cache_key, lambda: compile_answer_key(test_id), ANSWER_KEY_TIMEOUT, 'academic:answer_key')
+
+
+def grade_answer(entry, answer_value):
+    """
+    يصحح إجابة واحدة من الذاكرة.
+    يرجع (is_correct, selected_option_id, short_answer_text).
+    """
+    if entry['type'] == 'multiple_choice':
+        try:
+            option_id = int(answer_value)
+        except (TypeError, ValueError):
+            return False, None, None
+        if option_id not in entry['option_ids']:
+            return False, None, None
+        return option_id in entry['correct_option_ids'], option_id, None
+
+    if entry['type'] == 'true_false':
+        # يفترض أن الخيار الصحيح مخزن بالنص 'True' أو 'False'
+        return answer_value in entry['correct_texts'], None, None
+
+    # الإجابات القصيرة تحتاج تصحيحاً يدوياً من المعلم
+    return False, None, answer_value
+
+
+def max_auto_graded_score(answer_key):
+    """مجموع نقاط الأسئلة القابلة للتصحيح الآلي (دون الإجابات القصيرة)."""
+    return sum(entry['points'] for entry in answer_key.values() if entry['type'] != 'short_answer')
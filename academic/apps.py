@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class AcademicConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'academic'
+
+    def ready(self):
+        from core.cache import invalidate_on_change
+        from . import signals  # noqa: F401 تسجيل الإشارات
+        from .models import Test
+        from .placement import PLACEMENT_GRAPH_NAMESPACE
+
+        # رسم توجيه اختبارات تحديد المستوى يُبنى من جدول الاختبارات كله
+        invalidate_on_change(PLACEMENT_GRAPH_NAMESPACE, Test)
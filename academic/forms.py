@@ -1,7 +1,9 @@
 # academic/forms.py
 
 from django import forms
-from .models import Submission, Question, Option, TestResult, StudentAnswer # استيراد نماذج الاختبارات
+from django.db import transaction
+from .models import Submission, StudentAnswer # استيراد نماذج الاختبارات
+from .answer_keys import get_answer_key, grade_answer
 from collections import OrderedDict # للحفاظ على ترتيب حقول النموذج
 from django.utils import timezone # Add this import for timezone.now()
 
@@ -26,6 +28,10 @@ class BaseTestForm(forms.Form):
         # FIX: Pop 'test_result_instance' as it's passed from the view
         self.test_result_instance = kwargs.pop('test_result_instance', None)
         self.test_instance_id = kwargs.pop('test_instance_id', None) # Assuming you still want this, though test_result_instance has the test
+        # مفتاح الإجابات المجمع (من الكاش) يغني عن استعلامات الخيارات لكل سؤال
+        self.answer_key = kwargs.pop('answer_key', None)
+        if self.answer_key is None and self.test_result_instance is not None:
+            self.answer_key = get_answer_key(self.test_result_instance.test_id)
 
         # 2. Call the parent constructor with the remaining args/kwargs
         super().__init__(*args, **kwargs)
@@ -36,7 +42,8 @@ class BaseTestForm(forms.Form):
         for q in self.questions:
             field_name = f'question_{q.id}'
             if q.question_type == 'multiple_choice':
-                choices = [(str(option.id), option.text) for option in q.options.all()]
+                entry = (self.answer_key or {}).get(q.id, {'options': []})
+                choices = [(str(option_id), option_text) for option_id, option_text in entry['options']]
                 self.fields[field_name] = forms.ChoiceField(
                     label=q.text,
                     choices=choices,
@@ -81,34 +88,19 @@ class BaseTestForm(forms.Form):
             answer_value = cleaned_data.get(field_name)
 
             if answer_value is not None:
-                is_correct = False
-                selected_option = None
-                short_answer_text = None
-
-                if q.question_type == 'multiple_choice':
-                    try:
-                        selected_option = Option.objects.get(id=int(answer_value))
-                        if selected_option.is_correct:
-                            is_correct = True
-                            self.score += q.score_points
-                    except (ValueError, Option.DoesNotExist):
-                        is_correct = False # Option not found or invalid
-                elif q.question_type == 'true_false':
-                    # Assuming 'True'/'False' strings are stored in Option.text for correct option
-                    if (answer_value == 'True' and q.options.filter(is_correct=True, text='True').exists()) or \
-                       (answer_value == 'False' and q.options.filter(is_correct=True, text='False').exists()):
-                        is_correct = True
-                        self.score += q.score_points
-                elif q.question_type == 'short_answer':
-                    short_answer_text = answer_value
-                    # For short answers, 'is_correct' is usually determined manually by a teacher.
-                    # You might set it to False by default or based on some predefined keywords.
-                    is_correct = False # Default, requires manual grading or advanced logic
+                # التصحيح يتم بالكامل من الذاكرة عبر مفتاح الإجابات
+                entry = self.answer_key.get(q.id)
+                if entry is None:
+                    is_correct, selected_option_id, short_answer_text = False, None, None
+                else:
+                    is_correct, selected_option_id, short_answer_text = grade_answer(entry, answer_value)
+                if is_correct:
+                    self.score += entry['points']
 
                 # Store data to create StudentAnswer instances later
                 self.student_answers_data.append({
                     'question': q,
-                    'selected_option': selected_option,
+                    'selected_option_id': selected_option_id,
                     'short_answer_text': short_answer_text,
                     'is_correct': is_correct,
                 })
@@ -129,19 +121,26 @@ class BaseTestForm(forms.Form):
         if not self.test_result_instance:
             raise ValueError("TestResult instance is not set for this form.")
 
-        # Clear existing answers for this test result if resubmission is allowed or to prevent duplicates
-        # For a first submission, this won't do anything. For re-attempts, it might be relevant.
-        self.test_result_instance.student_answers_detail.all().delete()
+        # جميع الكتابات في معاملة واحدة: إما أن تُحفظ مجموعة الإجابات كاملة أو لا شيء
+        with transaction.atomic():
+            # Clear existing answers for this test result if resubmission is allowed or to prevent duplicates
+            # For a first submission, this won't do anything. For re-attempts, it might be relevant.
+            self.test_result_instance.student_answers_detail.all().delete()
+
+            StudentAnswer.objects.bulk_create([
+                StudentAnswer(
+                    test_result=self.test_result_instance,
+                    question=answer_data['question'],
+                    selected_option_id=answer_data['selected_option_id'],
+                    short_answer_text=answer_data['short_answer_text'],
+                    is_correct=answer_data['is_correct'],
+                )
+                for answer_data in self.student_answers_data
+            ])
 
-        for answer_data in self.student_answers_data:
-            StudentAnswer.objects.create(
-                test_result=self.test_result_instance,
-                question=answer_data['question'],
-                selected_option=answer_data['selected_option'],
-                short_answer_text=answer_data['short_answer_text'],
-                is_correct=answer_data['is_correct'],
-            )
+            self._update_test_result()
 
+    def _update_test_result(self):
         # Update the TestResult instance
         self.test_result_instance.score = self.score
         self.test_result_instance.end_time = timezone.now()
@@ -152,4 +151,20 @@ class BaseTestForm(forms.Form):
         # else:
         #    self.test_result_instance.passed = False
         self.test_result_instance.status = 'completed'
-        self.test_result_instance.save()
\ No newline at end of file
+        self.test_result_instance.save(update_fields=['score', 'end_time', 'status'])
+
+class CSVImportForm(forms.Form):
+    KIND_CHOICES = [
+        ('users', 'المستخدمون'),
+        ('classes', 'الحلقات'),
+        ('enrollments', 'التسجيل في الحلقات'),
+    ]
+    kind = forms.ChoiceField(choices=KIND_CHOICES, label='نوع البيانات')
+    csv_file = forms.FileField(label='ملف CSV')
+    dry_run = forms.BooleanField(required=False, initial=True, label='تشغيل تجريبي (التحقق فقط دون حفظ)')
+
+    def __init__(self, *args, kinds=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # لا تُعرض إلا الأنواع التي يملك المستخدم صلاحيتها
+        if kinds is not None:
+            self.fields['kind'].choices = [choice for choice in self.KIND_CHOICES if choice[0] in kinds]
@@ -0,0 +1,349 @@
+# academic/imports.py
+
+import csv
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import DETERMINED_LEVEL_CHOICES, User
+from core.provisioning import ACTIVATION_MODE, create_accounts
+from core.tasks import account_email_payload, enqueue_account_emails
+from . import progress
+from .notifications import notify_class_assignment
+from .models import Class, Course
+
+# عدد الصفوف التي تُتحقق منها وتُكتب معاً
+IMPORT_CHUNK_SIZE = 1000
+
+ACCOUNT_CREATED_SUBJECT = 'تم إنشاء حسابك في منصة ضاد التعليمية'
+
+
+class ImportFileError(ValueError):
+    """خطأ في الملف نفسه (مثل أعمدة ناقصة) يمنع الاستيراد بالكامل."""
+
+
+@dataclass
+class ImportResult:
+    kind: str
+    dry_run: bool = False
+    rows: int = 0
+    created: int = 0
+    # (رقم السطر في الملف، رسالة الخطأ)
+    errors: list = field(default_factory=list)
+
+
+class CSVImporter:
+    """
+    أساس مستوردات CSV: يقرأ الملف كتدفق بـ csv.DictReader ويعالجه على دفعات.
+    لكل دفعة: تُبنى خرائط المفاتيح الأجنبية باستعلام واحد لكل خريطة، ثم يُتحقق من الصفوف،
+    ثم تُكتب الصفوف الصالحة دفعة واحدة. الصفوف غير الصالحة تُتخطى وتُسجل في errors.
+    الاستيراد كله في معاملة واحدة، ووضع التجربة (dry_run) ينفذ المسار نفسه ثم يتراجع.
+    """
+    kind = None
+    # الصلاحية المطلوبة لتنفيذ هذا النوع من لوحة الإدارة
+    permission = None
+    required_columns = ()
+
+    def __init__(self, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE, site_url='', user=None):
+        self.chunk_size = chunk_size
+        # المستخدم الذي ينفذ الاستيراد من لوحة الإدارة (None لأوامر الإدارة)
+        self.user = user
+        # بداية الروابط في رسائل البريد (مثل https://dhad.example.com)
+        self.site_url = site_url
+        self.result = ImportResult(self.kind, dry_run=dry_run)
+        # مفاتيح الصفوف السابقة في الملف نفسه لاكتشاف التكرار
+        self.seen = set()
+
+    def run(self, text_stream):
+        reader = csv.DictReader(text_stream)
+        missing = [column for column in self.required_columns if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ImportFileError(f"أعمدة مطلوبة غير موجودة في الملف: {', '.join(missing)}")
+
+        # السطر 1 هو العناوين
+        numbered = enumerate(reader, start=2)
+        with transaction.atomic():
+            while True:
+                chunk = [
+                    (line, {key: (value or '').strip() for key, value in row.items() if key})
+                    for line, row in islice(numbered, self.chunk_size)
+                ]
+                if not chunk:
+                    break
+                self.result.rows += len(chunk)
+                valid = []
+                for line, row, value in self.validate_chunk(chunk):
+                    if isinstance(value, str):
+                        self.result.errors.append((line, value))
+                    else:
+                        valid.append(value)
+                if valid:
+                    self.result.created += self.write(valid)
+            if self.result.dry_run:
+                transaction.set_rollback(True)
+        return self.result
+
+    def validate_chunk(self, chunk):
+        """يولّد (السطر، الصف، كائن صالح أو رسالة خطأ) لكل صف."""
+        raise NotImplementedError
+
+    def write(self, objects):
+        raise NotImplementedError
+
+    def _check_duplicate(self, key, label):
+        if key in self.seen:
+            return f'{label} مكرر في الملف.'
+        self.seen.add(key)
+        return None
+
+
+def _valid_email(value):
+    try:
+        validate_email(value)
+    except ValidationError:
+        return False
+    return True
+
+
+def _parse_datetime(value):
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+# --------------------------------------------------------------------------
+# المستخدمون
+# --------------------------------------------------------------------------
+class UserImporter(CSVImporter):
+    """
+    الأعمدة: username وemail، واختيارياً first_name وlast_name وrole (الافتراضي student)
+    وcountry وphone_number وdetermined_arabic_level.
+    حسابات المسؤولين (role=admin) لا يُنشئها من لوحة الإدارة إلا المشرف العام.
+    الحسابات تُنشأ بلا كلمة مرور، ويُضاف لكل منها بريد ترحيب إلى طابور المهام يحمل بيانات الدخول
+    (رابط تفعيل أو كلمة مرور حسب ACCOUNT_PROVISIONING_MODE) كما في الموافقة على طلبات التسجيل.
+    """
+    kind = 'users'
+    permission = 'core.add_user'
+    required_columns = ('username', 'email')
+    roles = {role for role, _ in User.USER_ROLES}
+    levels = {level for level, _ in DETERMINED_LEVEL_CHOICES}
+
+    def validate_chunk(self, chunk):
+        existing = set(
+            User.objects.filter(username__in=[row['username'] for _, row in chunk]).values_list('username', flat=True)
+        )
+        for line, row in chunk:
+            username, email = row['username'], row['email']
+            role = row.get('role') or 'student'
+            level = row.get('determined_arabic_level') or 'unassigned'
+            if not username:
+                error = 'اسم المستخدم مطلوب.'
+            elif username in existing:
+                error = f'المستخدم {username} موجود مسبقاً.'
+            elif not _valid_email(email):
+                error = f'بريد إلكتروني غير صحيح: {email}' if email else 'البريد الإلكتروني مطلوب لإرسال بيانات الدخول.'
+            elif role not in self.roles:
+                error = f'دور غير معروف: {role}'
+            elif role == 'admin' and not self.can_create_admins():
+                error = 'إنشاء حسابات المسؤولين يتطلب صلاحية المشرف العام.'
+            elif level not in self.levels:
+                error = f'مستوى غير معروف: {level}'
+            else:
+                error = self._check_duplicate(username, f'اسم المستخدم {username}')
+            if error:
+                yield line, row, error
+                continue
+            yield line, row, User(
+                username=username,
+                email=email,
+                first_name=row.get('first_name', ''),
+                last_name=row.get('last_name', ''),
+                role=role,
+                country=row.get('country') or None,
+                phone_number=row.get('phone_number') or None,
+                determined_arabic_level=level,
+            )
+
+    def can_create_admins(self):
+        return self.user is None or self.user.is_superuser
+
+    def write(self, users):
+        # بيانات الدخول يُنشئها عامل المهام عند إرسال البريد، فلا تشفير هنا ولا أسرار في الطابور
+        create_accounts(users, mode=ACTIVATION_MODE)
+        enqueue_account_emails([
+            account_email_payload(user, ACCOUNT_CREATED_SUBJECT, 'academic/emails/account_created_email.html', {
+                'user_name': user.get_full_name() or user.username,
+                'username': user.username,
+                'login_link': self.site_url + settings.LOGIN_URL,
+            }, site_url=self.site_url)
+            for user in users
+        ])
+        return len(users)
+
+
+# --------------------------------------------------------------------------
+# الحلقات
+# --------------------------------------------------------------------------
+# علامة اسم مادة يطابق أكثر من مادة (الأسماء فريدة داخل البرنامج فقط)
+_AMBIGUOUS = object()
+
+
+class ClassImporter(CSVImporter):
+    """
+    الأعمدة: class_code وcourse (معرف المادة أو اسمها) وstart_time وend_time (ISO 8601)،
+    واختيارياً teacher (اسم المستخدم) وcapacity وrequired_arabic_level.
+    """
+    kind = 'classes'
+    permission = 'academic.add_class'
+    required_columns = ('class_code', 'course', 'start_time', 'end_time')
+    levels = {level for level, _ in Class.REQUIRED_LEVEL_CHOICES}
+
+    def validate_chunk(self, chunk):
+        codes = [row['class_code'] for _, row in chunk]
+        existing_codes = set(Class.objects.filter(class_code__in=codes).values_list('class_code', flat=True))
+        teachers = User.objects.filter(role='teacher').in_bulk(
+            {row['teacher'] for _, row in chunk if row.get('teacher')}, field_name='username'
+        )
+        courses_by_id, courses_by_name = self._course_maps({row['course'] for _, row in chunk})
+
+        for line, row in chunk:
+            code, course_key = row['class_code'], row['course']
+            course = courses_by_id.get(course_key) or courses_by_name.get(course_key)
+            start_time, end_time = _parse_datetime(row['start_time']), _parse_datetime(row['end_time'])
+            capacity = row.get('capacity') or '10'
+            level = row.get('required_arabic_level') or 'any'
+            teacher = row.get('teacher')
+
+            if not code:
+                error = 'رمز الحلقة مطلوب.'
+            elif code in existing_codes:
+                error = f'الحلقة {code} موجودة مسبقاً.'
+            elif course is None:
+                error = f'المادة غير موجودة: {course_key}'
+            elif course is _AMBIGUOUS:
+                error = f'اسم المادة يطابق أكثر من مادة، استخدم معرفها: {course_key}'
+            elif teacher and teacher not in teachers:
+                error = f'المعلم غير موجود: {teacher}'
+            elif start_time is None or end_time is None:
+                error = 'صيغة الوقت غير صحيحة (المطلوب YYYY-MM-DD HH:MM).'
+            elif end_time <= start_time:
+                error = 'وقت الانتهاء يجب أن يكون بعد وقت البدء.'
+            elif not capacity.isdigit():
+                error = f'سعة غير صحيحة: {capacity}'
+            elif level not in self.levels:
+                error = f'مستوى غير معروف: {level}'
+            else:
+                error = self._check_duplicate(code, f'رمز الحلقة {code}')
+            if error:
+                yield line, row, error
+                continue
+            yield line, row, Class(
+                class_code=code,
+                course=course,
+                teacher=teachers.get(teacher),
+                start_time=start_time,
+                end_time=end_time,
+                capacity=int(capacity),
+                required_arabic_level=level,
+            )
+
+    def _course_maps(self, keys):
+        ids = {int(key) for key in keys if key.isdigit()}
+        names = {key for key in keys if not key.isdigit()}
+        by_id, by_name = {}, {}
+        for course in Course.objects.filter(pk__in=ids) | Course.objects.filter(name__in=names):
+            by_id[str(course.pk)] = course
+            by_name[course.name] = _AMBIGUOUS if course.name in by_name else course
+        return by_id, by_name
+
+    def write(self, classes):
+        Class.objects.bulk_create(classes)
+        return len(classes)
+
+
+# --------------------------------------------------------------------------
+# التسجيل في الحلقات
+# --------------------------------------------------------------------------
+class EnrollmentImporter(CSVImporter):
+    """
+    الأعمدة: class_code وusername (طالب).
+    تُحترم سعة الحلقة: الصفوف التي تتجاوزها تُسجل كأخطاء.
+    """
+    kind = 'enrollments'
+    permission = 'academic.change_class'
+    required_columns = ('class_code', 'username')
+
+    def validate_chunk(self, chunk):
+        classes = Class.objects.in_bulk({row['class_code'] for _, row in chunk}, field_name='class_code')
+        students = User.objects.filter(role='student').in_bulk(
+            {row['username'] for _, row in chunk}, field_name='username'
+        )
+        Through = Class.students.through
+        enrolled = set(
+            Through.objects.filter(
+                class_id__in=[cls.pk for cls in classes.values()],
+                user_id__in=[student.pk for student in students.values()],
+            ).values_list('class_id', 'user_id')
+        )
+
+        # المقاعد المحجوزة في هذه الدفعة لكل حلقة (الدفعات السابقة محسوبة في enrolled_count)
+        reserved = {}
+        for line, row in chunk:
+            cls, student = classes.get(row['class_code']), students.get(row['username'])
+            if cls is None:
+                error = f"الحلقة غير موجودة: {row['class_code']}"
+            elif student is None:
+                error = f"الطالب غير موجود: {row['username']}"
+            elif (cls.pk, student.pk) in enrolled:
+                error = f'الطالب {student.username} مسجل مسبقاً في الحلقة {cls.class_code}.'
+            elif cls.enrolled_count + reserved.get(cls.pk, 0) >= cls.capacity:
+                error = f'الحلقة {cls.class_code} ممتلئة.'
+            else:
+                error = self._check_duplicate((cls.pk, student.pk), f'تسجيل {student.username} في {cls.class_code}')
+            if error:
+                yield line, row, error
+                continue
+            reserved[cls.pk] = reserved.get(cls.pk, 0) + 1
+            yield line, row, (cls, student.pk)
+
+    def write(self, enrollments):
+        students_by_class = {}
+        for cls, student_id in enrollments:
+            students_by_class.setdefault(cls, []).append(student_id)
+
+        # نفس خطوات allocation.enroll_students لكن مجمّعة للدفعة كلها:
+        # إدخال واحد في جدول الربط، وصفوف التقدم دفعة واحدة، ثم حجز المقاعد والإشعارات لكل حلقة
+        Through = Class.students.through
+        Through.objects.bulk_create(
+            [Through(class_id=cls.pk, user_id=student_id) for cls, student_id in enrollments],
+            ignore_conflicts=True,
+        )
+        progress.ensure_progress_rows({(student_id, cls.course_id) for cls, student_id in enrollments})
+        for cls, student_ids in students_by_class.items():
+            Class.objects.filter(pk=cls.pk).update(enrolled_count=F('enrolled_count') + len(student_ids))
+            notify_class_assignment(cls, student_ids)
+        return len(enrollments)
+
+
+IMPORTERS = {importer.kind: importer for importer in (UserImporter, ClassImporter, EnrollmentImporter)}
+
+
+def permitted_kinds(user):
+    """أنواع الاستيراد التي يملك المستخدم صلاحيتها، بترتيب IMPORTERS."""
+    return [kind for kind, importer in IMPORTERS.items() if user.has_perm(importer.permission)]
+
+
+def import_csv(kind, text_stream, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE, site_url='', user=None):
+    """يستورد ملف CSV من النوع المحدد (users أو classes أو enrollments) ويرجع ImportResult."""
+    return IMPORTERS[kind](dry_run=dry_run, chunk_size=chunk_size, site_url=site_url, user=user).run(text_stream)
@@ -0,0 +1,36 @@
+# academic/management/commands/assign_pending_students.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from academic.allocation import allocate_backlog, get_placement_course
+from academic.models import Course
+
+
+class Command(BaseCommand):
+    help = 'توزيع جميع الطلاب المجمدين الذين حُدد مستواهم على الحلقات المتاحة دفعة واحدة.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help='معرف المادة (افتراضياً مادة تحديد المستوى).')
+        parser.add_argument('--dry-run', action='store_true', help='عرض التوزيع المقترح دون حفظ أي تغيير.')
+
+    def handle(self, *args, **options):
+        if options['course']:
+            course = Course.objects.filter(id=options['course']).first()
+            if course is None:
+                raise CommandError(f"المادة #{options['course']} غير موجودة.")
+        else:
+            course = get_placement_course()
+            if course is None:
+                raise CommandError('لم يتم تحديد المادة الأساسية لاختبار تحديد المستوى في النظام.')
+
+        assignments, unassigned = allocate_backlog(course=course, dry_run=options['dry_run'])
+
+        for student, cls in assignments:
+            self.stdout.write(f'{student.username} -> {cls.class_code or cls.id} ({cls.get_required_arabic_level_display()})')
+        for student in unassigned:
+            self.stdout.write(self.style.WARNING(f'{student.username}: لا توجد حلقة مناسبة للمستوى {student.determined_arabic_level}'))
+
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}تم توزيع {len(assignments)} طالب، وبقي {len(unassigned)} بدون حلقة.'
+        ))
@@ -0,0 +1,40 @@
+# academic/management/commands/import_csv.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from academic.imports import IMPORT_CHUNK_SIZE, IMPORTERS, ImportFileError, import_csv
+
+
+class Command(BaseCommand):
+    help = 'استيراد المستخدمين أو الحلقات أو التسجيل في الحلقات من ملف CSV (على دفعات، مع تشغيل تجريبي).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS), help='نوع البيانات في الملف.')
+        parser.add_argument('path', help='مسار ملف CSV (UTF-8، السطر الأول عناوين الأعمدة).')
+        parser.add_argument('--dry-run', action='store_true', help='التحقق من الملف وعرض الأخطاء دون حفظ أي شيء.')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='عدد الصفوف في كل دفعة.')
+        parser.add_argument('--site-url', default='',
+                            help='عنوان الموقع لروابط التفعيل في بريد الحسابات الجديدة (مثل https://dhad.example.com).')
+
+    def handle(self, *args, **options):
+        try:
+            # utf-8-sig: ملفات Excel تبدأ غالباً بعلامة BOM
+            with open(options['path'], encoding='utf-8-sig', newline='') as f:
+                result = import_csv(
+                    options['kind'], f, dry_run=options['dry_run'], chunk_size=options['chunk_size'],
+                    site_url=options['site_url'].rstrip('/'),
+                )
+        except (OSError, UnicodeDecodeError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result.errors:
+            self.stdout.write(f'السطر {line}: {message}')
+
+        if result.dry_run:
+            self.stdout.write(self.style.WARNING(
+                f'تشغيل تجريبي: {result.created} من {result.rows} صف صالح، و{len(result.errors)} صف فيه أخطاء (لم يُحفظ شيء).'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'تمت إضافة {result.created} من {result.rows} صف، وتُخطي {len(result.errors)} صف فيه أخطاء.'
+            ))
@@ -0,0 +1,18 @@
+# academic/management/commands/rebuild_course_progress.py
+
+from django.core.management.base import BaseCommand
+
+from academic.progress import rebuild_course_progress
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء جدول تقدم الطلاب في المواد (StudentCourseProgress) دفعة واحدة.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', type=int, action='append', dest='student_ids',
+                            help='معرف طالب محدد (يمكن تكراره). بدونه يُعاد بناء الجدول بالكامل.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='حجم دفعة bulk_create.')
+
+    def handle(self, *args, **options):
+        written = rebuild_course_progress(student_ids=options['student_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'تمت كتابة {written} صف في جدول تقدم الطلاب.'))
@@ -0,0 +1,31 @@
+# academic/management/commands/reconcile_class_counts.py
+
+from django.db import transaction
+from django.core.management.base import BaseCommand
+
+from academic.allocation import reconcile_enrolled_counts
+
+
+class Command(BaseCommand):
+    help = 'إعادة حساب عدد الطلاب المسجلين (enrolled_count) لكل حلقة من جدول الربط وإصلاح أي انحراف.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class', type=int, action='append', dest='class_ids',
+                            help='معرف حلقة محددة (يمكن تكراره). بدونه تُفحص جميع الحلقات.')
+        parser.add_argument('--dry-run', action='store_true', help='عرض الانحرافات دون حفظ أي تغيير.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = reconcile_enrolled_counts(class_ids=options['class_ids'])
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        for class_id, stored, actual in drift:
+            self.stdout.write(f'الحلقة #{class_id}: المخزن {stored}، الفعلي {actual}')
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('جميع العدادات متطابقة.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} حلقة منحرفة (تشغيل تجريبي، لم يُحفظ شيء).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'تم إصلاح {len(drift)} حلقة.'))
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+# نسخة مجمدة من academic.progress.build_progress_rows وقت إنشاء الجدول
+COUNTED_TEST_STATUSES = ('completed', 'finalized')
+DEFAULT_TEST_MAX_SCORE = 100
+
+
+def populate_course_progress(apps, schema_editor):
+    Class = apps.get_model('academic', 'Class')
+    Lesson = apps.get_model('academic', 'Lesson')
+    LessonProgress = apps.get_model('academic', 'LessonProgress')
+    TestResult = apps.get_model('academic', 'TestResult')
+    StudentCourseProgress = apps.get_model('academic', 'StudentCourseProgress')
+
+    pairs = set(Class.students.through.objects.values_list('user_id', 'class__course_id').distinct())
+    if not pairs:
+        return
+
+    lesson_totals = dict(
+        Lesson.objects.values('course_id').annotate(n=Count('id')).order_by().values_list('course_id', 'n')
+    )
+    completed = {
+        (row['student_id'], row['lesson__course_id']): row['n']
+        for row in LessonProgress.objects.filter(status='completed')
+        .values('student_id', 'lesson__course_id').annotate(n=Count('id')).order_by()
+    }
+    tests = {
+        (row['student_id'], row['test__course_id']): (row['score_sum'], row['results_count'] * DEFAULT_TEST_MAX_SCORE)
+        for row in TestResult.objects.filter(status__in=COUNTED_TEST_STATUSES, test__course__isnull=False)
+        .values('student_id', 'test__course_id')
+        .annotate(score_sum=Coalesce(Sum('score'), 0), results_count=Count('id')).order_by()
+    }
+
+    rows = []
+    for student_id, course_id in sorted(pairs):
+        score_sum, max_sum = tests.get((student_id, course_id), (0, 0))
+        rows.append(StudentCourseProgress(
+            student_id=student_id,
+            course_id=course_id,
+            total_lessons=lesson_totals.get(course_id, 0),
+            completed_lessons=completed.get((student_id, course_id), 0),
+            test_score_sum=score_sum,
+            test_max_sum=max_sum,
+        ))
+    StudentCourseProgress.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0003_course_is_placement_course_testresult_answers_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentCourseProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_lessons', models.PositiveIntegerField(default=0, verbose_name='عدد الدروس الكلي')),
+                ('completed_lessons', models.PositiveIntegerField(default=0, verbose_name='عدد الدروس المكتملة')),
+                ('test_score_sum', models.IntegerField(default=0, verbose_name='مجموع درجات الاختبارات')),
+                ('test_max_sum', models.PositiveIntegerField(default=0, verbose_name='مجموع الدرجات القصوى للاختبارات')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_progresses', to='academic.course', verbose_name='المادة')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_progresses', to=settings.AUTH_USER_MODEL, verbose_name='الطالب')),
+            ],
+            options={
+                'verbose_name': 'تقدم الطالب في المادة',
+                'verbose_name_plural': 'تقدم الطلاب في المواد',
+                'ordering': ['course__name'],
+                'unique_together': {('student', 'course')},
+            },
+        ),
+        migrations.RunPython(populate_course_progress, migrations.RunPython.noop),
+    ]
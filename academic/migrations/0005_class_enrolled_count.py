@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_enrolled_count(apps, schema_editor):
+    Class = apps.get_model('academic', 'Class')
+    Through = Class.students.through
+    counts = (
+        Through.objects.filter(class_id=OuterRef('pk'))
+        .order_by().values('class_id').annotate(n=Count('*')).values('n')[:1]
+    )
+    Class.objects.update(enrolled_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0004_studentcourseprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='enrolled_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='عدد الطلاب المسجلين'),
+        ),
+        migrations.RunPython(populate_enrolled_count, migrations.RunPython.noop),
+    ]
@@ -52,6 +52,8 @@ class Class(models.Model):
     students = models.ManyToManyField('core.User', related_name='enrolled_classes', limit_choices_to={'role': 'student'}, blank=True, verbose_name="الطلاب المسجلون")
 
     capacity = models.PositiveIntegerField(default=10, verbose_name="سعة الحلقة")
+    # عدد الطلاب المسجلين (مخزن مسبقاً ويُحدّث عبر إشارة m2m_changed على students)
+    enrolled_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="عدد الطلاب المسجلين")
 
     REQUIRED_LEVEL_CHOICES = [
         ('beginner', 'مبتدئ'),
@@ -84,13 +86,13 @@ class Class(models.Model):
         return f"حلقة {self.course.name} - المعلم: {teacher_name} - {self.start_time.strftime('%Y-%m-%d %H:%M')}"
 
     def current_students_count(self):
-        return self.students.count()
+        return self.enrolled_count
 
     def available_slots(self):
-        return self.capacity - self.current_students_count()
+        return self.capacity - self.enrolled_count
 
     def is_full(self):
-        return self.current_students_count() >= self.capacity
+        return self.enrolled_count >= self.capacity
 
 # 4. نموذج الدرس المسجل (فيديو مرتبط بيوتيوب)
 class Lesson(models.Model):
@@ -333,4 +335,25 @@ class StudentAnswer(models.Model):
         ordering = ['question__id']
 
     def __str__(self):
-        return f"إجابة {self.test_result.student.username} لـ {self.question.text[:30]}"
\ No newline at end of file
+        return f"إجابة {self.test_result.student.username} لـ {self.question.text[:30]}"
+
+# 14. جدول تقدم الطالب في كل مادة (بيانات مجمعة مسبقاً لتسريع لوحة التحكم)
+class StudentCourseProgress(models.Model):
+    student = models.ForeignKey('core.User', on_delete=models.CASCADE, related_name='course_progresses', verbose_name="الطالب")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_progresses', verbose_name="المادة")
+
+    total_lessons = models.PositiveIntegerField(default=0, verbose_name="عدد الدروس الكلي")
+    completed_lessons = models.PositiveIntegerField(default=0, verbose_name="عدد الدروس المكتملة")
+    test_score_sum = models.IntegerField(default=0, verbose_name="مجموع درجات الاختبارات")
+    test_max_sum = models.PositiveIntegerField(default=0, verbose_name="مجموع الدرجات القصوى للاختبارات")
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="آخر تحديث")
+
+    class Meta:
+        verbose_name = "تقدم الطالب في المادة"
+        verbose_name_plural = "تقدم الطلاب في المواد"
+        unique_together = ('student', 'course')
+        ordering = ['course__name']
+
+    def __str__(self):
+        return f"تقدم {self.student.username} في {self.course.name}: {self.completed_lessons}/{self.total_lessons}"
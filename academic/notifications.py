@@ -0,0 +1,34 @@
+# academic/notifications.py
+
+from django.utils import timezone
+
+from core.models import User
+from jobs.tasks import email_payload, enqueue_emails
+from .models import Class
+
+CLASS_ASSIGNMENT_SUBJECT = 'تم تسجيلك في حلقة دراسية - منصة ضاد التعليمية'
+
+
+def notify_class_assignment(cls, student_ids):
+    """
+    يضيف إلى طابور المهام إشعار بريد لكل طالب أُضيف إلى الحلقة.
+    استعلام واحد لبيانات الطلاب، وعبارة INSERT واحدة للمهام.
+    """
+    if not student_ids:
+        return []
+    if not isinstance(cls, Class):
+        cls = Class.objects.select_related('course', 'teacher').get(pk=cls)
+
+    class_context = {
+        'course_name': cls.course.name,
+        'teacher_name': cls.teacher.get_full_name() if cls.teacher else '',
+        'start_time': timezone.localtime(cls.start_time).strftime('%Y-%m-%d %H:%M'),
+        'class_code': cls.class_code,
+    }
+    students = User.objects.filter(pk__in=student_ids).exclude(email='').only('email', 'first_name', 'last_name', 'username')
+    return enqueue_emails([
+        email_payload([student.email], CLASS_ASSIGNMENT_SUBJECT, 'academic/emails/class_assignment_email.html', {
+            'student_name': student.get_full_name() or student.username, **class_context,
+        })
+        for student in students
+    ])
@@ -0,0 +1,148 @@
+# academic/placement.py
+
+import logging
+
+from django.conf import settings
+
+from core.cache import bump_namespace, get_or_compute, versioned_key
+from .models import Test
+
+logger = logging.getLogger(__name__)
+
+# نطاق بإصدار يُرفع عند حفظ أو حذف أي اختبار (انظر AcademicConfig.ready)
+PLACEMENT_GRAPH_NAMESPACE = 'academic:placement_graph'
+PLACEMENT_GRAPH_TIMEOUT = 60 * 60 * 24
+
+# نقطة البداية لاختبار تحديد المستوى
+ENTRY_LEVEL = 'A1'
+# المستوى الذي يُعيَّن للطالب إذا فشل في أدنى اختبار متاح
+FLOOR_LEVEL = 'A1'
+
+# قرارات التوجيه بعد كل مرحلة
+ADVANCE = 'advance'   # أداء ممتاز: الانتقال لاختبار المستوى الأعلى
+PLACE = 'place'       # أداء مقبول: تحديد المستوى نهائياً بمستوى هذا الاختبار
+RETREAT = 'retreat'   # أداء ضعيف: الانتقال لاختبار المستوى الأدنى
+FLOOR = 'floor'       # أداء ضعيف ولا يوجد مستوى أدنى: تحديد المستوى الأدنى
+
+
+def placement_thresholds():
+    """
+    يحوّل PLACEMENT_TEST_THRESHOLDS من الإعدادات إلى نسب مئوية:
+    - أقل من أو يساوي beginner_max_score: رسوب في هذه المرحلة.
+    - حتى intermediate_max_score: تحديد المستوى بهذه المرحلة.
+    - أعلى من ذلك: الانتقال للمستوى التالي.
+    """
+    thresholds = getattr(settings, 'PLACEMENT_TEST_THRESHOLDS', {})
+    pass_threshold = thresholds.get('beginner_max_score', 49) + 1
+    success_threshold = thresholds.get('intermediate_max_score', 79) + 1
+    return pass_threshold, success_threshold
+
+
+class PlacementDecision:
+    def __init__(self, action, level=None, next_test=None):
+        self.action = action
+        self.level = level
+        self.next_test = next_test
+
+    def __repr__(self):
+        return f'PlacementDecision({self.action!r}, level={self.level!r}, next_test={self.next_test!r})'
+
+
+class PlacementGraph:
+    """
+    رسم توجيه مجمع مسبقاً لجميع اختبارات تحديد المستوى (العقد + حواف النجاح/الفشل).
+    يتم التحقق منه عند البناء: الحواف التي تشير لاختبار غير موجود أو ليس اختبار
+    تحديد مستوى، والحواف التي تُغلق حلقة (cycle)، تُحذف وتُسجل كأخطاء.
+    """
+
+    def __init__(self, tests):
+        self.nodes = {test.id: test for test in tests}
+        self.success_edges = {test.id: test.next_test_on_success_id for test in tests if test.next_test_on_success_id}
+        self.failure_edges = {test.id: test.next_test_on_failure_id for test in tests if test.next_test_on_failure_id}
+        self.errors = []
+
+        self._validate_nodes()
+        self._drop_dead_edges(self.success_edges, 'النجاح')
+        self._drop_dead_edges(self.failure_edges, 'الفشل')
+        self._break_cycles(self.success_edges, 'النجاح')
+        self._break_cycles(self.failure_edges, 'الفشل')
+
+        entry_candidates = sorted(
+            (test for test in self.nodes.values() if test.level == ENTRY_LEVEL),
+            key=lambda test: test.id,
+        )
+        self.entry_test = entry_candidates[0] if entry_candidates else None
+        if self.entry_test is None:
+            self.errors.append(f'لا يوجد اختبار تحديد مستوى بالمستوى {ENTRY_LEVEL} كنقطة بداية.')
+
+        for error in self.errors:
+            logger.warning('Placement graph: %s', error)
+
+    @classmethod
+    def build(cls):
+        return cls(list(Test.objects.filter(is_placement_test=True).order_by('id')))
+
+    def _validate_nodes(self):
+        for test in self.nodes.values():
+            if not test.level or test.level == 'unassigned':
+                self.errors.append(f'اختبار تحديد المستوى "{test.title}" (#{test.id}) بدون مستوى مستهدف.')
+
+    def _drop_dead_edges(self, edges, label):
+        for source_id, target_id in list(edges.items()):
+            if target_id not in self.nodes:
+                self.errors.append(
+                    f'حافة {label} من "{self.nodes[source_id].title}" تشير إلى اختبار #{target_id} '
+                    f'غير موجود أو ليس اختبار تحديد مستوى.'
+                )
+                del edges[source_id]
+
+    def _break_cycles(self, edges, label):
+        # كل عقدة لها حافة خارجة واحدة على الأكثر، فيكفي تتبع المسار من كل عقدة
+        finished = set()
+        for start_id in list(edges):
+            path = []
+            on_path = set()
+            node_id = start_id
+            while node_id in edges and node_id not in finished:
+                if node_id in on_path:
+                    closing_source = path[-1]
+                    self.errors.append(
+                        f'حلقة مغلقة في حواف {label} عند "{self.nodes[closing_source].title}"؛ تم تجاهل هذه الحافة.'
+                    )
+                    del edges[closing_source]
+                    break
+                path.append(node_id)
+                on_path.add(node_id)
+                node_id = edges[node_id]
+            finished.update(path)
+
+    def next_on_success(self, test_id):
+        return self.nodes.get(self.success_edges.get(test_id))
+
+    def next_on_failure(self, test_id):
+        return self.nodes.get(self.failure_edges.get(test_id))
+
+    def route(self, test, percentage_score):
+        """يحدد الخطوة التالية للطالب بعد مرحلة تحديد المستوى دون أي استعلام."""
+        pass_threshold, success_threshold = placement_thresholds()
+
+        next_test = self.next_on_success(test.id)
+        if percentage_score >= success_threshold and next_test:
+            return PlacementDecision(ADVANCE, level=test.level, next_test=next_test)
+
+        if percentage_score >= pass_threshold:
+            return PlacementDecision(PLACE, level=test.level)
+
+        next_test = self.next_on_failure(test.id)
+        if next_test:
+            return PlacementDecision(RETREAT, level=test.level, next_test=next_test)
+        return PlacementDecision(FLOOR, level=FLOOR_LEVEL)
+
+
+def get_placement_graph():
+    cache_key = versioned_key(PLACEMENT_GRAPH_NAMESPACE)
+    return get_or_compute(cache_key, PlacementGraph.build, PLACEMENT_GRAPH_TIMEOUT, PLACEMENT_GRAPH_NAMESPACE)
+
+
+def invalidate_placement_graph():
+    bump_namespace(PLACEMENT_GRAPH_NAMESPACE)
@@ -0,0 +1,285 @@
+# academic/progress.py
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Class, Lesson, LessonProgress, StudentCourseProgress, TestResult
+
+# أوزان حساب التقدم الكلي للطالب
+LESSONS_WEIGHT = 70
+TESTS_WEIGHT = 30
+
+# لا يحتوي نموذج Test على حقل max_score، لذلك تُحسب كل نتيجة من 100
+DEFAULT_TEST_MAX_SCORE = 100
+
+# حالات نتيجة الاختبار التي تدخل في حساب التقدم (الاختبارات المنتهية فقط)
+COUNTED_TEST_STATUSES = ('completed', 'finalized')
+
+
+def _percentage(part, whole):
+    if not whole:
+        return 0
+    return (part / whole) * 100
+
+
+class StudentProgress:
+    """
+    محرك حساب تقدم الطالب بعدد ثابت من الاستعلامات مهما كان عدد المواد.
+
+    يقرأ صفوف StudentCourseProgress الخاصة بالطالب في استعلام واحد،
+    وهي صفوف تُحدّث تدريجياً عبر الإشارات في academic/signals.py.
+    """
+
+    def __init__(self, student):
+        self.student = student
+        self.courses = []
+        self.test_score_sum = 0
+        self.test_max_sum = 0
+
+        if student.role == 'student':
+            self._load()
+
+    @classmethod
+    def for_student(cls, student):
+        return cls(student)
+
+    def _load(self):
+        # قراءة واحدة مفهرسة من جدول التقدم المجمع (StudentCourseProgress)
+        rows = (
+            StudentCourseProgress.objects.filter(student=self.student)
+            .select_related('course__program')
+            .order_by('course__name')
+        )
+        for row in rows:
+            self.test_score_sum += row.test_score_sum
+            self.test_max_sum += row.test_max_sum
+            self.courses.append({
+                'course': row.course,
+                'total_lessons': row.total_lessons,
+                'completed_lessons': row.completed_lessons,
+                'completion_percentage': round(_percentage(row.completed_lessons, row.total_lessons), 2),
+                'test_score_sum': row.test_score_sum,
+                'test_max_sum': row.test_max_sum,
+            })
+
+    @property
+    def total_lessons(self):
+        return sum(data['total_lessons'] for data in self.courses)
+
+    @property
+    def completed_lessons(self):
+        return sum(data['completed_lessons'] for data in self.courses)
+
+    @property
+    def lesson_completion_percentage(self):
+        return _percentage(self.completed_lessons, self.total_lessons)
+
+    @property
+    def test_score_percentage(self):
+        return _percentage(self.test_score_sum, self.test_max_sum)
+
+    @property
+    def overall_percentage(self):
+        if self.student.role != 'student':
+            return 0
+        achieved = (self.lesson_completion_percentage / 100) * LESSONS_WEIGHT
+        achieved += (self.test_score_percentage / 100) * TESTS_WEIGHT
+        return round(_percentage(achieved, LESSONS_WEIGHT + TESTS_WEIGHT), 2)
+
+    def programs_with_courses(self):
+        """
+        يجمع المواد حسب البرنامج بنفس شكل get_enrolled_programs دون استعلامات إضافية.
+        """
+        grouped = {}
+        for data in self.courses:
+            program = data['course'].program
+            grouped.setdefault(program.id, {'program': program, 'courses': []})
+            grouped[program.id]['courses'].append(data['course'])
+        return sorted(grouped.values(), key=lambda item: item['program'].name)
+
+
+class LessonCompletionIndex:
+    """
+    فهرس في الذاكرة لدروس الطالب المكتملة (لكل طلب HTTP).
+    يحمّل معرفات الدروس المكتملة مرة واحدة كمجموعة (set) ثم يجيب من الذاكرة.
+    """
+
+    def __init__(self, student, course_ids=None):
+        completed = LessonProgress.objects.filter(student=student, status='completed')
+        if course_ids is not None:
+            completed = completed.filter(lesson__course_id__in=course_ids)
+        self.completed_lesson_ids = set(completed.values_list('lesson_id', flat=True))
+
+    def is_completed(self, lesson):
+        lesson_id = getattr(lesson, 'pk', lesson)
+        return lesson_id in self.completed_lesson_ids
+
+    def __contains__(self, lesson):
+        return self.is_completed(lesson)
+
+
+def lessons_by_course(course_ids):
+    """
+    يجلب دروس عدة مواد في استعلام واحد مرتبة حسب تاريخ النشر ثم المعرف،
+    ويرجع قاموساً {course_id: [lesson, ...]}.
+    """
+    grouped = {course_id: [] for course_id in course_ids}
+    for lesson in Lesson.objects.filter(course_id__in=course_ids).order_by('course_id', 'published_date', 'id'):
+        grouped[lesson.course_id].append(lesson)
+    return grouped
+
+
+# --------------------------------------------------------------------------
+# صيانة جدول StudentCourseProgress
+# --------------------------------------------------------------------------
+def _lesson_totals(course_ids):
+    return dict(
+        Lesson.objects.filter(course_id__in=course_ids)
+        .values('course_id').annotate(n=Count('id')).order_by()
+        .values_list('course_id', 'n')
+    )
+
+
+def _completed_counts(student_ids, course_ids):
+    rows = (
+        LessonProgress.objects.filter(student_id__in=student_ids, lesson__course_id__in=course_ids, status='completed')
+        .values('student_id', 'lesson__course_id').annotate(n=Count('id')).order_by()
+    )
+    return {(row['student_id'], row['lesson__course_id']): row['n'] for row in rows}
+
+
+def _test_totals(student_ids, course_ids):
+    rows = (
+        TestResult.objects.filter(
+            student_id__in=student_ids, test__course_id__in=course_ids, status__in=COUNTED_TEST_STATUSES
+        )
+        .values('student_id', 'test__course_id')
+        .annotate(score_sum=Coalesce(Sum('score'), 0), results_count=Count('id'))
+        .order_by()
+    )
+    return {
+        (row['student_id'], row['test__course_id']): (row['score_sum'], row['results_count'] * DEFAULT_TEST_MAX_SCORE)
+        for row in rows
+    }
+
+
+def build_progress_rows(pairs):
+    """
+    يبني كائنات StudentCourseProgress (غير محفوظة) لأزواج (student_id, course_id)
+    باستخدام ثلاثة استعلامات تجميعية فقط مهما كان عدد الأزواج.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return []
+    student_ids = {student_id for student_id, _ in pairs}
+    course_ids = {course_id for _, course_id in pairs}
+
+    lesson_totals = _lesson_totals(course_ids)
+    completed = _completed_counts(student_ids, course_ids)
+    tests = _test_totals(student_ids, course_ids)
+
+    rows = []
+    for student_id, course_id in sorted(pairs):
+        score_sum, max_sum = tests.get((student_id, course_id), (0, 0))
+        rows.append(StudentCourseProgress(
+            student_id=student_id,
+            course_id=course_id,
+            total_lessons=lesson_totals.get(course_id, 0),
+            completed_lessons=completed.get((student_id, course_id), 0),
+            test_score_sum=score_sum,
+            test_max_sum=max_sum,
+        ))
+    return rows
+
+
+def enrolled_pairs(student_ids=None, course_ids=None):
+    """
+    يرجع أزواج (student_id, course_id) لكل طالب مسجل في حلقة من حلقات المادة.
+    """
+    through = Class.students.through.objects.all()
+    if student_ids is not None:
+        through = through.filter(user_id__in=student_ids)
+    if course_ids is not None:
+        through = through.filter(class__course_id__in=course_ids)
+    return set(through.values_list('user_id', 'class__course_id').distinct())
+
+
+def ensure_progress_rows(pairs):
+    """ينشئ الصفوف الناقصة فقط (مثلاً عند تسجيل طالب في حلقة جديدة)."""
+    rows = build_progress_rows(pairs)
+    StudentCourseProgress.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def prune_progress_rows(student_ids, course_ids):
+    """يحذف صفوف المواد التي لم يعد الطالب مسجلاً في أي من حلقاتها."""
+    still_enrolled = enrolled_pairs(student_ids=student_ids, course_ids=course_ids)
+    stale_ids = [
+        row_id
+        for row_id, student_id, course_id in StudentCourseProgress.objects.filter(
+            student_id__in=student_ids, course_id__in=course_ids
+        ).values_list('id', 'student_id', 'course_id')
+        if (student_id, course_id) not in still_enrolled
+    ]
+    if stale_ids:
+        StudentCourseProgress.objects.filter(id__in=stale_ids).delete()
+
+
+def adjust_lesson_totals(course_id, delta):
+    """تحديث عدد الدروس لجميع الطلاب في المادة بعبارة UPDATE واحدة."""
+    # update() يتجاوز auto_now، فيُمرر updated_at صراحة في كل تحديث تزايدي
+    StudentCourseProgress.objects.filter(course_id=course_id).update(
+        total_lessons=F('total_lessons') + delta, updated_at=timezone.now()
+    )
+
+
+def move_lesson(lesson_id, old_course_id, new_course_id):
+    """
+    درس نُقل من مادة إلى أخرى: يتغير عدد الدروس في المادتين، وينتقل إكماله
+    من المادة القديمة إلى الجديدة لكل طالب أكمله.
+    """
+    adjust_lesson_totals(old_course_id, -1)
+    adjust_lesson_totals(new_course_id, 1)
+
+    student_ids = set(
+        LessonProgress.objects.filter(lesson_id=lesson_id, status='completed').values_list('student_id', flat=True)
+    )
+    if not student_ids:
+        return
+    completed = _completed_counts(student_ids, [old_course_id, new_course_id])
+    for student_id in student_ids:
+        for course_id in (old_course_id, new_course_id):
+            StudentCourseProgress.objects.filter(student_id=student_id, course_id=course_id).update(
+                completed_lessons=completed.get((student_id, course_id), 0), updated_at=timezone.now()
+            )
+
+
+def refresh_completed_lessons(student_id, course_id):
+    completed = _completed_counts([student_id], [course_id]).get((student_id, course_id), 0)
+    StudentCourseProgress.objects.filter(student_id=student_id, course_id=course_id).update(
+        completed_lessons=completed, updated_at=timezone.now()
+    )
+
+
+def refresh_test_totals(student_id, course_id):
+    score_sum, max_sum = _test_totals([student_id], [course_id]).get((student_id, course_id), (0, 0))
+    StudentCourseProgress.objects.filter(student_id=student_id, course_id=course_id).update(
+        test_score_sum=score_sum, test_max_sum=max_sum, updated_at=timezone.now()
+    )
+
+
+def rebuild_course_progress(student_ids=None, batch_size=1000):
+    """
+    يعيد بناء جدول StudentCourseProgress بالكامل (أو لطلاب محددين) دفعة واحدة.
+    يرجع عدد الصفوف التي تمت كتابتها.
+    """
+    pairs = enrolled_pairs(student_ids=student_ids)
+    rows = build_progress_rows(pairs)
+    with transaction.atomic():
+        existing = StudentCourseProgress.objects.all()
+        if student_ids is not None:
+            existing = existing.filter(student_id__in=student_ids)
+        existing.delete()
+        StudentCourseProgress.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
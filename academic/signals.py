@@ -0,0 +1,158 @@
+# academic/signals.py
+
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import progress
+from .allocation import reconcile_enrolled_counts
+from .answer_keys import invalidate_answer_key
+from .notifications import notify_class_assignment
+from .models import Class, Lesson, LessonProgress, Option, Question, StudentCourseProgress, Test, TestResult
+
+
+# --------------------------------------------------------------------------
+# تحديث جدول StudentCourseProgress تدريجياً
+# --------------------------------------------------------------------------
+@receiver(pre_save, sender=Lesson)
+def lesson_remember_course(sender, instance, update_fields=None, **kwargs):
+    # المادة السابقة للدرس، لمعرفة ما إذا نُقل إلى مادة أخرى عند الحفظ
+    if instance._state.adding or (update_fields is not None and 'course' not in update_fields):
+        return
+    instance._previous_course_id = (
+        Lesson.objects.filter(pk=instance.pk).values_list('course_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, created, **kwargs):
+    if created:
+        progress.adjust_lesson_totals(instance.course_id, 1)
+        return
+    previous_course_id = getattr(instance, '_previous_course_id', None)
+    if previous_course_id is not None and previous_course_id != instance.course_id:
+        progress.move_lesson(instance.pk, previous_course_id, instance.course_id)
+    instance._previous_course_id = instance.course_id
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_removed(sender, instance, **kwargs):
+    progress.adjust_lesson_totals(instance.course_id, -1)
+
+
+@receiver(post_save, sender=LessonProgress)
+def lesson_progress_saved(sender, instance, **kwargs):
+    progress.refresh_completed_lessons(instance.student_id, instance.lesson.course_id)
+
+
+@receiver(post_delete, sender=LessonProgress)
+def lesson_progress_deleted(sender, instance, **kwargs):
+    if instance.status == 'completed':
+        # عند حذف درس يتم حذف سجلات التقدم المرتبطة به، لذلك نكتفي بإنقاص العداد
+        StudentCourseProgress.objects.filter(
+            student_id=instance.student_id, course__lessons__id=instance.lesson_id, completed_lessons__gt=0
+        ).update(completed_lessons=F('completed_lessons') - 1)
+
+
+@receiver(post_save, sender=TestResult)
+def test_result_saved(sender, instance, **kwargs):
+    if instance.status in progress.COUNTED_TEST_STATUSES and instance.test.course_id:
+        progress.refresh_test_totals(instance.student_id, instance.test.course_id)
+
+
+@receiver(post_delete, sender=TestResult)
+def test_result_deleted(sender, instance, **kwargs):
+    course_id = Test.objects.filter(pk=instance.test_id).values_list('course_id', flat=True).first()
+    if course_id:
+        progress.refresh_test_totals(instance.student_id, course_id)
+
+
+# --------------------------------------------------------------------------
+# مزامنة Class.enrolled_count مع جدول الربط
+# --------------------------------------------------------------------------
+@receiver(m2m_changed, sender=Class.students.through)
+def class_enrolled_count_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # بعد clear لن نعرف حلقات الطالب، لذلك نحفظها قبل الحذف
+        instance._cleared_class_ids = list(instance.enrolled_classes.values_list('id', flat=True))
+        return
+
+    if action == 'post_add' and pk_set:
+        # يحتوي pk_set هنا على الإضافات الجديدة فقط (يستبعد Django الموجود مسبقاً)
+        if reverse:
+            Class.objects.filter(pk__in=pk_set).update(enrolled_count=F('enrolled_count') + 1)
+        else:
+            Class.objects.filter(pk=instance.pk).update(enrolled_count=F('enrolled_count') + len(pk_set))
+    elif action == 'post_remove' and pk_set:
+        # pk_set عند الحذف لا يُصفّى للأعضاء الفعليين، لذلك نعيد العد بدل الإنقاص
+        reconcile_enrolled_counts(list(pk_set) if reverse else [instance.pk])
+    elif action == 'post_clear':
+        if reverse:
+            reconcile_enrolled_counts(getattr(instance, '_cleared_class_ids', []))
+        else:
+            Class.objects.filter(pk=instance.pk).update(enrolled_count=0)
+    else:
+        return
+
+    if not reverse:
+        instance.refresh_from_db(fields=['enrolled_count'])
+
+
+@receiver(m2m_changed, sender=Class.students.through)
+def class_students_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_clear':
+        # لا يتوفر pk_set عند clear، لذلك نعيد حساب الطالب أو الحلقة بالكامل
+        if reverse:
+            progress.rebuild_course_progress(student_ids=[instance.pk])
+        else:
+            student_ids = StudentCourseProgress.objects.filter(
+                course_id=instance.course_id
+            ).values_list('student_id', flat=True)
+            progress.prune_progress_rows(list(student_ids), [instance.course_id])
+        return
+
+    if reverse:
+        # user.enrolled_classes.add(...) -> pk_set يحتوي على معرفات الحلقات
+        course_ids = set(Class.objects.filter(pk__in=pk_set).values_list('course_id', flat=True))
+        pairs = {(instance.pk, course_id) for course_id in course_ids}
+    else:
+        pairs = {(student_id, instance.course_id) for student_id in pk_set}
+
+    if action == 'post_add':
+        progress.ensure_progress_rows(pairs)
+    else:
+        progress.prune_progress_rows(
+            {student_id for student_id, _ in pairs}, {course_id for _, course_id in pairs}
+        )
+
+
+@receiver(m2m_changed, sender=Class.students.through)
+def class_assignment_notice(sender, instance, action, reverse, pk_set, **kwargs):
+    # pk_set في post_add يحتوي على الإضافات الجديدة فقط، فلا يتكرر الإشعار
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        for class_id in pk_set:
+            notify_class_assignment(class_id, [instance.pk])
+    else:
+        notify_class_assignment(instance, pk_set)
+
+
+# --------------------------------------------------------------------------
+# إبطال مفتاح الإجابات المخزن عند تعديل الأسئلة أو الخيارات
+# --------------------------------------------------------------------------
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    invalidate_answer_key(instance.test_id)
+
+
+@receiver(post_save, sender=Option)
+@receiver(post_delete, sender=Option)
+def option_changed(sender, instance, **kwargs):
+    test_id = Question.objects.filter(pk=instance.question_id).values_list('test_id', flat=True).first()
+    if test_id:
+        invalidate_answer_key(test_id)
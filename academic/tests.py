@@ -1,3 +1,782 @@
-from django.test import TestCase
+import io
+import re
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import User
+from core.testing import DhadTestCase
+from jobs.models import Job
+from . import progress
+from .allocation import allocate_backlog, allocate_seat
+from .answer_keys import get_answer_key
+from .forms import BaseTestForm
+from .imports import ImportFileError, import_csv
+from .placement import ADVANCE, FLOOR, PLACE, RETREAT, PlacementGraph, get_placement_graph
+from .models import (
+    Assignment, Class, Course, EducationalFile, Lesson, LessonProgress, Option, Program, Question, StudentAnswer,
+    StudentCourseProgress, Submission, Test, TestResult,
+)
+
+
+class CourseDetailQueryCountTests(DhadTestCase):
+    """
+    صفحة تفاصيل المادة يجب أن تنفذ عدداً ثابتاً من الاستعلامات مهما كان عدد الواجبات.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher', first_name='أحمد')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.classmate = User.objects.create_user('classmate', role='student')
+        program = Program.objects.create(name='برنامج اللغة العربية')
+        cls.course = Course.objects.create(program=program, name='النحو')
+
+        now = timezone.now()
+        student_class = Class.objects.create(
+            course=cls.course, teacher=cls.teacher, class_code='NAHW-1',
+            start_time=now, end_time=now + timedelta(hours=1),
+        )
+        student_class.students.add(cls.student, cls.classmate)
+
+        Lesson.objects.bulk_create([
+            Lesson(course=cls.course, title=f'درس {i}', youtube_link='https://youtu.be/x') for i in range(5)
+        ])
+        EducationalFile.objects.bulk_create([
+            EducationalFile(course=cls.course, title=f'ملف {i}', file='educational_files/f.pdf', uploaded_by=cls.teacher)
+            for i in range(5)
+        ])
+
+    def _create_assignments(self, start, stop):
+        due_date = timezone.now() + timedelta(days=7)
+        assignments = Assignment.objects.bulk_create([
+            Assignment(course=self.course, title=f'واجب {i}', due_date=due_date) for i in range(start, stop)
+        ])
+        # الطالب سلّم نصف الواجبات
+        Submission.objects.bulk_create([
+            Submission(assignment=assignment, student=self.student, submitted_file='student_submissions/s.pdf')
+            for assignment in assignments[::2]
+        ])
+
+    def _count_course_detail_queries(self):
+        self.client.force_login(self.student)
+        url = reverse('academic:course_detail', args=[self.course.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_query_count_is_constant_in_number_of_assignments(self):
+        # طلب تمهيدي يملأ الكاش المشترك للصفحات (مثل عدد الرسائل غير المقروءة في الشريط العلوي)
+        self._count_course_detail_queries()
+        counts = {}
+        created = 0
+        for total in (10, 100, 1000):
+            self._create_assignments(created, total)
+            created = total
+            counts[total] = self._count_course_detail_queries()
+
+        self.assertEqual(counts[10], counts[100], counts)
+        self.assertEqual(counts[10], counts[1000], counts)
+
+    def test_submissions_are_matched_to_their_assignments(self):
+        self._create_assignments(0, 4)
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('academic:course_detail', args=[self.course.id]))
+
+        submitted = [data['has_submitted'] for data in response.context['assignments']]
+        self.assertEqual(submitted.count(True), 2)
+        self.assertEqual(len(submitted), 4)
+
+
+class StudentProgressEquivalenceTests(DhadTestCase):
+    """
+    أرقام StudentProgress (من جدول StudentCourseProgress) مقارنة بالحساب القديم في
+    User.get_overall_progress_percentage (استعلامان لكل مادة ونتيجة لكل اختبار).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', role='student')
+        program = Program.objects.create(name='برنامج اللغة العربية')
+        cls.nahw = Course.objects.create(program=program, name='النحو')
+        cls.sarf = Course.objects.create(program=program, name='الصرف')
+        # مادة بلا دروس
+        cls.balagha = Course.objects.create(program=program, name='البلاغة')
+        now = timezone.now()
+        for course in (cls.nahw, cls.sarf, cls.balagha):
+            Class.objects.create(course=course, start_time=now, end_time=now + timedelta(hours=1)).students.add(cls.student)
+
+        lessons = [
+            Lesson.objects.create(course=course, title=f'درس {i}', youtube_link='https://youtu.be/x')
+            for course, count in ((cls.nahw, 3), (cls.sarf, 2)) for i in range(count)
+        ]
+        LessonProgress.objects.create(student=cls.student, lesson=lessons[0], status='completed')
+        LessonProgress.objects.create(student=cls.student, lesson=lessons[1], status='started')
+        LessonProgress.objects.create(student=cls.student, lesson=lessons[3], status='completed')
+        TestResult.objects.create(student=cls.student, test=Test.objects.create(title='ت1', course=cls.nahw), score=80, status='completed')
+        TestResult.objects.create(student=cls.student, test=Test.objects.create(title='ت2', course=cls.sarf), score=45, status='finalized')
+
+    def _legacy(self, results):
+        """نسخة من الحساب القديم؛ results هي نتائج الاختبارات الداخلة في الحساب."""
+        total_lessons = completed_lessons = 0
+        per_course = {}
+        for course in self.student.get_enrolled_courses():
+            total = Lesson.objects.filter(course=course).count()
+            completed = LessonProgress.objects.filter(student=self.student, lesson__course=course, status='completed').count()
+            per_course[course.id] = (total, completed, round(completed / total * 100 if total else 0, 2))
+            total_lessons += total
+            completed_lessons += completed
+
+        score_sum = sum(result.score or 0 for result in results)
+        max_sum = 100 * len(results)
+        lessons_pct = completed_lessons / total_lessons * 100 if total_lessons else 0
+        tests_pct = score_sum / max_sum * 100 if max_sum else 0
+        overall = round(((lessons_pct / 100) * 70 + (tests_pct / 100) * 30) / 100 * 100, 2)
+        return overall, per_course
+
+    def _current(self):
+        engine = self.student.get_progress()
+        per_course = {
+            data['course'].id: (data['total_lessons'], data['completed_lessons'], data['completion_percentage'])
+            for data in engine.courses
+        }
+        return engine.overall_percentage, per_course
+
+    def test_matches_legacy_numbers(self):
+        current = self._current()
+        self.assertEqual(current, self._legacy(list(TestResult.objects.filter(student=self.student))))
+        self.assertEqual(current[1][self.balagha.id], (0, 0, 0))
+        self.assertEqual(self.student.get_overall_progress_percentage(), current[0])
+
+    def test_unfinished_and_courseless_results_are_not_counted(self):
+        # الحساب القديم كان يعد كل محاولة (حتى الجارية) كـ 0 من 100، ونتائج اختبارات بلا مادة
+        TestResult.objects.create(student=self.student, test=Test.objects.create(title='ت3', course=self.nahw), status='in_progress')
+        TestResult.objects.create(
+            student=self.student, test=Test.objects.create(title='تحديد المستوى', is_placement_test=True), score=90, status='finalized',
+        )
+
+        counted = [
+            result for result in TestResult.objects.filter(student=self.student, test__course__isnull=False)
+            if result.status in progress.COUNTED_TEST_STATUSES
+        ]
+        self.assertEqual(len(counted), 2)
+        self.assertEqual(self._current(), self._legacy(counted))
+        self.assertNotEqual(self._current()[0], self._legacy(list(TestResult.objects.filter(student=self.student)))[0])
+
+    def test_completion_index_matches_per_lesson_exists(self):
+        # درس مكتمل في مادة غير مسجل بها لا يدخل في الفهرس المحدود بمواد الطالب
+        outside = Course.objects.create(program=self.nahw.program, name='العروض')
+        outside_lesson = Lesson.objects.create(course=outside, title='درس', youtube_link='https://youtu.be/x')
+        LessonProgress.objects.create(student=self.student, lesson=outside_lesson, status='completed')
+
+        course_ids = [self.nahw.id, self.sarf.id, self.balagha.id]
+        lessons = progress.lessons_by_course(course_ids)
+        self.assertEqual(lessons[self.balagha.id], [])
+
+        with self.assertNumQueries(1):
+            index = progress.LessonCompletionIndex(self.student, course_ids=course_ids)
+        for course_id in course_ids:
+            for lesson in lessons[course_id]:
+                legacy = LessonProgress.objects.filter(student=self.student, lesson=lesson, status='completed').exists()
+                self.assertEqual(index.is_completed(lesson), legacy, lesson.title)
+                self.assertEqual(lesson.id in index, legacy)
+        self.assertNotIn(outside_lesson, index)
+        self.assertIn(outside_lesson, progress.LessonCompletionIndex(self.student))
+
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('core:progress_detail'))
+        shown = {
+            data['lesson'].id: data['is_completed']
+            for course in response.context['courses_progress_data'] for data in course['lessons_data']
+        }
+        self.assertEqual(shown, {lesson.id: index.is_completed(lesson) for lesson in sum(lessons.values(), [])})
+
+
+class CourseProgressSyncTests(DhadTestCase):
+    """
+    جدول StudentCourseProgress المحدّث بالإشارات يجب أن يطابق دائماً إعادة البناء الكاملة من المصدر.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', role='student')
+        cls.classmate = User.objects.create_user('classmate', role='student')
+        program = Program.objects.create(name='برنامج اللغة العربية')
+        cls.nahw = Course.objects.create(program=program, name='النحو')
+        cls.sarf = Course.objects.create(program=program, name='الصرف')
+        now = timezone.now()
+        cls.nahw_class, cls.sarf_class = [
+            Class.objects.create(course=course, start_time=now, end_time=now + timedelta(hours=1))
+            for course in (cls.nahw, cls.sarf)
+        ]
+
+    def _lesson(self, course, title='درس'):
+        return Lesson.objects.create(course=course, title=title, youtube_link='https://youtu.be/x')
+
+    def _stored(self):
+        return {
+            (row.student_id, row.course_id): (row.total_lessons, row.completed_lessons, row.test_score_sum, row.test_max_sum)
+            for row in StudentCourseProgress.objects.all()
+        }
+
+    def _rebuilt(self):
+        return {
+            (row.student_id, row.course_id): (row.total_lessons, row.completed_lessons, row.test_score_sum, row.test_max_sum)
+            for row in progress.build_progress_rows(progress.enrolled_pairs())
+        }
+
+    def assertInSync(self):
+        self.assertEqual(self._stored(), self._rebuilt())
+
+    def test_signals_keep_rows_in_sync(self):
+        lesson = self._lesson(self.nahw)
+        self.nahw_class.students.add(self.student, self.classmate)
+        self.sarf_class.students.add(self.student)
+        self.assertEqual(self._stored()[(self.student.pk, self.nahw.pk)], (1, 0, 0, 0))
+
+        self._lesson(self.nahw, 'درس ثانٍ')
+        LessonProgress.objects.create(student=self.student, lesson=lesson, status='completed')
+        test = Test.objects.create(title='اختبار النحو', course=self.nahw)
+        TestResult.objects.create(student=self.student, test=test, score=70, status='completed')
+        # النتائج غير المنتهية لا تدخل في الحساب
+        TestResult.objects.create(student=self.classmate, test=test, score=90, status='in_progress')
+        self.assertEqual(self._stored()[(self.student.pk, self.nahw.pk)], (2, 1, 70, 100))
+        self.assertInSync()
+
+        lesson.delete()
+        self.assertInSync()
+
+        self.nahw_class.students.remove(self.classmate)
+        self.assertNotIn((self.classmate.pk, self.nahw.pk), self._stored())
+        self.assertInSync()
+
+    def test_moving_a_lesson_updates_both_courses(self):
+        self.nahw_class.students.add(self.student, self.classmate)
+        self.sarf_class.students.add(self.student, self.classmate)
+        lesson = self._lesson(self.nahw)
+        self._lesson(self.nahw, 'درس باقٍ')
+        LessonProgress.objects.create(student=self.student, lesson=lesson, status='completed')
+
+        lesson.course = self.sarf
+        lesson.save()
+
+        stored = self._stored()
+        self.assertEqual(stored[(self.student.pk, self.nahw.pk)][:2], (1, 0))
+        self.assertEqual(stored[(self.student.pk, self.sarf.pk)][:2], (1, 1))
+        self.assertInSync()
+
+        # حفظ بلا نقل لا يغير شيئاً
+        lesson.title = 'عنوان جديد'
+        lesson.save()
+        self.assertEqual(self._stored(), stored)
+
+    def test_incremental_updates_advance_updated_at(self):
+        self.nahw_class.students.add(self.student)
+        self.sarf_class.students.add(self.student)
+        rows = StudentCourseProgress.objects.filter(student=self.student)
+        past = timezone.now() - timedelta(days=1)
+
+        def touched(course, change):
+            rows.update(updated_at=past)
+            change()
+            return rows.get(course=course).updated_at > past
+
+        lesson = self._lesson(self.nahw)
+        self.assertTrue(touched(self.nahw, lambda: self._lesson(self.nahw, 'درس ثانٍ')))
+        self.assertTrue(touched(self.nahw, lambda: LessonProgress.objects.create(
+            student=self.student, lesson=lesson, status='completed',
+        )))
+        test = Test.objects.create(title='اختبار النحو', course=self.nahw)
+        self.assertTrue(touched(self.nahw, lambda: TestResult.objects.create(
+            student=self.student, test=test, score=70, status='completed',
+        )))
+
+        lesson.course = self.sarf
+        self.assertTrue(touched(self.sarf, lesson.save))
+        self.assertLess(past, rows.get(course=self.nahw).updated_at)
+
+    def test_migration_backfills_existing_enrollments(self):
+        lesson = self._lesson(self.nahw)
+        self.nahw_class.students.add(self.student, self.classmate)
+        LessonProgress.objects.create(student=self.student, lesson=lesson, status='completed')
+        TestResult.objects.create(student=self.student, test=Test.objects.create(title='ت', course=self.nahw), score=55, status='finalized')
+        expected = self._rebuilt()
+        StudentCourseProgress.objects.all().delete()
+
+        migration = import_module('academic.migrations.0004_studentcourseprogress')
+        migration.populate_course_progress(apps, None)
+
+        self.assertEqual(self._stored(), expected)
+
+
+class EnrolledCountTests(DhadTestCase):
+    """
+    Class.enrolled_count يتبع جدول الربط في كل عمليات students من الجهتين، ويصلحه أمر المطابقة عند الانحراف.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        course = Course.objects.create(program=Program.objects.create(name='برنامج'), name='النحو')
+        now = timezone.now()
+        cls.first, cls.second = [
+            Class.objects.create(course=course, class_code=code, start_time=now, end_time=now + timedelta(hours=1))
+            for code in ('NAHW-1', 'NAHW-2')
+        ]
+        cls.students = [User.objects.create_user(f's{i}', role='student') for i in range(3)]
+
+    def _counts(self):
+        return dict(Class.objects.values_list('class_code', 'enrolled_count'))
+
+    def test_forward_add_remove_and_clear(self):
+        self.first.students.add(*self.students)
+        # إضافة طالب مسجل مسبقاً لا تزيد العداد
+        self.first.students.add(self.students[0])
+        self.assertEqual(self.first.enrolled_count, 3)
+
+        # حذف طالب غير مسجل لا ينقصه
+        self.first.students.remove(self.students[0], User.objects.create_user('outsider', role='student'))
+        self.assertEqual(self._counts()['NAHW-1'], 2)
+
+        self.first.students.clear()
+        self.assertEqual(self._counts()['NAHW-1'], 0)
+
+    def test_reverse_side_add_remove_and_clear(self):
+        student = self.students[0]
+        student.enrolled_classes.add(self.first, self.second)
+        self.assertEqual(self._counts(), {'NAHW-1': 1, 'NAHW-2': 1})
+
+        student.enrolled_classes.remove(self.first)
+        self.assertEqual(self._counts(), {'NAHW-1': 0, 'NAHW-2': 1})
+
+        self.first.students.add(self.students[1])
+        student.enrolled_classes.clear()
+        self.assertEqual(self._counts(), {'NAHW-1': 1, 'NAHW-2': 0})
+
+    def test_reconcile_command_repairs_drift(self):
+        self.first.students.add(*self.students)
+        Class.objects.filter(pk=self.first.pk).update(enrolled_count=7)
+        Class.objects.filter(pk=self.second.pk).update(enrolled_count=2)
+
+        out = io.StringIO()
+        call_command('reconcile_class_counts', dry_run=True, stdout=out)
+        self.assertIn(f'الحلقة #{self.first.pk}: المخزن 7، الفعلي 3', out.getvalue())
+        self.assertEqual(self._counts(), {'NAHW-1': 7, 'NAHW-2': 2})
+
+        call_command('reconcile_class_counts', stdout=io.StringIO())
+        self.assertEqual(self._counts(), {'NAHW-1': 3, 'NAHW-2': 0})
+
+        out = io.StringIO()
+        call_command('reconcile_class_counts', stdout=out)
+        self.assertIn('جميع العدادات متطابقة', out.getvalue())
+
+
+class AllocationTests(DhadTestCase):
+    """
+    توزيع الطلاب على حلقات مادة تحديد المستوى: لا تجاوز للسعة، وترتيب عادل، وتشغيل تجريبي بلا كتابة.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        program = Program.objects.create(name='برنامج اللغة العربية')
+        cls.course = Course.objects.create(program=program, name='تحديد المستوى', is_placement_course=True)
+        cls.ahmad = User.objects.create_user('t_ahmad', role='teacher')
+        cls.fatima = User.objects.create_user('t_fatima', role='teacher')
+
+    def _class(self, code, teacher, days, capacity=2, level='any'):
+        start = timezone.now() + timedelta(days=days)
+        return Class.objects.create(
+            course=self.course, teacher=teacher, class_code=code, capacity=capacity,
+            required_arabic_level=level, start_time=start, end_time=start + timedelta(hours=1),
+        )
+
+    def _pending(self, username, level='A1'):
+        return User.objects.create_user(username, role='student', is_active=False, determined_arabic_level=level)
+
+    def test_allocate_seat_stops_at_capacity(self):
+        cls = self._class('FULL-1', self.ahmad, days=1)
+        students = [self._pending(f's{i}') for i in range(3)]
+
+        placed = [allocate_seat(student, 'A1') for student in students]
+
+        self.assertEqual(placed[:2], [cls, cls])
+        self.assertIsNone(placed[2])
+        cls.refresh_from_db()
+        self.assertEqual((cls.enrolled_count, cls.students.count()), (2, 2))
+
+    def test_allocate_seat_prefers_least_full_then_earliest(self):
+        busy = self._class('BUSY', self.ahmad, days=1, capacity=4)
+        busy.students.add(self._pending('already'))
+        later = self._class('LATER', self.fatima, days=3, capacity=4)
+        sooner = self._class('SOONER', self.fatima, days=2, capacity=4)
+
+        self.assertEqual(allocate_seat(self._pending('s1'), 'A1'), sooner)
+        self.assertEqual(allocate_seat(self._pending('s2'), 'A1'), later)
+        # الحلقات الثلاث بالامتلاء نفسه الآن: الأقرب موعداً
+        self.assertEqual(allocate_seat(self._pending('s3'), 'A1'), busy)
+
+    def test_backlog_orders_by_fill_then_teacher_load_then_start(self):
+        first = self._class('AHMAD-1', self.ahmad, days=1)
+        second = self._class('AHMAD-2', self.ahmad, days=2)
+        third = self._class('FATIMA-1', self.fatima, days=3)
+        students = [self._pending(f's{i}') for i in range(3)]
+
+        assignments, unassigned = allocate_backlog()
+
+        # الثاني يذهب لفاطمة (لم تحصل على طالب بعد) رغم أن AHMAD-2 أقرب موعداً
+        self.assertEqual(assignments, [(students[0], first), (students[1], third), (students[2], second)])
+        self.assertEqual(unassigned, [])
+        self.assertEqual(
+            dict(Class.objects.values_list('class_code', 'enrolled_count')), {'AHMAD-1': 1, 'AHMAD-2': 1, 'FATIMA-1': 1}
+        )
+        self.assertFalse(User.objects.filter(pk__in=[s.pk for s in students], is_active=False).exists())
+
+    def test_backlog_dry_run_writes_nothing(self):
+        cls = self._class('DRY', self.ahmad, days=1)
+        student = self._pending('s1')
+
+        assignments, _ = allocate_backlog(dry_run=True)
+
+        self.assertEqual(assignments, [(student, cls)])
+        cls.refresh_from_db()
+        self.assertEqual((cls.enrolled_count, cls.students.count()), (0, 0))
+        self.assertFalse(User.objects.get(pk=student.pk).is_active)
+        self.assertFalse(StudentCourseProgress.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_backlog_reports_students_without_a_seat(self):
+        self._class('A1-ONLY', self.ahmad, days=1, capacity=1, level='A1')
+        placed = self._pending('s1', level='A1')
+        overflow = self._pending('s2', level='A1')
+        wrong_level = self._pending('s3', level='B2')
+
+        out = io.StringIO()
+        call_command('assign_pending_students', stdout=out)
+
+        self.assertEqual(list(Class.objects.get().students.all()), [placed])
+        self.assertIn(f'{overflow.username}: لا توجد حلقة مناسبة', out.getvalue())
+        self.assertIn(f'{wrong_level.username}: لا توجد حلقة مناسبة', out.getvalue())
+        self.assertIn('تم توزيع 1 طالب، وبقي 2 بدون حلقة', out.getvalue())
+        # الطلاب غير الموزعين يبقون مجمدين ليعاد توزيعهم لاحقاً
+        self.assertEqual(allocate_backlog(), ([], [overflow, wrong_level]))
+
+
+@override_settings(PLACEMENT_TEST_THRESHOLDS={'beginner_max_score': 39, 'intermediate_max_score': 79})
+class PlacementGraphTests(DhadTestCase):
+    """
+    رسم توجيه اختبارات تحديد المستوى: حذف الحواف المعطوبة، وحدود العتبات، وإبطال النسخة المخزنة.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def _test(self, level, **edges):
+        return Test.objects.create(title=f'تحديد المستوى {level}', is_placement_test=True, level=level, **edges)
+
+    def test_dead_and_cyclic_edges_are_dropped(self):
+        regular = Test.objects.create(title='اختبار عادي')
+        a1 = self._test('A1', next_test_on_failure=regular)
+        a2 = self._test('A2')
+        b1 = self._test('B1', next_test_on_success=a1)
+        Test.objects.filter(pk=a1.pk).update(next_test_on_success=a2)
+        Test.objects.filter(pk=a2.pk).update(next_test_on_success=b1)
+
+        with self.assertLogs('academic.placement', 'WARNING') as logs:
+            graph = PlacementGraph.build()
+
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(graph.entry_test.pk, a1.pk)
+        # الحافة إلى اختبار ليس لتحديد المستوى تُحذف، والحلقة A1 -> A2 -> B1 -> A1 تُكسر عند آخر حافة
+        self.assertIsNone(graph.next_on_failure(a1.pk))
+        self.assertEqual(graph.success_edges, {a1.pk: a2.pk, a2.pk: b1.pk})
+
+    def test_routing_at_threshold_boundaries(self):
+        a1 = self._test('A1')
+        a2 = self._test('A2', next_test_on_failure=a1)
+        Test.objects.filter(pk=a1.pk).update(next_test_on_success=a2)
+        graph = PlacementGraph.build()
+        a1.refresh_from_db()
+
+        def decision(test, score):
+            result = graph.route(test, score)
+            return result.action, result.level, result.next_test and result.next_test.pk
+
+        self.assertEqual(decision(a1, 39), (FLOOR, 'A1', None))
+        self.assertEqual(decision(a1, 40), (PLACE, 'A1', None))
+        self.assertEqual(decision(a1, 41), (PLACE, 'A1', None))
+        self.assertEqual(decision(a1, 79), (PLACE, 'A1', None))
+        self.assertEqual(decision(a1, 80), (ADVANCE, 'A1', a2.pk))
+        self.assertEqual(decision(a1, 81), (ADVANCE, 'A1', a2.pk))
+        self.assertEqual(decision(a2, 39), (RETREAT, 'A2', a1.pk))
+        # أعلى اختبار بلا حافة نجاح: تحديد المستوى به
+        self.assertEqual(decision(a2, 95), (PLACE, 'A2', None))
+
+    def test_saving_a_test_invalidates_the_cached_graph(self):
+        a1 = self._test('A1')
+        a2 = self._test('A2', next_test_on_failure=a1)
+        self.assertEqual(get_placement_graph().next_on_failure(a2.pk).pk, a1.pk)
+        with self.assertNumQueries(0):
+            get_placement_graph()
+
+        a2.next_test_on_failure = None
+        a2.save()
+        self.assertIsNone(get_placement_graph().next_on_failure(a2.pk))
+
+        a2.delete()
+        self.assertNotIn(a2.pk, get_placement_graph().nodes)
+
+
+class TestGradingTests(DhadTestCase):
+    """
+    التصحيح من مفتاح الإجابات المخزن: يطابق المسار القديم (استعلام لكل سؤال)، ويُبطل عند تعديل
+    الأسئلة والخيارات، وحفظ الإجابات يتم كاملاً أو لا يتم.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', role='student')
+        cls.test = Test.objects.create(title='اختبار النحو')
+        cls.choice = Question.objects.create(test=cls.test, text='اختر', question_type='multiple_choice', score_points=2)
+        cls.right = Option.objects.create(question=cls.choice, text='المبتدأ', is_correct=True)
+        cls.wrong = Option.objects.create(question=cls.choice, text='الخبر')
+        cls.true_false = Question.objects.create(test=cls.test, text='صح أم خطأ', question_type='true_false', score_points=3)
+        Option.objects.create(question=cls.true_false, text='True', is_correct=True)
+        Option.objects.create(question=cls.true_false, text='False')
+        cls.short = Question.objects.create(test=cls.test, text='اشرح', question_type='short_answer', score_points=5)
+
+    def setUp(self):
+        cache.clear()
+        self.result = TestResult.objects.create(student=self.student, test=self.test)
+
+    def _form(self, choice, true_false, short='جواب'):
+        return BaseTestForm(
+            {
+                f'question_{self.choice.id}': str(choice),
+                f'question_{self.true_false.id}': true_false,
+                f'question_{self.short.id}': short,
+            },
+            questions=list(self.test.questions.order_by('id')),
+            test_result_instance=self.result,
+        )
+
+    def _legacy_score(self, choice, true_false):
+        # التصحيح كما كان قبل مفتاح الإجابات: استعلام لكل سؤال
+        score = 0
+        if Option.objects.get(id=choice).is_correct:
+            score += self.choice.score_points
+        if self.true_false.options.filter(is_correct=True, text=true_false).exists():
+            score += self.true_false.score_points
+        return score
+
+    def _answers(self):
+        return sorted(
+            StudentAnswer.objects.filter(test_result=self.result)
+            .values_list('question_id', 'selected_option_id', 'is_correct')
+        )
+
+    def test_scores_match_the_per_question_path(self):
+        for choice in (self.right.id, self.wrong.id):
+            for true_false in ('True', 'False'):
+                form = self._form(choice, true_false)
+                self.assertTrue(form.is_valid(), form.errors)
+                self.assertEqual(form.score, self._legacy_score(choice, true_false), (choice, true_false))
+
+    def test_question_and_option_changes_invalidate_the_key(self):
+        key = get_answer_key(self.test.id)
+        self.assertEqual(key[self.choice.id]['correct_option_ids'], {self.right.id})
+
+        self.wrong.is_correct = True
+        self.wrong.save()
+        self.assertEqual(get_answer_key(self.test.id)[self.choice.id]['correct_option_ids'], {self.right.id, self.wrong.id})
+
+        self.choice.score_points = 4
+        self.choice.save()
+        self.assertEqual(get_answer_key(self.test.id)[self.choice.id]['points'], 4)
+
+        self.wrong.delete()
+        self.assertEqual(get_answer_key(self.test.id)[self.choice.id]['option_ids'], {self.right.id})
+
+        self.short.delete()
+        self.assertNotIn(self.short.id, get_answer_key(self.test.id))
+        # بلا تغيير: يُقرأ من الكاش دون استعلامات
+        with self.assertNumQueries(0):
+            get_answer_key(self.test.id)
+
+    def test_resubmission_replaces_the_answer_set(self):
+        first = self._form(self.wrong.id, 'False')
+        self.assertTrue(first.is_valid())
+        first.save_answers_and_update_test_result()
+
+        second = self._form(self.right.id, 'True')
+        self.assertTrue(second.is_valid())
+        second.save_answers_and_update_test_result()
+
+        self.result.refresh_from_db()
+        self.assertEqual((self.result.score, self.result.status), (5, 'completed'))
+        self.assertEqual(self._answers(), [
+            (self.choice.id, self.right.id, True), (self.true_false.id, None, True), (self.short.id, None, False),
+        ])
+
+    def test_failed_save_keeps_the_previous_answers(self):
+        first = self._form(self.wrong.id, 'False')
+        self.assertTrue(first.is_valid())
+        first.save_answers_and_update_test_result()
+        before = self._answers()
+
+        second = self._form(self.right.id, 'True')
+        self.assertTrue(second.is_valid())
+        with mock.patch.object(TestResult, 'save', side_effect=DatabaseError('انقطع الاتصال')):
+            with self.assertRaises(DatabaseError):
+                second.save_answers_and_update_test_result()
+
+        self.assertEqual(self._answers(), before)
+        self.result.refresh_from_db()
+        self.assertEqual((self.result.score, self.result.status), (0, 'completed'))
+
+
+class CSVImportTests(DhadTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        program = Program.objects.create(name='برنامج اللغة العربية')
+        cls.course = Course.objects.create(program=program, name='النحو')
+        now = timezone.now()
+        cls.cls = Class.objects.create(
+            course=cls.course, teacher=cls.teacher, class_code='NAHW-1', capacity=3,
+            start_time=now, end_time=now + timedelta(hours=1),
+        )
+
+    def _import(self, kind, text, **kwargs):
+        return import_csv(kind, io.StringIO(text), **kwargs)
+
+    def test_users_import_skips_invalid_rows(self):
+        result = self._import('users', (
+            'username,email,first_name,role\n'
+            's1,s1@example.com,سارة,student\n'
+            'teacher,t@example.com,,teacher\n'
+            's2,s2@example.com,,admin2\n'
+            's1,dup@example.com,,student\n'
+            's3,,,student\n'
+            's4,not-an-email,,student\n'
+        ), chunk_size=2)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5, 6, 7])
+        user = User.objects.get(username='s1')
+        self.assertEqual(user.role, 'student')
+        self.assertFalse(user.has_usable_password())
+
+    def test_imported_user_can_activate_and_log_in(self):
+        self._import('users', 'username,email,first_name\nnew,new@example.com,سارة\n', site_url='http://testserver')
+        # بيانات الدخول لا تُخزن في طابور المهام، ويُنشئها العامل عند الإرسال
+        self.assertNotIn('/activate/', str(Job.objects.get().payload))
+
+        call_command('run_jobs', once=True, stdout=io.StringIO())
+        self.assertEqual(mail.outbox[0].to, ['new@example.com'])
+        link = re.search(r'http://testserver(/activate/\S+/)', mail.outbox[0].body).group(1)
+        response = self.client.post(link, {'new_password1': 'Dhad-Student-2026', 'new_password2': 'Dhad-Student-2026'})
+        self.assertRedirects(response, '/login/', fetch_redirect_response=False)
+
+        self.assertTrue(self.client.login(username='new', password='Dhad-Student-2026'))
+
+    def test_classes_import_resolves_course_and_teacher(self):
+        result = self._import('classes', (
+            'class_code,course,teacher,start_time,end_time,capacity\n'
+            'NAHW-2,النحو,teacher,2030-01-01 10:00,2030-01-01 11:00,5\n'
+            f'NAHW-3,{self.course.pk},,2030-01-02 10:00,2030-01-02 11:00,\n'
+            'NAHW-4,الصرف,,2030-01-02 10:00,2030-01-02 11:00,\n'
+            'NAHW-1,النحو,,2030-01-02 10:00,2030-01-02 11:00,\n'
+        ))
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([line for line, _ in result.errors], [4, 5])
+        new_class = Class.objects.get(class_code='NAHW-2')
+        self.assertEqual((new_class.teacher, new_class.capacity), (self.teacher, 5))
+        self.assertEqual(Class.objects.get(class_code='NAHW-3').capacity, 10)
+
+    def test_enrollments_import_respects_capacity(self):
+        User.objects.bulk_create([User(username=f's{i}', email=f's{i}@example.com', role='student') for i in range(5)])
+        rows = ''.join(f'NAHW-1,s{i}\n' for i in range(5))
+        result = self._import('enrollments', 'class_code,username\n' + rows + 'NAHW-1,s0\nNAHW-9,s1\n', chunk_size=2)
+
+        self.cls.refresh_from_db()
+        self.assertEqual(result.created, 3)
+        self.assertEqual(self.cls.enrolled_count, 3)
+        self.assertEqual(self.cls.students.count(), 3)
+        self.assertEqual(len(result.errors), 4)
+        self.assertEqual(Job.objects.count(), 3)
+
+    def test_dry_run_reports_errors_without_writing(self):
+        User.objects.create_user('s0', role='student')
+        result = self._import('enrollments', 'class_code,username\nNAHW-1,s0\nNAHW-1,nobody\n', dry_run=True)
+
+        self.assertEqual((result.created, len(result.errors)), (1, 1))
+        self.assertFalse(self.cls.students.exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_missing_columns_rejects_file(self):
+        with self.assertRaises(ImportFileError):
+            self._import('enrollments', 'class_code\nNAHW-1\n')
+
+    def test_admin_upload(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(admin_user)
+        url = reverse('admin:academic_class_import_csv')
+        upload = io.BytesIO('\ufeffusername,email\nnew,new@example.com\n'.encode('utf-8'))
+        upload.name = 'users.csv'
+
+        response = self.client.post(url, {'kind': 'users', 'csv_file': upload}, follow=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.filter(username='new').exists())
+
+    def _staff(self, username, *codenames):
+        user = User.objects.create_user(username, is_staff=True)
+        user.user_permissions.set(Permission.objects.filter(codename__in=codenames))
+        return user
+
+    def _upload(self, kind, text):
+        upload = io.BytesIO(text.encode('utf-8'))
+        upload.name = f'{kind}.csv'
+        return self.client.post(reverse('admin:academic_class_import_csv'), {'kind': kind, 'csv_file': upload})
+
+    def test_admin_upload_checks_permission_per_kind(self):
+        self.client.force_login(self._staff('no_perms'))
+        self.assertEqual(self.client.get(reverse('admin:academic_class_import_csv')).status_code, 403)
+
+        self.client.force_login(self._staff('class_manager', 'add_class'))
+        response = self._upload('users', 'username,email\nnew,new@example.com\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('kind', response.context['form'].errors)
+        self.assertFalse(User.objects.filter(username='new').exists())
+
+        User.objects.create_user('s0', role='student')
+        response = self._upload('enrollments', 'class_code,username\nNAHW-1,s0\n')
+        self.assertIn('kind', response.context['form'].errors)
+        self.assertFalse(self.cls.students.exists())
+
+        self.client.force_login(self._staff('enroller', 'change_class'))
+        self._upload('enrollments', 'class_code,username\nNAHW-1,s0\n')
+        self.assertTrue(self.cls.students.filter(username='s0').exists())
+
+    def test_only_superusers_import_admin_accounts(self):
+        self.client.force_login(self._staff('user_manager', 'add_user'))
+        response = self._upload('users', 'username,email,role\nboss,boss@example.com,admin\nt2,t2@example.com,teacher\n')
+        self.assertEqual([line for line, _ in response.context['result'].errors], [2])
+        self.assertFalse(User.objects.filter(username='boss').exists())
+        self.assertTrue(User.objects.filter(username='t2').exists())
+
+        result = self._import('users', 'username,email,role\nboss,boss@example.com,admin\n')
+        self.assertEqual(result.created, 1)
@@ -28,11 +28,16 @@ from .models import (
 
 # Importing forms from the current app
 from .forms import SubmissionForm, BaseTestForm
+from .answer_keys import get_answer_key, max_auto_graded_score
+from .placement import get_placement_graph, ADVANCE, PLACE, RETREAT
+from .allocation import allocate_seat, get_placement_course
 
 # Importing User model from core app
 from core.models import User # Ensure this is correct based on your project structure
+from core.queries import query_budget
 
 @login_required
+@query_budget(12)
 def course_detail(request, course_id):
     """
     Displays the details of a specific course, including lessons, educational files,
@@ -47,29 +52,39 @@ def course_detail(request, course_id):
     # Check if the user is a student and is subscribed to this course
     if request.user.role == 'student':
         # Get the specific class instance the student is enrolled in for this course
-        student_class = Class.objects.filter(course=course, students=request.user).first()
+        student_class = Class.objects.filter(course=course, students=request.user).select_related('teacher').first()
         if student_class:
             is_subscribed = True
             # Get all students in this class, excluding the current user
             classmates = student_class.students.exclude(id=request.user.id).order_by('first_name', 'last_name')
 
+    # معلم المادة (أول حلقة) يُجلب مرة واحدة بدلاً من course.classes.first في القالب
+    course_class = student_class or Class.objects.filter(course=course).select_related('teacher').first()
+    course_teacher = course_class.teacher if course_class else None
+
     # Fetch lessons and educational files for the course
     lessons = Lesson.objects.filter(course=course).order_by('published_date')
-    educational_files = EducationalFile.objects.filter(course=course).order_by('-uploaded_at')
+    educational_files = EducationalFile.objects.filter(course=course).select_related('uploaded_by').order_by('-uploaded_at')
 
     # Logic for assignments
     assignments_data = []
+    submission_form = None
     if is_subscribed: # Assignments are only visible to subscribed students
+        # جميع تسليمات الطالب في هذه المادة باستعلام واحد، مفهرسة حسب assignment_id
+        submissions_by_assignment = {
+            submission.assignment_id: submission
+            for submission in Submission.objects.filter(assignment__course=course, student=request.user)
+        }
+        submission_form = SubmissionForm() # نموذج فارغ واحد يُعاد استخدامه لكل الواجبات
+
         assignments_qs = Assignment.objects.filter(course=course).order_by('due_date')
         for assignment in assignments_qs:
-            # Check if the student has already submitted this assignment
-            submitted = Submission.objects.filter(assignment=assignment, student=request.user).first()
+            submitted = submissions_by_assignment.get(assignment.id)
 
             assignments_data.append({
                 'assignment': assignment,
                 'submitted_data': submitted, # Submission data if already submitted
                 'has_submitted': submitted is not None,
-                'submission_form': SubmissionForm() # An empty form for each assignment
             })
 
     context = {
@@ -80,6 +95,8 @@ def course_detail(request, course_id):
         'educational_files': educational_files,
         'youtube_embed_base_url': 'https://www.youtube.com/embed/', # Correct YouTube embed base URL
         'assignments': assignments_data, # Pass assignment data
+        'submission_form': submission_form,
+        'course_teacher': course_teacher,
         'classmates': classmates, # Pass classmates list to the template
     }
     return render(request, 'academic/course_detail.html', context)
@@ -134,6 +151,7 @@ def submit_assignment(request, assignment_id):
 
 
 @login_required
+@query_budget(10)
 def test_list(request):
     """
     يعرض قائمة الاختبارات المتاحة للطالب.
@@ -155,8 +173,12 @@ def test_list(request):
         # يمكننا عرض اختبارات الدورات العادية التي التحق بها الطالب هنا
         enrolled_courses_ids = request.user.get_enrolled_courses().values_list('id', flat=True)
         regular_tests = Test.objects.filter(course__id__in=enrolled_courses_ids, is_placement_test=False).order_by('-created_at')
+        # آخر نتيجة للطالب في كل اختبار باستعلام واحد (الترتيب الافتراضي: الأحدث أولاً)
+        latest_results = {}
+        for result in TestResult.objects.filter(test__in=regular_tests, student=request.user):
+            latest_results.setdefault(result.test_id, result)
         for test in regular_tests:
-            result = TestResult.objects.filter(test=test, student=request.user).first()
+            result = latest_results.get(test.id)
             tests_for_display.append({
                 'test': test,
                 'result': result,
@@ -168,7 +190,7 @@ def test_list(request):
             student=request.user,
             test__is_placement_test=True,
             status='in_progress' # ابحث عن اختبار تحديد مستوى قيد التقدم
-        ).order_by('-start_time').first()
+        ).select_related('test').order_by('-start_time').first()
 
         if current_placement_test_result:
             # إذا كان هناك اختبار قيد التقدم، اعرضه للطالب للمتابعة
@@ -180,7 +202,7 @@ def test_list(request):
             messages.info(request, f"لديك اختبار تحديد مستوى قيد التقدم: {current_placement_test_result.test.title}. أكمله لتحديد مستواك.")
         else:
             # إذا لم يكن هناك اختبار قيد التقدم ولم يتم تحديد مستوى، اعرض اختبار A1 كنقطة بداية
-            initial_placement_test = Test.objects.filter(is_placement_test=True, level='A1').first()
+            initial_placement_test = get_placement_graph().entry_test # من رسم التوجيه المخزن دون استعلام
             if initial_placement_test:
                 tests_for_display.append({
                     'test': initial_placement_test,
@@ -193,8 +215,12 @@ def test_list(request):
         # إضافة أي اختبارات عادية أخرى للطالب (مثلاً من الدورات المسجل فيها)
         enrolled_courses_ids = request.user.get_enrolled_courses().values_list('id', flat=True)
         regular_tests = Test.objects.filter(course__id__in=enrolled_courses_ids, is_placement_test=False).order_by('-created_at')
+        # آخر نتيجة للطالب في كل اختبار باستعلام واحد (الترتيب الافتراضي: الأحدث أولاً)
+        latest_results = {}
+        for result in TestResult.objects.filter(test__in=regular_tests, student=request.user):
+            latest_results.setdefault(result.test_id, result)
         for test in regular_tests:
-            result = TestResult.objects.filter(test=test, student=request.user).first()
+            result = latest_results.get(test.id)
             tests_for_display.append({
                 'test': test,
                 'result': result,
@@ -232,17 +258,17 @@ def start_test(request, test_id):
             student=student_user,
             test__is_placement_test=True,
             status='in_progress' # ابحث عن اختبار تحديد مستوى قيد التقدم
-        ).order_by('-start_time').first()
+        ).select_related('test').order_by('-start_time').first()
 
         if current_placement_test_result:
             # إذا كان هناك اختبار تحديد مستوى قيد التقدم، وتطابق test_id مع الاختبار الحالي للطالب
-            if current_placement_test_result.test.id == test_id:
+            if current_placement_test_result.test_id == test_id:
                 messages.info(request, f"تواصل اختبار تحديد المستوى: {test.title}.")
                 test_result = current_placement_test_result
             else:
                 # إذا كان test_id لا يتطابق، نوجه الطالب إلى الاختبار الجاري
                 messages.info(request, f"لديك اختبار تحديد مستوى آخر قيد التقدم: {current_placement_test_result.test.title}. سيتم توجيهك إليه.")
-                return redirect('academic:start_test', test_id=current_placement_test_result.test.id)
+                return redirect('academic:start_test', test_id=current_placement_test_result.test_id)
         else:
             # إذا لم يكن هناك اختبار تحديد مستوى قيد التقدم، ابدأ هذا الاختبار
             messages.info(request, f"بدء اختبار تحديد مستوى جديد: {test.title}.")
@@ -314,7 +340,7 @@ def submit_test(request, test_result_id):
         messages.error(request, 'طريقة الطلب غير مسموح بها.')
         return redirect('dashboard')
 
-    test_result = get_object_or_404(TestResult, id=test_result_id, student=request.user)
+    test_result = get_object_or_404(TestResult.objects.select_related('test'), id=test_result_id, student=request.user)
     test = test_result.test
     student_user = request.user
 
@@ -337,37 +363,34 @@ def submit_test(request, test_result_id):
         # We need to re-fetch or use the updated test_result from the form for placement logic.
         # Since the form updates the instance passed to it, `test_result` here is already updated.
 
-        max_score = sum(q.score_points for q in questions_for_form if q.question_type != 'short_answer') # Only auto-gradable questions
+        max_score = max_auto_graded_score(form.answer_key) # Only auto-gradable questions
         percentage_score = (test_result.score / max_score) * 100 if max_score > 0 else 0
 
         # ----------------------------------------------------------------------
         # منطق الاختبارات تحديد المستوى متعدد المراحل
         # ----------------------------------------------------------------------
         if test.is_placement_test:
-            SUCCESS_THRESHOLD = 80 # للانتقال للمستوى التالي (higher level)
-            PASS_THRESHOLD = 50 # لتحديد مستوى الطالب بهذا المستوى
+            # قرار التوجيه يأتي من رسم التوجيه المخزن وعتبات PLACEMENT_TEST_THRESHOLDS في الإعدادات
+            decision = get_placement_graph().route(test, percentage_score)
 
             # test_result.status is already 'completed' from form.save_answers_and_update_test_result()
-            # test_result.passed is also set by the form based on `form.score` against thresholds if any logic was there
+            test_result.determined_level_at_this_stage = test.level # يسجل المستوى الذي تم اختباره
 
-            if percentage_score >= SUCCESS_THRESHOLD and test.next_test_on_success:
+            if decision.action == ADVANCE:
                 # أداء ممتاز: ينتقل الطالب لاختبار المستوى التالي (أعلى)
-                # test_result.determined_level_at_this_stage and passed are ideally set by the form
-                test_result.determined_level_at_this_stage = test.level # Ensure this is set
-                test_result.passed = True # Ensure this is set
-                test_result.status = 'completed' # Ensure this is set
+                test_result.passed = True
+                test_result.status = 'completed'
                 test_result.save() # Save any changes made here after form save
 
-                messages.success(request, f"أداء ممتاز في {test.title}! سيتم توجيهك إلى اختبار المستوى التالي ({test.next_test_on_success.title}).")
-                return redirect('academic:start_test', test_id=test.next_test_on_success.id)
+                messages.success(request, f"أداء ممتاز في {test.title}! سيتم توجيهك إلى اختبار المستوى التالي ({decision.next_test.title}).")
+                return redirect('academic:start_test', test_id=decision.next_test.id)
 
-            elif percentage_score >= PASS_THRESHOLD:
+            elif decision.action == PLACE:
                 # أداء متوسط: يتم تحديد مستوى الطالب بهذا المستوى بشكل نهائي
-                test_result.determined_level_at_this_stage = test.level
                 test_result.is_final_placement_result = True
                 test_result.status = 'finalized'
                 test_result.passed = True
-                student_user.determined_arabic_level = test.level
+                student_user.determined_arabic_level = decision.level
                 student_user.save() # حفظ المستوى المحدد في ملف المستخدم
                 test_result.save() # Save any changes made here after form save
 
@@ -376,28 +399,28 @@ def submit_test(request, test_result_id):
                 found_class_and_activate_student(request, student_user, student_user.determined_arabic_level)
                 return redirect('dashboard')
 
-            else: # percentage_score < PASS_THRESHOLD
-                # أداء ضعيف: ينتقل الطالب لاختبار المستوى السابق (أدنى) إن وجد
-                test_result.determined_level_at_this_stage = test.level # يسجل المستوى الذي فشل فيه
+            elif decision.action == RETREAT:
+                # أداء ضعيف: ينتقل الطالب لاختبار المستوى السابق (أدنى)
                 test_result.passed = False
                 test_result.status = 'completed' # Still completed, just not passed
                 test_result.save() # Save any changes made here after form save
 
-                if test.next_test_on_failure:
-                    messages.warning(request, f"نتيجتك في {test.title} تتطلب منك إعادة اختبار تحديد المستوى بمستوى أدنى. سيتم توجيهك الآن إلى {test.next_test_on_failure.title}.")
-                    return redirect('academic:start_test', test_id=test.next_test_on_failure.id)
-                else:
-                    # إذا لم يكن هناك اختبار أدنى متاح (وصل إلى أدنى مستوى ولم ينجح فيه)
-                    # يتم تعيينه للمستوى الأدنى (A1) وتفعيله أو تجميده
-                    student_user.determined_arabic_level = 'A1' # Or 'unassigned' if admin intervention is needed
-                    student_user.save()
-                    test_result.is_final_placement_result = True
-                    test_result.status = 'finalized'
-                    test_result.save() # Save any changes made here after form save
-                    messages.error(request, f"لم تتمكن من اجتياز اختبار {test.title}. تم تحديد مستواك المبدئي كـ {student_user.get_determined_arabic_level_display()}.")
-                    # محاولة البحث عن حصة مناسبة للطالب وتفعيله حتى لو كان A1
-                    found_class_and_activate_student(request, student_user, student_user.determined_arabic_level)
-                    return redirect('dashboard')
+                messages.warning(request, f"نتيجتك في {test.title} تتطلب منك إعادة اختبار تحديد المستوى بمستوى أدنى. سيتم توجيهك الآن إلى {decision.next_test.title}.")
+                return redirect('academic:start_test', test_id=decision.next_test.id)
+
+            else: # FLOOR
+                # إذا لم يكن هناك اختبار أدنى متاح (وصل إلى أدنى مستوى ولم ينجح فيه)
+                # يتم تعيينه للمستوى الأدنى (A1) وتفعيله أو تجميده
+                test_result.passed = False
+                student_user.determined_arabic_level = decision.level
+                student_user.save()
+                test_result.is_final_placement_result = True
+                test_result.status = 'finalized'
+                test_result.save() # Save any changes made here after form save
+                messages.error(request, f"لم تتمكن من اجتياز اختبار {test.title}. تم تحديد مستواك المبدئي كـ {student_user.get_determined_arabic_level_display()}.")
+                # محاولة البحث عن حصة مناسبة للطالب وتفعيله حتى لو كان A1
+                found_class_and_activate_student(request, student_user, student_user.determined_arabic_level)
+                return redirect('dashboard')
 
         # ----------------------------------------------------------------------
         # منطق الاختبارات العادية (ليست تحديد مستوى)
@@ -440,10 +463,8 @@ def test_result_detail(request, test_result_id):
     # Retrieve all answers submitted for this test result from the new StudentAnswer model
     student_answers = StudentAnswer.objects.filter(test_result=test_result).select_related('question', 'selected_option').order_by('question__id')
 
-    # Get all questions for the test to calculate total points possible
-    all_questions_for_test = test_result.test.questions.all()
     # Calculate max possible score only from auto-gradable questions if short_answer is manually graded
-    max_possible_score = sum(q.score_points for q in all_questions_for_test if q.question_type != 'short_answer')
+    max_possible_score = max_auto_graded_score(get_answer_key(test_result.test_id))
 
     # Calculate score percentage for display
     score_percentage = 0
@@ -475,28 +496,11 @@ def found_class_and_activate_student(request, student_user, determined_level):
     """
     found_class = None
     try:
-        arabic_course = None
-        # First, try to get the course by ID from settings
-        if hasattr(settings, 'ARABIC_PLACEMENT_COURSE_ID') and settings.ARABIC_PLACEMENT_COURSE_ID:
-            arabic_course = Course.objects.filter(id=settings.ARABIC_PLACEMENT_COURSE_ID).first()
-
-        # If not found by ID, try to find one marked as 'is_placement_course'
-        if not arabic_course:
-            arabic_course = Course.objects.filter(is_placement_course=True).first()
+        arabic_course = get_placement_course()
 
         if arabic_course:
-            # البحث عن حصص في هذه المادة تطابق المستوى المحدد للطالب أو 'any'
-            # Note: The `required_arabic_level` choices in Class model should align with `DETERMINED_LEVEL_CHOICES`
-            available_classes = Class.objects.filter(
-                course=arabic_course,
-                required_arabic_level__in=[determined_level, 'any'], # Check for specific level or 'any'
-                start_time__gt=timezone.now(), # حصص مستقبلية فقط
-            ).exclude(students=student_user).order_by('start_time')
-
-            for cls in available_classes:
-                if not cls.is_full(): # التأكد من وجود أماكن متاحة
-                    found_class = cls
-                    break
+            # حجز مقعد في الحلقة الأقل امتلاءً باستعلام واحد مع قفل صف الحلقة
+            found_class = allocate_seat(student_user, determined_level, course=arabic_course)
         else:
             messages.warning(request, 'لم يتم تحديد المادة الأساسية لاختبار تحديد المستوى في النظام.')
 
@@ -504,10 +508,10 @@ def found_class_and_activate_student(request, student_user, determined_level):
         messages.error(request, f'حدث خطأ أثناء البحث عن حصص مناسبة: {e}')
 
     if found_class:
-        found_class.students.add(student_user) # تسجيل الطالب في الحصة
         student_user.is_active = True # تفعيل حساب الطالب
         student_user.save()
-        messages.success(request, f'تهانينا! لقد تم تسجيلك تلقائياً في حصة "{found_class.course.name}" مع المعلم {found_class.teacher.get_full_name() or found_class.teacher.username}.')
+        teacher_name = (found_class.teacher.get_full_name() or found_class.teacher.username) if found_class.teacher else 'غير محدد'
+        messages.success(request, f'تهانينا! لقد تم تسجيلك تلقائياً في حصة "{found_class.course.name}" مع المعلم {teacher_name}.')
     else:
         # إذا لم يتم العثور على حصة مناسبة
         student_user.is_active = False # تجميد حساب الطالب
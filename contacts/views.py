@@ -4,12 +4,24 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from .forms import ContactForm
 from .utils import COUNTRY_DATA # <-- لم نعد بحاجة لـ get_flag_url هنا
+from core.cache import cache_public_page
+from jobs.tasks import enqueue_email
 
+CONTACT_ACKNOWLEDGEMENT_SUBJECT = 'تم استلام رسالتك - منصة ضاد التعليمية'
+
+# GET للزوار يُخدم من الكاش؛ POST ينفذ دائماً
+@cache_public_page()
 def contact_view(request):
     if request.method == 'POST':
         form = ContactForm(request.POST)
         if form.is_valid():
-            form.save()
+            contact_message = form.save()
+            # إشعار الاستلام يُرسل من عامل المهام الخلفية وليس أثناء الطلب
+            enqueue_email(
+                [contact_message.email], CONTACT_ACKNOWLEDGEMENT_SUBJECT,
+                'contacts/emails/contact_acknowledgement_email.html',
+                {'name': contact_message.name, 'subject': contact_message.subject},
+            )
             messages.success(request, 'تم إرسال رسالتك بنجاح! سنقوم بالرد عليك قريباً.')
             return redirect('contacts:contact_success')
         else:
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin # استيراد UserAdmin الأصلي
 from .models import User # استيراد نموذج المستخدم المخصص الخاص بنا
+from dashboard.exports import EXPORTS, export_actions
 
 # لتخصيص عرض نموذج المستخدم في لوحة الإدارة
 class CustomUserAdmin(BaseUserAdmin):
@@ -9,6 +10,9 @@ class CustomUserAdmin(BaseUserAdmin):
     
     # إضافة الحقول المخصصة إلى فلاتر القائمة (list_filter)
     list_filter = BaseUserAdmin.list_filter + ('role', 'determined_arabic_level')
+
+    # تصدير المستخدمين المحددين (أو كل نتائج الفلترة) بشكل متدفق
+    actions = export_actions(EXPORTS['users'])
     
     # إضافة الحقول المخصصة إلى حقول البحث (search_fields)
     search_fields = BaseUserAdmin.search_fields + ('phone_number', 'country')
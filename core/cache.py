@@ -0,0 +1,222 @@
+# core/cache.py
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.http import urlencode
+
+# --------------------------------------------------------------------------
+# عدادات الإصابة والإخفاق
+# --------------------------------------------------------------------------
+# عدادات داخل العملية (لكل عامل خادم على حدة)، تُعرض بصيغة Prometheus في core.views.cache_metrics
+_stats_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def record_hit(stat):
+    with _stats_lock:
+        _hits[stat] += 1
+
+
+def record_miss(stat):
+    with _stats_lock:
+        _misses[stat] += 1
+
+
+def cache_stats():
+    """{اسم العداد: (الإصابات، الإخفاقات)}"""
+    with _stats_lock:
+        return {stat: (_hits[stat], _misses[stat]) for stat in sorted(set(_hits) | set(_misses))}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _hits.clear()
+        _misses.clear()
+
+
+def prometheus_metrics():
+    lines = [
+        '# HELP dhad_cache_hits_total Cache lookups served from the cache.',
+        '# TYPE dhad_cache_hits_total counter',
+        '# HELP dhad_cache_misses_total Cache lookups that had to be recomputed.',
+        '# TYPE dhad_cache_misses_total counter',
+    ]
+    pid = os.getpid()
+    for stat, (hits, misses) in cache_stats().items():
+        lines.append(f'dhad_cache_hits_total{{cache="{stat}",pid="{pid}"}} {hits}')
+        lines.append(f'dhad_cache_misses_total{{cache="{stat}",pid="{pid}"}} {misses}')
+    return '\n'.join(lines) + '\n'
+
+
+# --------------------------------------------------------------------------
+# مفاتيح بإصدارات
+# --------------------------------------------------------------------------
+def _version_key(namespace):
+    return f'cache_version:{namespace}'
+
+
+def namespace_version(namespace):
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        # قيمة زمنية بدلاً من 1 حتى لا نعيد استخدام نسخة قديمة إذا حُذف مفتاح الإصدار من الكاش
+        version = time.time_ns()
+        if not cache.add(_version_key(namespace), version, None):
+            version = cache.get(_version_key(namespace), version)
+    return version
+
+
+def bump_namespace(namespace):
+    """يرفع إصدار النطاق، فتُهمل كل المفاتيح المخزنة تحته دون حذفها واحداً واحداً."""
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.set(_version_key(namespace), time.time_ns(), None)
+
+
+def versioned_key(namespace, *parts):
+    return ':'.join([namespace, str(namespace_version(namespace)), *map(str, parts)])
+
+
+_MISSING = object()
+
+
+def get_or_compute(key, compute, timeout, stat):
+    """يقرأ المفتاح من الكاش أو يحسبه ويخزنه، ويسجل الإصابة أو الإخفاق تحت اسم العداد stat."""
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        record_hit(stat)
+        return value
+    record_miss(stat)
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
+
+
+def invalidate_on_change(namespace, *models):
+    """
+    يرفع إصدار النطاق عند حفظ أو حذف أي كائن من النماذج المعطاة.
+    الرفع يتم فوراً ثم مرة أخرى بعد نجاح المعاملة، حتى لا تبقى نسخة حُسبت من بيانات ما قبل الحفظ.
+    يُستدعى من AppConfig.ready().
+    """
+    def receiver(sender, **kwargs):
+        bump_namespace(namespace)
+        transaction.on_commit(lambda: bump_namespace(namespace))
+
+    for model in models:
+        for signal in (post_save, post_delete):
+            signal.connect(receiver, sender=model, weak=False, dispatch_uid=f'cache:{namespace}:{model._meta.label}')
+
+
+# --------------------------------------------------------------------------
+# تخزين الصفحات العامة
+# --------------------------------------------------------------------------
+PUBLIC_PAGES_NAMESPACE = 'pages'
+_CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+_CSRF_PLACEHOLDER = '__dhad_csrf_token__'
+
+
+def _cacheable_request(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        # الرسائل المؤقتة (messages) خاصة بالزائر ولا يجوز تخزينها مع الصفحة
+        and not len(get_messages(request))
+    )
+
+
+def _public_page_key(request, query_params):
+    # المفتاح هو المسار ومعاملات الاستعلام التي تقرؤها الصفحة فقط، فلا ينشئ ?utm=... أو أي معامل عشوائي
+    # مدخلاً جديداً في الكاش
+    params = sorted((name, value) for name in query_params for value in request.GET.getlist(name))
+    return versioned_key(PUBLIC_PAGES_NAMESPACE, request.path + ('?' + urlencode(params) if params else ''))
+
+
+def cache_public_page(timeout=None, query_params=()):
+    """
+    يخزن الصفحة كاملة للزوار غير المسجلين (GET فقط)، والمسجلون يرون دائماً صفحة حية
+    لأن الشريط العلوي يختلف لكل مستخدم.
+    query_params: معاملات الاستعلام التي تغير محتوى الصفحة؛ غيرها لا يدخل في مفتاح الكاش.
+    رمز CSRF في النماذج يُستبدل بعلامة عند التخزين ويُملأ برمز الزائر عند كل عرض.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            seconds = settings.PUBLIC_PAGE_CACHE_SECONDS if timeout is None else timeout
+            if not seconds or not _cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            key = _public_page_key(request, query_params)
+            cached = cache.get(key)
+            if cached is not None:
+                record_hit(PUBLIC_PAGES_NAMESPACE)
+                return _restore(request, cached)
+
+            record_miss(PUBLIC_PAGES_NAMESPACE)
+            response = view_func(request, *args, **kwargs)
+            entry = _freeze(request, response)
+            if entry is not None:
+                cache.set(key, entry, seconds)
+            return response
+        return wrapper
+    return decorator
+
+
+def _freeze(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    content = response.content.decode(response.charset)
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        # الصفحة استخدمت رمز CSRF: يُخزن فقط إذا وجدناه في حقول النماذج لنستبدله
+        tokens = set(_CSRF_INPUT.findall(content))
+        if not tokens:
+            return None
+        for token in tokens:
+            content = content.replace(token, _CSRF_PLACEHOLDER)
+    return {'content': content, 'content_type': response['Content-Type']}
+
+
+def _restore(request, entry):
+    content = entry['content']
+    if _CSRF_PLACEHOLDER in content:
+        # get_token يجعل CsrfViewMiddleware يضع ملف تعريف CSRF للزائر
+        content = content.replace(_CSRF_PLACEHOLDER, get_token(request))
+    return HttpResponse(content, content_type=entry['content_type'])
+
+
+# --------------------------------------------------------------------------
+# أجزاء شريط التنقل في base.html
+# --------------------------------------------------------------------------
+# حقول المستخدم التي تظهر في الشريط؛ تغيير أي منها يرفع إصدار أجزاء المستخدم
+NAV_FIELDS = {'username', 'role', 'is_staff', 'profile_picture'}
+NAV_FRAGMENT_TIMEOUT = 60 * 60
+
+
+def nav_namespace(user_id):
+    return f'core:nav:{user_id}'
+
+
+def nav_cache_key(request):
+    """
+    جزء مفتاح {% cache %} لأجزاء الشريط: معرف المستخدم ودوره وإصدار أجزائه (أو anon للزوار).
+    يُحسب مرة واحدة لكل طلب.
+    """
+    if not hasattr(request, '_nav_cache_key'):
+        user = request.user
+        if user.is_authenticated:
+            request._nav_cache_key = f'{user.pk}:{user.role}:{namespace_version(nav_namespace(user.pk))}'
+        else:
+            request._nav_cache_key = 'anon'
+    return request._nav_cache_key
@@ -0,0 +1,201 @@
+# core/directory.py
+
+import re
+import unicodedata
+
+from django.db import connection, transaction
+
+from .models import User, UserDirectoryEntry
+
+# جدول FTS5 الافتراضي على SQLite: rowid = معرف المستخدم
+FTS_TABLE = 'core_userdirectory_fts'
+# عمود tsvector المخزن (بفهرس GIN) على PostgreSQL، يضيفه الترحيل 0003
+SEARCH_VECTOR_COLUMN = 'search_vector'
+DEFAULT_SEARCH_LIMIT = 20
+
+# وزن تطابق بداية الكلمة مقابل تطابق المقاطع الثلاثية (trigrams) في الترتيب
+TOKEN_WEIGHT = 10.0
+TRIGRAM_WEIGHT = 1.0
+
+# التشكيل (الفتحة إلى السكون) والألف الخنجرية والتطويل
+_ARABIC_MARKS = re.compile('[\u064B-\u0652\u0670\u0640]')
+_FOLDED_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+})
+_TOKEN_SPLIT = re.compile(r'[^\w]+|_')
+
+
+def normalize_arabic(text):
+    """
+    توحيد النص للبحث: حذف التشكيل والتطويل، وتوحيد أشكال الألف، والتاء المربوطة هاءً،
+    والألف المقصورة ياءً، وتحويل الحروف اللاتينية إلى صغيرة.
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text)
+    text = _ARABIC_MARKS.sub('', text)
+    return text.translate(_FOLDED_LETTERS).casefold()
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_SPLIT.split(normalize_arabic(text)) if token]
+
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def user_tokens(user):
+    """كلمات البحث للمستخدم: الاسم الأول والأخير واسم المستخدم والجزء الأول من البريد."""
+    email_name = (user.email or '').split('@', 1)[0]
+    tokens = []
+    for value in (user.first_name, user.last_name, user.username, email_name):
+        for token in tokenize(value):
+            if token not in tokens:
+                tokens.append(token)
+    return tokens
+
+
+def build_entry_values(user):
+    tokens = user_tokens(user)
+    grams = sorted({gram for token in tokens for gram in trigrams(token)})
+    return {'role': user.role, 'tokens': ' '.join(tokens), 'trigrams': ' '.join(grams)}
+
+
+# --------------------------------------------------------------------------
+# تحديث الفهرس
+# --------------------------------------------------------------------------
+_fts5_available = {}
+
+
+def uses_fts5():
+    """هل يوجد جدول FTS5 في قاعدة البيانات الحالية؟ (يُفحص مرة واحدة لكل قاعدة)"""
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts5_available:
+        _fts5_available[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts5_available[name]
+
+
+def index_users(users):
+    """يحدّث صفوف الفهرس (وجدول FTS5 على SQLite) لقائمة مستخدمين."""
+    entries = [UserDirectoryEntry(user_id=user.pk, **build_entry_values(user)) for user in users]
+    if not entries:
+        return
+    UserDirectoryEntry.objects.bulk_create(
+        entries, update_conflicts=True, unique_fields=['user'], update_fields=['role', 'tokens', 'trigrams'],
+    )
+    if uses_fts5():
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(entry.user_id,) for entry in entries])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, tokens, trigrams) VALUES (%s, %s, %s)',
+                [(entry.user_id, entry.tokens, entry.trigrams) for entry in entries],
+            )
+
+
+def remove_users(user_ids):
+    if user_ids and uses_fts5():
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(user_id,) for user_id in user_ids])
+
+
+def rebuild_directory(batch_size=1000):
+    """يعيد بناء الفهرس لجميع المستخدمين. يرجع عدد المستخدمين المفهرسين."""
+    with transaction.atomic():
+        UserDirectoryEntry.objects.all().delete()
+        if uses_fts5():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+        count = 0
+        batch = []
+        users = User.objects.only('id', 'role', 'first_name', 'last_name', 'username', 'email').order_by('id')
+        for user in users.iterator(chunk_size=batch_size):
+            batch.append(user)
+            if len(batch) >= batch_size:
+                index_users(batch)
+                count += len(batch)
+                batch = []
+        index_users(batch)
+    return count + len(batch)
+
+
+# --------------------------------------------------------------------------
+# البحث
+# --------------------------------------------------------------------------
+def _fts_query(tokens):
+    # لكل كلمة: تطابق بداية كلمة في الأسماء، أو أي مقطع ثلاثي منها (للأخطاء الإملائية)
+    clauses = []
+    for token in tokens:
+        alternatives = [f'tokens : "{token}"*']
+        grams = sorted(trigrams(token))
+        if grams:
+            alternatives.append('trigrams : (' + ' OR '.join(f'"{gram}"' for gram in grams) + ')')
+        clauses.append('(' + ' OR '.join(alternatives) + ')')
+    return ' AND '.join(clauses)
+
+
+def _search_sqlite(tokens, roles, exclude_user_id, limit):
+    entry_table = UserDirectoryEntry._meta.db_table
+    role_placeholders = ', '.join(['%s'] * len(roles))
+    sql = (
+        f'SELECT e.user_id FROM {FTS_TABLE} f JOIN {entry_table} e ON e.user_id = f.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s AND e.role IN ({role_placeholders}) AND e.user_id <> %s '
+        f'ORDER BY bm25({FTS_TABLE}, %s, %s), e.user_id LIMIT %s'
+    )
+    params = [_fts_query(tokens), *roles, exclude_user_id or 0, TOKEN_WEIGHT, TRIGRAM_WEIGHT, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_postgresql(tokens, roles, exclude_user_id, limit):
+    # الوزن A لبداية الكلمة في الأسماء وB للمقاطع الثلاثية؛ المطابقة @@ تستخدم فهرس GIN على العمود المخزن
+    clauses = []
+    for token in tokens:
+        alternatives = [f"'{token}':*A"] + [f"'{gram}':B" for gram in sorted(trigrams(token))]
+        clauses.append('(' + ' | '.join(alternatives) + ')')
+    entry_table = UserDirectoryEntry._meta.db_table
+    role_placeholders = ', '.join(['%s'] * len(roles))
+    sql = (
+        f"SELECT user_id FROM {entry_table}, to_tsquery('simple', %s) query "
+        f'WHERE {SEARCH_VECTOR_COLUMN} @@ query AND role IN ({role_placeholders}) AND user_id <> %s '
+        f'ORDER BY ts_rank({SEARCH_VECTOR_COLUMN}, query) DESC, user_id LIMIT %s'
+    )
+    params = [' & '.join(clauses), *roles, exclude_user_id or 0, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_fallback(tokens, roles, exclude_user_id, limit):
+    entries = UserDirectoryEntry.objects.filter(role__in=roles).exclude(user_id=exclude_user_id)
+    for token in tokens:
+        entries = entries.filter(tokens__contains=token)
+    return list(entries.order_by('user_id').values_list('user_id', flat=True)[:limit])
+
+
+def search_users(query, roles, exclude_user_id=None, limit=DEFAULT_SEARCH_LIMIT):
+    """
+    بحث مرتب ومحدود في دليل المستخدمين: FTS5 على SQLite، وtsvector على PostgreSQL،
+    وبحث contains على الكلمات الموحدة في غير ذلك.
+    يرجع قائمة المستخدمين بترتيب الصلة.
+    """
+    tokens = tokenize(query)
+    if not tokens or not roles:
+        return []
+    roles = list(roles)
+
+    if uses_fts5():
+        user_ids = _search_sqlite(tokens, roles, exclude_user_id, limit)
+    elif connection.vendor == 'postgresql':
+        user_ids = _search_postgresql(tokens, roles, exclude_user_id, limit)
+    else:
+        user_ids = _search_fallback(tokens, roles, exclude_user_id, limit)
+
+    users = User.objects.in_bulk(user_ids)
+    return [users[user_id] for user_id in user_ids if user_id in users]
@@ -0,0 +1,58 @@
+# core/management/commands/benchmark_base_template.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+
+from core.models import User
+
+# صفحة بلا محتوى: يُقاس base.html وحده (الشريط العلوي وقائمة الجوال والتذييل)
+BENCHMARK_TEMPLATE = "{% extends 'base.html' %}{% block content %}{% endblock %}"
+DUMMY_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    help = (
+        'قياس زمن عرض base.html لكل دور: بدون تخزين الأجزاء (DummyCache) ثم مع تخزين أجزاء الشريط. '
+        'المستخدمون غير محفوظين، ولا يُكتب شيء في قاعدة البيانات.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=500, help='عدد مرات العرض لكل حالة.')
+
+    def _request(self, user):
+        url = reverse('core:dashboard')
+        request = RequestFactory().get(url)
+        request.user = user
+        request.resolver_match = resolve(url)
+        # العداد محسوب مسبقاً كما في الطلبات الفعلية بعد أول قراءة من الكاش
+        request._unread_messages_count = 3
+        return request
+
+    def _timed(self, template, user, renders):
+        # أول عرض يملأ الكاش ولا يدخل في القياس
+        template.render({}, self._request(user))
+        started = time.perf_counter()
+        for _ in range(renders):
+            template.render({}, self._request(user))
+        return (time.perf_counter() - started) / renders * 1000
+
+    def handle(self, *args, **options):
+        renders = options['renders']
+        template = engines['django'].from_string(BENCHMARK_TEMPLATE)
+        users = {
+            'student': User(pk=10 ** 9, username='bench-student', role='student'),
+            'teacher': User(pk=10 ** 9 + 1, username='bench-teacher', role='teacher'),
+            'admin': User(pk=10 ** 9 + 2, username='bench-admin', role='admin', is_staff=True),
+        }
+
+        for role, user in users.items():
+            with override_settings(CACHES=DUMMY_CACHES):
+                uncached = self._timed(template, user, renders)
+            cached = self._timed(template, user, renders)
+            self.stdout.write(f'{role}: بدون تخزين {uncached:.2f} ms، مع تخزين الأجزاء {cached:.2f} ms ({uncached / cached:.1f}x)')
+
+        self.stdout.write(self.style.SUCCESS('انتهى القياس.'))
@@ -0,0 +1,60 @@
+# core/management/commands/benchmark_provisioning.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import User
+from core.provisioning import (
+    ACTIVATION_MODE, PASSWORD_MODE, create_accounts, generate_password, hash_passwords, hash_workers,
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'قياس زمن تجهيز دفعة حسابات (1000 افتراضياً): التشفير التسلسلي (مقدّراً من عينة)، '
+        'والتشفير في مجموعة عمليات، وطريقة رابط التفعيل. لا يُحفظ أي حساب.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=1000, help='عدد الحسابات في الدفعة.')
+        parser.add_argument('--workers', type=int, default=None, help='عدد عمليات التشفير (الافتراضي من الإعدادات أو عدد الأنوية).')
+        parser.add_argument('--serial-sample', type=int, default=20,
+                            help='حجم العينة لتقدير زمن التشفير التسلسلي (التشفير الكامل لـ 1000 حساب يستغرق دقائق).')
+
+    def _timed(self, func):
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started
+
+    def _provision(self, count, mode, workers):
+        users = [User(username=f'bench-{mode}-{i}', email=f'bench-{mode}-{i}@example.com', role='student') for i in range(count)]
+        try:
+            with transaction.atomic():
+                create_accounts(users, mode=mode, workers=workers)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def handle(self, *args, **options):
+        count = options['accounts']
+        workers = hash_workers(options['workers'])
+        sample = max(min(options['serial_sample'], count), 1)
+
+        sample_passwords = [generate_password() for _ in range(sample)]
+        serial_sample = self._timed(lambda: hash_passwords(sample_passwords, workers=1))
+        serial_estimate = serial_sample / sample * count
+        self.stdout.write(f'تشفير تسلسلي (تقدير من {sample} حساب): {serial_estimate:.1f} ثانية لـ {count} حساب')
+
+        pooled = self._timed(lambda: self._provision(count, PASSWORD_MODE, workers))
+        self.stdout.write(f'كلمات مرور مشفرة في {workers} عملية + الحفظ: {pooled:.1f} ثانية ({serial_estimate / pooled:.1f}x)')
+
+        activation = self._timed(lambda: self._provision(count, ACTIVATION_MODE, workers))
+        self.stdout.write(f'روابط تفعيل + الحفظ: {activation:.2f} ثانية ({serial_estimate / activation:.0f}x)')
+
+        self.stdout.write(self.style.SUCCESS('انتهى القياس (تم التراجع عن جميع الحسابات).'))
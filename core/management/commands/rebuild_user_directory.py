@@ -0,0 +1,16 @@
+# core/management/commands/rebuild_user_directory.py
+
+from django.core.management.base import BaseCommand
+
+from core.directory import rebuild_directory
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء فهرس البحث في دليل المستخدمين (وجدول FTS5 على SQLite) بالكامل.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='عدد المستخدمين في كل دفعة.')
+
+    def handle(self, *args, **options):
+        count = rebuild_directory(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'تمت فهرسة {count} مستخدم.'))
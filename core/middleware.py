@@ -0,0 +1,73 @@
+# core/middleware.py
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+from .queries import QueryBudgetExceeded, QueryStats, logger
+
+
+class QueryBudgetMiddleware:
+    """
+    يعد استعلامات قاعدة البيانات وزمنها لكل طلب ويضيفهما إلى ترويسة Server-Timing.
+    - شكل SQL تكرر QUERY_BUDGET_REPEAT_THRESHOLD مرة أو أكثر يُسجَّل كـ N+1 محتمل مع اسم دالة العرض.
+    - تجاوز ميزانية @query_budget يُسجَّل، ويُرفع QueryBudgetExceeded إذا كان QUERY_BUDGET_RAISE مفعلاً (في الاختبارات).
+    استعلامات الاستجابات المتدفقة التي تُنفذ أثناء الإرسال لا تدخل في العد.
+    تعمل تحت WSGI وASGI: تحت ASGI لا تُحوَّل السلسلة إلى متزامنة، فلا تحجز دوال العرض غير المتزامنة
+    (conversation_stream وpoll_messages) خيطاً طوال انتظارها.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        # اتصالات قاعدة البيانات خاصة بكل خيط، واستعلامات الدوال غير المتزامنة تُنفذ في خيط
+        # sync_to_async (الواحد لكل طلب)، فيُركَّب الغلاف على اتصال ذلك الخيط
+        stats = QueryStats()
+        wrapper = await sync_to_async(self._enter_wrapper)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrapper.__exit__)(None, None, None)
+        return self.finish(request, response, stats)
+
+    @staticmethod
+    def _enter_wrapper(stats):
+        wrapper = connection.execute_wrapper(stats)
+        wrapper.__enter__()
+        return wrapper
+
+    def finish(self, request, response, stats):
+        response['Server-Timing'] = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+        self.check(request, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = getattr(view_func, 'query_budget', None)
+
+    def check(self, request, stats):
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+
+        for shape, count in stats.repeated_shapes(settings.QUERY_BUDGET_REPEAT_THRESHOLD):
+            logger.warning('Possible N+1 in %s: %d× %s', view_name, count, shape)
+
+        budget = getattr(request, '_query_budget', None)
+        if budget is not None and stats.count > budget:
+            message = f'{view_name} executed {stats.count} queries (budget {budget}, {stats.duration * 1000:.1f} ms)'
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
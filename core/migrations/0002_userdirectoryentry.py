@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:40
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'core_userdirectory_fts'
+
+# نسخة مجمدة من core.directory.build_entry_values كما كانت عند كتابة هذا الترحيل،
+# حتى لا يتغير ناتج الترحيل إذا تغيرت الدالة الحية لاحقاً
+_ARABIC_MARKS = re.compile('[\u064B-\u0652\u0670\u0640]')
+_FOLDED_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+})
+_TOKEN_SPLIT = re.compile(r'[^\w]+|_')
+
+
+def tokenize(text):
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKC', text)
+    text = _ARABIC_MARKS.sub('', text).translate(_FOLDED_LETTERS).casefold()
+    return [token for token in _TOKEN_SPLIT.split(text) if token]
+
+
+def build_entry_values(user):
+    email_name = (user.email or '').split('@', 1)[0]
+    tokens = []
+    for value in (user.first_name, user.last_name, user.username, email_name):
+        for token in tokenize(value):
+            if token not in tokens:
+                tokens.append(token)
+    grams = sorted({token[i:i + 3] for token in tokens for i in range(len(token) - 2)})
+    return {'role': user.role, 'tokens': ' '.join(tokens), 'trigrams': ' '.join(grams)}
+
+
+def create_fts_table(apps, schema_editor):
+    # جدول FTS5 على SQLite فقط؛ إن لم تكن الإضافة متوفرة يعمل البحث بالطريقة الاحتياطية
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(tokens, trigrams, tokenize='unicode61')"
+        )
+    except OperationalError:
+        pass
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def build_directory(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    UserDirectoryEntry = apps.get_model('core', 'UserDirectoryEntry')
+    entries = [
+        UserDirectoryEntry(user_id=user.pk, **build_entry_values(user))
+        for user in User.objects.only('id', 'role', 'first_name', 'last_name', 'username', 'email')
+    ]
+    UserDirectoryEntry.objects.bulk_create(entries, batch_size=1000)
+
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, tokens, trigrams) VALUES (%s, %s, %s)',
+                [(entry.user_id, entry.tokens, entry.trigrams) for entry in entries],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDirectoryEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='directory_entry', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+                ('role', models.CharField(db_index=True, max_length=10, verbose_name='الدور')),
+                ('tokens', models.TextField(verbose_name='كلمات البحث')),
+                ('trigrams', models.TextField(verbose_name='المقاطع الثلاثية')),
+            ],
+            options={
+                'verbose_name': 'مدخل دليل المستخدمين',
+                'verbose_name_plural': 'دليل المستخدمين',
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(build_directory, migrations.RunPython.noop),
+    ]
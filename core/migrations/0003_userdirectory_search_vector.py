@@ -0,0 +1,39 @@
+# core/migrations/0003_userdirectory_search_vector.py
+
+from django.db import migrations
+
+ENTRY_TABLE = 'core_userdirectoryentry'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+SEARCH_VECTOR_INDEX = 'core_userdirectory_search_gin'
+
+
+def add_search_vector(apps, schema_editor):
+    # على PostgreSQL فقط: عمود tsvector مولَّد ومخزن (يتحدث مع tokens وtrigrams تلقائياً) وفهرس GIN عليه،
+    # فلا يُحسب to_tsvector لكل صف عند كل بحث. على SQLite يقوم جدول FTS5 بهذا الدور
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f"ALTER TABLE {ENTRY_TABLE} ADD COLUMN IF NOT EXISTS {SEARCH_VECTOR_COLUMN} tsvector "
+        f"GENERATED ALWAYS AS (setweight(to_tsvector('simple', tokens), 'A') || "
+        f"setweight(to_tsvector('simple', trigrams), 'B')) STORED"
+    )
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {SEARCH_VECTOR_INDEX} ON {ENTRY_TABLE} USING GIN ({SEARCH_VECTOR_COLUMN})'
+    )
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_VECTOR_INDEX}')
+        schema_editor.execute(f'ALTER TABLE {ENTRY_TABLE} DROP COLUMN IF EXISTS {SEARCH_VECTOR_COLUMN}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_userdirectoryentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
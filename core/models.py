@@ -132,103 +132,46 @@ class User(AbstractUser):
         upcoming_classes = Class.objects.filter(
             students=self,
             end_time__gte=now
-        ).order_by('start_time')
+        ).select_related('course', 'teacher').order_by('start_time') # المادة والمعلم يُعرضان لكل حلقة
 
         return upcoming_classes
 
     # --------------------------------------------------------------------------
-    # **NEW METHOD: get_overall_progress_percentage**
-    # This is the method you need to add to your User model.
+    # نسبة التقدم الكلية للطالب
     # --------------------------------------------------------------------------
-    def get_overall_progress_percentage(self):
+    def get_progress(self):
         """
-        Calculates the overall progress percentage for the student.
-        This method needs to be implemented based on your academic structure.
-
-        Example logic might include:
-        1. Percentage of lessons completed within enrolled courses.
-        2. Average score on tests taken.
-        3. Completion of specific milestones/modules.
+        يرجع كائن StudentProgress الذي يحسب التقدم بعدد ثابت من الاستعلامات.
+        """
+        from academic.progress import StudentProgress  # استيراد محلي لتجنب الاستيراد الدائري
+        return StudentProgress.for_student(self)
 
-        For now, this is a placeholder. You must replace it with your actual logic.
+    def get_overall_progress_percentage(self):
+        """
+        يحسب نسبة التقدم الكلية للطالب:
+        70% لإكمال الدروس في المواد المسجل بها، و30% لنتائج الاختبارات.
         """
         if self.role != 'student':
             return 0  # Only students have progress percentage
+        return self.get_progress().overall_percentage
 
-        # Dynamically get models from the 'academic' app to avoid circular imports
-        Course = apps.get_model('academic', 'Course')
-        Lesson = apps.get_model('academic', 'Lesson')
-        LessonProgress = apps.get_model('academic', 'LessonProgress')
-        Test = apps.get_model('academic', 'Test') # Assuming Test model exists
-        TestResult = apps.get_model('academic', 'TestResult')
-
-        total_progress_points = 0
-        achieved_progress_points = 0
-
-        # --- Example Progress Logic (You need to customize this heavily) ---
-
-        # 1. Progress based on lessons completed (Weight: 70%)
-        enrolled_courses = self.get_enrolled_courses() # Reuse the existing method
-        total_lessons_in_enrolled_courses = 0
-        completed_lessons_count = 0
-
-        for course in enrolled_courses:
-            total_lessons_in_course = Lesson.objects.filter(course=course).count()
-            total_lessons_in_enrolled_courses += total_lessons_in_course
-
-            # Count lessons completed by this student in this course
-            completed_lessons_count += LessonProgress.objects.filter(
-                student=self,
-                lesson__course=course,
-                status='completed'
-            ).count()
-
-        if total_lessons_in_enrolled_courses > 0:
-            lesson_completion_percentage = (completed_lessons_count / total_lessons_in_enrolled_courses) * 100
-        else:
-            lesson_completion_percentage = 0
-
-        # Assign weight to lesson completion (e.g., 70% of overall progress)
-        total_progress_points += 70
-        achieved_progress_points += (lesson_completion_percentage / 100) * 70
-
-        # 2. Progress based on test scores (Weight: 30%)
-        student_test_results = TestResult.objects.filter(student=self)
-
-        total_test_score_sum = 0
-        max_possible_test_score_sum = 0
-
-        for result in student_test_results:
-            # FIX: Handle case where result.score might be None
-            total_test_score_sum += (result.score if result.score is not None else 0)
-
-            # Assuming your Test model has a 'max_score' field
-            if hasattr(result.test, 'max_score') and result.test.max_score is not None:
-                max_possible_test_score_sum += result.test.max_score
-            else:
-                # Fallback if Test model doesn't have max_score or it's None.
-                # You might want to get this from individual test questions' max scores
-                # or a default for each test. Adjust this logic based on your Test model.
-                max_possible_test_score_sum += 100 # Example default or a calculated value
-
-        if max_possible_test_score_sum > 0:
-            test_score_percentage = (total_test_score_sum / max_possible_test_score_sum) * 100
-        else:
-            test_score_percentage = 0
-
-        # Assign weight to test scores (e.g., 30% of overall progress)
-        total_progress_points += 30
-        achieved_progress_points += (test_score_percentage / 100) * 30
-
-        # Calculate overall percentage
-        if total_progress_points > 0:
-            overall_percentage = (achieved_progress_points / total_progress_points) * 100
-        else:
-            overall_percentage = 0
-
-        return round(overall_percentage, 2)
-
-        # --- END Example Progress Logic ---
-
-        # If you don't have detailed academic models yet, you can start with a simple placeholder:
-        # return 0 # Or a fixed value for testing, e.g., 50
\ No newline at end of file
+
+# --------------------------------------------------------------------------
+# دليل المستخدمين للبحث (انظر core/directory.py)
+# --------------------------------------------------------------------------
+class UserDirectoryEntry(models.Model):
+    """
+    صف بحث لكل مستخدم: كلمات الاسم بعد توحيد الحروف العربية، ومقاطعها الثلاثية للبحث التقريبي.
+    يُحدَّث تلقائياً عند حفظ المستخدم، ويُفهرس في جدول FTS5 على SQLite.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='directory_entry', verbose_name="المستخدم")
+    role = models.CharField(max_length=10, db_index=True, verbose_name="الدور")
+    tokens = models.TextField(verbose_name="كلمات البحث")
+    trigrams = models.TextField(verbose_name="المقاطع الثلاثية")
+
+    class Meta:
+        verbose_name = "مدخل دليل المستخدمين"
+        verbose_name_plural = "دليل المستخدمين"
+
+    def __str__(self):
+        return self.tokens
@@ -0,0 +1,148 @@
+# core/provisioning.py
+
+import os
+import secrets
+import string
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.db import transaction
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .directory import index_users
+from .models import User
+
+# طريقتا تجهيز الحسابات الجديدة:
+# - password: كلمة مرور مولدة تُشفَّر وتُرسل للطالب (في عامل المهام عند إرسال البريد).
+# - activation: بلا كلمة مرور، ويُرسل رابط تفعيل لمرة واحدة يعيّن منه الطالب كلمة مروره،
+#   فلا يُدفع ثمن PBKDF2 وقت الموافقة إطلاقاً.
+PASSWORD_MODE = 'password'
+ACTIVATION_MODE = 'activation'
+
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
+PASSWORD_LENGTH = 12
+
+# دون هذا العدد يكون تشغيل مجموعة العمليات أبطأ من التشفير المباشر
+PARALLEL_HASH_THRESHOLD = 16
+
+
+class AccountActivationTokenGenerator(PasswordResetTokenGenerator):
+    """
+    رموز التفعيل: تدخل في حسابها كلمة المرور المخزنة وآخر دخول، فيبطل الرمز بمجرد تعيين كلمة المرور.
+    مدة الصلاحية هي PASSWORD_RESET_TIMEOUT، وملح مستقل حتى لا تصلح رموز إعادة التعيين للتفعيل.
+    """
+    key_salt = 'core.provisioning.AccountActivationTokenGenerator'
+
+
+activation_token_generator = AccountActivationTokenGenerator()
+
+
+@dataclass
+class ProvisionedAccount:
+    user: User
+    password: str = None
+    activation_path: str = None
+
+
+def provisioning_mode(mode=None):
+    mode = mode or getattr(settings, 'ACCOUNT_PROVISIONING_MODE', ACTIVATION_MODE)
+    if mode not in (PASSWORD_MODE, ACTIVATION_MODE):
+        raise ValueError(f'طريقة تجهيز غير معروفة: {mode}')
+    return mode
+
+
+def hash_workers(workers=None):
+    """
+    عدد العمليات للتشفير المتوازي: الوسيط، ثم PROVISIONING_HASH_WORKERS، ثم عدد أنوية المعالج.
+    يُستدعى من أوامر الإدارة وعامل المهام فقط، لا من مسار طلبات الويب.
+    """
+    return workers or getattr(settings, 'PROVISIONING_HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+def generate_password(length=PASSWORD_LENGTH):
+    return ''.join(secrets.choice(PASSWORD_ALPHABET) for _ in range(length))
+
+
+def hash_passwords(passwords, workers=1):
+    """
+    يشفّر قائمة كلمات مرور بالمشفّر الافتراضي، والأملاح تُولَّد في العملية الرئيسية.
+    PBKDF2 يستهلك المعالج، فيمكن توزيع الدفعات الكبيرة على مجموعة عمليات (ProcessPoolExecutor)،
+    لكن ذلك يحتاج طلباً صريحاً (workers=hash_workers(...)) من أمر إدارة أو عامل المهام:
+    الافتراضي تسلسلي حتى لا تُنشأ عمليات داخل عامل خادم الويب.
+    """
+    hasher = get_hasher()
+    salts = [hasher.salt() for _ in passwords]
+    if len(passwords) < PARALLEL_HASH_THRESHOLD or workers <= 1:
+        return [hasher.encode(password, salt) for password, salt in zip(passwords, salts)]
+    chunksize = max(len(passwords) // (workers * 4), 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hasher.encode, passwords, salts, chunksize=chunksize))
+
+
+def prepare_credentials(users, mode=None, workers=1):
+    """
+    يعيّن حقل كلمة المرور لمستخدمين لم يُحفظوا بعد.
+    يرجع كلمات المرور الصريحة بنفس الترتيب (أو None لكل مستخدم في طريقة التفعيل).
+    """
+    if provisioning_mode(mode) == ACTIVATION_MODE:
+        for user in users:
+            # كلمة مرور غير صالحة عشوائية: بلا تشفير، وتجعل رمز التفعيل فريداً لكل حساب
+            user.set_unusable_password()
+        return [None] * len(users)
+
+    passwords = [generate_password() for _ in users]
+    for user, password_hash in zip(users, hash_passwords(passwords, workers)):
+        user.password = password_hash
+    return passwords
+
+
+def activation_path(user):
+    uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
+    return reverse('core:activate_account', args=[uidb64, activation_token_generator.make_token(user)])
+
+
+def issue_credentials(user, mode=None, site_url=''):
+    """
+    ينشئ بيانات الدخول لحساب محفوظ عند إرسال بريده (في عامل المهام)، فلا تُخزن في طابور المهام:
+    رابط تفعيل، أو كلمة مرور مولدة تُشفَّر وتُحفظ الآن.
+    يرجع سياق القالب {'password', 'activation_link'}، أو None إذا كان الحساب قد استُخدم
+    (فُعّل، أو دخل صاحبه بكلمة مرور سابقة) فلا يُعاد تعيين بياناته.
+    """
+    if provisioning_mode(mode) == ACTIVATION_MODE:
+        if user.has_usable_password():
+            return None
+        return {'password': '', 'activation_link': site_url + activation_path(user)}
+
+    if user.last_login is not None:
+        return None
+    # إعادة المحاولة بعد فشل الإرسال تولد كلمة مرور جديدة، فلا تصلح إلا كلمة المرور في آخر بريد
+    password = generate_password()
+    user.set_password(password)
+    user.save(update_fields=['password'])
+    return {'password': password, 'activation_link': ''}
+
+
+def provisioned_accounts(users, passwords):
+    """يبني نتيجة التجهيز بعد حفظ المستخدمين (رابط التفعيل يحتاج معرف المستخدم)."""
+    return [
+        ProvisionedAccount(user, password, None if password else activation_path(user))
+        for user, password in zip(users, passwords)
+    ]
+
+
+def create_accounts(users, mode=None, workers=1):
+    """
+    ينشئ دفعة مستخدمين جدد: تجهيز بيانات الدخول (خارج المعاملة)، ثم bulk_create وتحديث فهرس البحث.
+    يرجع قائمة ProvisionedAccount.
+    """
+    passwords = prepare_credentials(users, mode, workers)
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        # bulk_create لا يطلق post_save
+        index_users(users)
+    return provisioned_accounts(users, passwords)
@@ -0,0 +1,62 @@
+# core/queries.py
+
+import logging
+import re
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# أشكال SQL: القيم الحرفية والمعاملات تُستبدل بـ ? وقوائم IN تُختصر، فتتطابق استعلامات N+1 مهما اختلفت المعرفات
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """دالة عرض نفذت استعلامات أكثر من ميزانيتها (@query_budget). تُرفع في الاختبارات فقط."""
+
+
+def query_budget(max_queries):
+    """
+    يعلن الحد الأقصى لعدد الاستعلامات في دالة العرض؛ تتحقق منه QueryBudgetMiddleware.
+    يوضع أقرب ما يكون إلى الدالة (تحت login_required)، فـ functools.wraps ينقل السمة إلى الأغلفة.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def sql_shape(sql):
+    shape = _STRING_LITERAL.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PLACEHOLDER.sub('?', shape)
+    return _IN_LIST.sub('(?)', shape)
+
+
+class QueryStats:
+    """
+    غلاف لـ connection.execute_wrapper: يعد الاستعلامات وزمنها الكلي وتكرار كل شكل SQL.
+    تُحسب الأشكال بعد انتهاء الطلب فقط، فلا يكلف الاستعلام الواحد إلا إضافة نصه إلى قائمة.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements.append(sql)
+
+    def repeated_shapes(self, threshold):
+        """الأشكال التي تكررت threshold مرة أو أكثر (مرشحة لأن تكون N+1)، مرتبة من الأكثر تكراراً."""
+        shapes = Counter(sql_shape(sql) for sql in self.statements)
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
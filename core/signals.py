@@ -0,0 +1,31 @@
+# core/signals.py
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import directory
+from .cache import NAV_FIELDS, bump_namespace, nav_namespace
+from .models import User
+
+# الحقول التي تدخل في فهرس البحث؛ الحفظ الجزئي لحقول أخرى (مثل last_login) لا يعيد الفهرسة
+DIRECTORY_FIELDS = {'role', 'first_name', 'last_name', 'username', 'email'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not DIRECTORY_FIELDS.intersection(update_fields):
+        return
+    directory.index_users([instance])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    directory.remove_users([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def user_nav_changed(sender, instance, created, update_fields=None, **kwargs):
+    # أجزاء الشريط المخزنة للمستخدم (core.cache.nav_cache_key)؛ last_login وحده لا يغيرها
+    if created or (update_fields is not None and not NAV_FIELDS.intersection(update_fields)):
+        return
+    bump_namespace(nav_namespace(instance.pk))
@@ -0,0 +1,39 @@
+# core/tasks.py
+
+from jobs.queue import enqueue_many, task
+from jobs.tasks import send_email
+from .models import User
+from .provisioning import issue_credentials, provisioning_mode
+
+SEND_ACCOUNT_EMAIL = 'core.send_account_email'
+
+
+@task(SEND_ACCOUNT_EMAIL)
+def send_account_email(user_id, mode, subject, template_name, context, site_url=''):
+    """
+    بريد الحساب الجديد مع بيانات دخوله. payload المهمة لا يحوي إلا معرف المستخدم والطريقة،
+    وكلمة المرور أو رابط التفعيل يُنشآن هنا لحظة الإرسال.
+    """
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or not user.email:
+        return
+    credentials = issue_credentials(user, mode, site_url)
+    if credentials is None:
+        return
+    send_email(subject, [user.email], template_name, {**context, **credentials})
+
+
+def account_email_payload(user, subject, template_name, context, mode=None, site_url=''):
+    """context يحوي قيم القالب غير السرية فقط (الاسم، رابط الدخول...)."""
+    return {
+        'user_id': user.pk,
+        'mode': provisioning_mode(mode),
+        'subject': subject,
+        'template_name': template_name,
+        'context': context,
+        'site_url': site_url,
+    }
+
+
+def enqueue_account_emails(payloads):
+    return enqueue_many(SEND_ACCOUNT_EMAIL, payloads)
@@ -0,0 +1,19 @@
+# core/templatetags/nav_cache.py
+
+from django import template
+
+from core.cache import NAV_FRAGMENT_TIMEOUT, nav_cache_key
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def nav_fragment_key(context):
+    """{% nav_fragment_key as nav_key %}: يُمرَّر إلى {% cache %} مع اسم الصفحة الحالية."""
+    request = context.get('request')
+    return nav_cache_key(request) if request is not None else 'anon'
+
+
+@register.simple_tag
+def nav_fragment_timeout():
+    return NAV_FRAGMENT_TIMEOUT
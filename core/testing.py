@@ -0,0 +1,20 @@
+# core/testing.py
+
+from django.test import TestCase, override_settings
+
+# الاختبارات تستخدم دائماً ذاكرة العملية حتى لا تلمس كاش التطوير أو الإنتاج مهما كان CACHE_URL،
+# وتجاوز ميزانية @query_budget يُفشل الاختبار بدل أن يُسجَّل فقط
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dhad-tests',
+        'KEY_PREFIX': 'dhad',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES, QUERY_BUDGET_RAISE=True)
+class DhadTestCase(TestCase):
+    """الصنف الأساسي لاختبارات المنصة: إعدادات الاختبار تُفرض هنا بدل فحص sys.argv في settings.py."""
@@ -1,3 +1,372 @@
-from django.test import TestCase
+import re
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template import engines
+from django.test import Client, RequestFactory, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from academic.models import Class, Course, Lesson, Program, Test, TestResult
+from academic.placement import get_placement_graph
+from messaging.models import Conversation, Message
+from .cache import (
+    bump_namespace, cache_public_page, cache_stats, get_or_compute, namespace_version, nav_namespace, reset_cache_stats,
+    versioned_key,
+)
+from .directory import normalize_arabic, search_users
+from .middleware import QueryBudgetMiddleware
+from .models import User
+from .queries import QueryBudgetExceeded, query_budget, sql_shape
+from .provisioning import (
+    ACTIVATION_MODE, PARALLEL_HASH_THRESHOLD, PASSWORD_MODE, activation_token_generator, create_accounts, hash_passwords,
+)
+from .testing import DhadTestCase
+
+
+class UserDirectorySearchTests(DhadTestCase):
+    """
+    البحث في دليل المستخدمين: توحيد الحروف العربية، وتطابق البدايات والمقاطع الثلاثية.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('t_ahmad', role='teacher', first_name='أَحْمَد', last_name='الحلبي')
+        cls.fatima = User.objects.create_user('t_fatima', role='teacher', first_name='فاطمة', last_name='الزهراء')
+        cls.admin = User.objects.create_user('a_mona', role='admin', first_name='منى', email='mona.admin@example.com')
+        cls.student = User.objects.create_user('s_ahmad', role='student', first_name='احمد')
+
+    def _search(self, query, roles=('teacher', 'admin')):
+        return [user.username for user in search_users(query, roles=roles)]
+
+    def test_normalization_folds_diacritics_alef_and_taa_marbuta(self):
+        self.assertEqual(normalize_arabic('أَحْمَد'), 'احمد')
+        self.assertEqual(normalize_arabic('إسلام آمنة مُنى'), 'اسلام امنه مني')
+        self.assertEqual(normalize_arabic('Mona'), 'mona')
+
+    def test_search_matches_normalized_prefixes(self):
+        self.assertEqual(self._search('احم'), ['t_ahmad'])
+        self.assertEqual(self._search('فاطمه'), ['t_fatima'])
+        self.assertEqual(self._search('منا'), [])
+        self.assertEqual(self._search('mona'), ['a_mona'])
+
+    def test_search_tolerates_typos_through_trigrams(self):
+        self.assertEqual(self._search('الحلبى'), ['t_ahmad'])
+        self.assertEqual(self._search('فاطيمة')[:1], ['t_fatima'])
+
+    def test_search_filters_roles_and_excludes_current_user(self):
+        self.assertEqual(self._search('احمد', roles=('student',)), ['s_ahmad'])
+        self.assertEqual([user.username for user in search_users('احمد', roles=('teacher',), exclude_user_id=self.teacher.id)], [])
+
+    def test_index_follows_user_updates(self):
+        self.fatima.first_name = 'خديجة'
+        self.fatima.save()
+        self.assertEqual(self._search('خديجه'), ['t_fatima'])
+        self.assertEqual(self._search('فاطمة'), [])
+
+        self.fatima.delete()
+        self.assertEqual(self._search('خديجة'), [])
+
+    def test_new_conversation_selection_uses_the_directory(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('messaging:new_conversation_selection'), {'q': 'الحلبي'})
+        self.assertEqual([user.username for user in response.context['teachers']], ['t_ahmad'])
+        self.assertEqual(response.context['admins'], [])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProvisioningTests(DhadTestCase):
+    def test_hash_passwords_in_process_pool(self):
+        passwords = [f'password-{i}' for i in range(PARALLEL_HASH_THRESHOLD)]
+        hashes = hash_passwords(passwords, workers=2)
+        self.assertEqual(len(set(hashes)), len(passwords))
+        self.assertTrue(all(check_password(p, h) for p, h in zip(passwords, hashes)))
+
+    def test_no_process_pool_unless_requested(self):
+        # مسار طلبات الويب (الموافقة من لوحة الإدارة) لا يمرر workers: التشفير تسلسلي
+        users = [User(username=f'u{i}', role='student') for i in range(PARALLEL_HASH_THRESHOLD)]
+        with mock.patch('core.provisioning.ProcessPoolExecutor') as pool:
+            accounts = create_accounts(users, mode=PASSWORD_MODE)
+        pool.assert_not_called()
+        self.assertTrue(User.objects.get(username='u0').check_password(accounts[0].password))
+
+    def test_create_accounts_in_both_modes(self):
+        [with_password] = create_accounts([User(username='p1', role='student')], mode=PASSWORD_MODE)
+        self.assertTrue(User.objects.get(username='p1').check_password(with_password.password))
+        self.assertIsNone(with_password.activation_path)
+
+        [pending] = create_accounts([User(username='a1', role='student')], mode=ACTIVATION_MODE)
+        user = User.objects.get(username='a1')
+        self.assertIsNone(pending.password)
+        self.assertFalse(user.has_usable_password())
+        token = pending.activation_path.rstrip('/').rsplit('/', 1)[1]
+        self.assertTrue(activation_token_generator.check_token(user, token))
+
+        user.set_password('chosen-password')
+        user.save()
+        self.assertFalse(activation_token_generator.check_token(user, token))
+
+
+class CacheTests(DhadTestCase):
+    """
+    مفاتيح الكاش بإصدارات، والإبطال بالإشارات، وتخزين الصفحات العامة، وعدادات الإصابة والإخفاق.
+    """
+
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+
+    def test_bumping_namespace_orphans_old_keys(self):
+        key = versioned_key('tests', 'a')
+        cache.set(key, 'old')
+        version = namespace_version('tests')
+
+        bump_namespace('tests')
+
+        self.assertEqual(namespace_version('tests'), version + 1)
+        self.assertNotEqual(versioned_key('tests', 'a'), key)
+
+    def test_get_or_compute_counts_hits_and_caches_none(self):
+        calls = []
+        for _ in range(3):
+            get_or_compute('tests:none', lambda: calls.append(1), 60, 'tests')
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache_stats()['tests'], (2, 1))
+
+    def test_model_change_invalidates_placement_graph(self):
+        course = Course.objects.create(program=Program.objects.create(name='برنامج'), name='العربية')
+        # لا يوجد اختبار بداية، فيُسجَّل تحذير عند كل بناء للرسم
+        with self.assertLogs('academic.placement', 'WARNING'):
+            get_placement_graph()
+            get_placement_graph()
+            Test.objects.create(course=course, title='اختبار تحديد المستوى')
+            get_placement_graph()
+
+        self.assertEqual(cache_stats()['academic:placement_graph'], (1, 2))
+
+    def test_public_pages_are_cached_for_anonymous_visitors_only(self):
+        url = reverse('core:about_platform')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache_stats()['pages'], (1, 1))
+
+        self.client.force_login(User.objects.create_user('member'))
+        self.client.get(url)
+        self.assertEqual(cache_stats()['pages'], (1, 1))
+
+    def test_unknown_query_parameters_share_the_cached_page(self):
+        url = reverse('core:about_platform')
+        for query in ({}, {'utm_source': 'x'}, {'junk': 'y', 'utm_source': 'z'}):
+            self.assertEqual(self.client.get(url, query).status_code, 200)
+        self.assertEqual(cache_stats()['pages'], (2, 1))
+
+        calls = []
+
+        @cache_public_page(query_params=('lang',))
+        def view(request):
+            calls.append(request.GET.get('lang'))
+            return HttpResponse(request.GET.get('lang', ''))
+
+        def get(query):
+            request = RequestFactory().get('/page/', query)
+            request.user = AnonymousUser()
+            return view(request).content.decode()
+
+        pages = [get({'lang': 'en'}), get({'lang': 'en', 'utm_source': 'x'}), get({'lang': 'ar'}), get({})]
+        self.assertEqual(pages, ['en', 'en', 'ar', ''])
+        self.assertEqual(calls, ['en', 'ar', None])
+
+    def test_cached_contact_page_gets_visitor_csrf_token(self):
+        url = reverse('contacts:contact')
+        Client().get(url)
+
+        visitor = Client(enforce_csrf_checks=True)
+        response = visitor.get(url)
+        self.assertEqual(cache_stats()['pages'], (1, 1))
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        self.assertIn('csrftoken', response.cookies)
+
+        response = visitor.post(url, {'csrfmiddlewaretoken': token})
+        self.assertNotEqual(response.status_code, 403)
+
+    @override_settings(CACHE_METRICS_TOKEN='scrape-me')
+    def test_metrics_endpoint(self):
+        get_or_compute('tests:key', lambda: 1, 60, 'tests')
+        url = reverse('core:cache_metrics')
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('dhad_cache_misses_total{cache="tests"', response.content.decode())
+
+
+class NavFragmentCacheTests(DhadTestCase):
+    """
+    أجزاء الشريط في base.html مخزنة لكل مستخدم، والعدادات ورمز CSRF تبقى حية.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('nav_student', role='student')
+        self.template = engines['django'].from_string("{% extends 'base.html' %}")
+
+    def _render(self, user, unread=0):
+        url = reverse('core:dashboard')
+        request = RequestFactory().get(url)
+        request.user = user
+        request.resolver_match = resolve(url)
+        request._unread_messages_count = unread
+        return self.template.render({}, request)
+
+    def test_unread_badge_and_csrf_token_stay_live(self):
+        first = self._render(self.student, unread=2)
+        second = self._render(self.student, unread=7)
+
+        self.assertIn('>2</span>', first)
+        self.assertIn('>7</span>', second)
+        token = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+        self.assertNotEqual(token.search(first).group(1), token.search(second).group(1))
+
+    def test_user_change_bumps_fragment_version(self):
+        self._render(self.student)
+        version = namespace_version(nav_namespace(self.student.pk))
+
+        self.student.last_login = self.student.date_joined
+        self.student.save(update_fields=['last_login'])
+        self.assertEqual(namespace_version(nav_namespace(self.student.pk)), version)
+
+        self.student.username = 'renamed_student'
+        self.student.save()
+        self.assertIn('renamed_student', self._render(self.student))
+
+    def test_fragments_are_per_user_and_role(self):
+        teacher = User.objects.create_user('nav_teacher', role='teacher')
+        self.assertIn('الاختبارات', self._render(self.student))
+        html = self._render(teacher)
+
+        self.assertIn('nav_teacher', html)
+        self.assertNotIn('nav_student', html)
+        self.assertNotIn('الاختبارات', html)
+
+
+class QueryBudgetTests(DhadTestCase):
+    """
+    عد الاستعلامات لكل طلب، واكتشاف أشكال SQL المتكررة، وفشل الاختبارات عند تجاوز @query_budget.
+    """
+
+    def _run(self, view):
+        request = RequestFactory().get('/budget/')
+        request.resolver_match = None
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = QueryBudgetMiddleware(get_response)
+        return middleware(request)
+
+    def test_sql_shape_ignores_values_and_in_list_length(self):
+        self.assertEqual(
+            sql_shape("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            sql_shape('SELECT * FROM t WHERE id IN (%s) AND name = %s LIMIT 1'),
+        )
+
+    def test_view_over_budget_fails(self):
+        @query_budget(1)
+        def view(request):
+            list(User.objects.all())
+            list(User.objects.all())
+            return HttpResponse()
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, '2 queries (budget 1'):
+            self._run(view)
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_view_over_budget_is_logged_when_raise_is_off(self):
+        @query_budget(0)
+        def view(request):
+            list(User.objects.all())
+            return HttpResponse()
+
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            response = self._run(view)
+        self.assertIn('1 queries (budget 0', logs.output[0])
+        self.assertEqual(response.status_code, 200)
+
+    def test_repeated_queries_are_logged_with_server_timing(self):
+        users = [User.objects.create_user(f'n_plus_one_{i}') for i in range(5)]
+
+        def view(request):
+            for user in users:
+                User.objects.get(pk=user.pk)
+            return HttpResponse()
+
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            response = self._run(view)
+        self.assertIn('Possible N+1 in /budget/: 5×', logs.output[0])
+        self.assertEqual(response['Server-Timing'].split(';desc=')[1], '"5 queries"')
+
+    async def test_async_views_are_counted_without_a_sync_adapter(self):
+        @query_budget(1)
+        async def view(request):
+            await User.objects.acount()
+            await User.objects.acount()
+            return HttpResponse()
+
+        async def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return await view(request)
+
+        middleware = QueryBudgetMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().get('/budget/')
+        request.resolver_match = None
+        with self.assertRaisesMessage(QueryBudgetExceeded, '2 queries (budget 1'):
+            await middleware(request)
+
+    async def test_asgi_request_gets_server_timing(self):
+        student = await User.objects.acreate(username='asgi_student', role='student')
+        conversation = await Conversation.objects.acreate()
+        await conversation.participants.aadd(student)
+        await self.async_client.aforce_login(student)
+
+        with override_settings(MESSAGING_POLL_TIMEOUT=0):
+            response = await self.async_client.get(reverse('messaging:poll_messages', args=[conversation.id]))
+        self.assertEqual(response.status_code, 200)
+        queries = int(response['Server-Timing'].split('desc="')[1].split(' ')[0])
+        self.assertGreater(queries, 0)
+
+    def test_slow_pages_stay_within_budget(self):
+        # عشر حلقات واختبارات ومحادثات: أي استعلام لكل عنصر يتجاوز الميزانية ويُفشل الاختبار
+        student = User.objects.create_user('budget_student', role='student', determined_arabic_level='A1')
+        program = Program.objects.create(name='برنامج')
+        now = timezone.now()
+        for i in range(10):
+            teacher = User.objects.create_user(f'budget_teacher_{i}', role='teacher')
+            course = Course.objects.create(program=program, name=f'مادة {i}')
+            cls = Class.objects.create(
+                course=course, teacher=teacher, class_code=f'BUDGET-{i}',
+                start_time=now + timedelta(days=1), end_time=now + timedelta(days=1, hours=1),
+            )
+            cls.students.add(student)
+            Lesson.objects.create(course=course, title='درس', youtube_link='https://youtu.be/x')
+            TestResult.objects.create(student=student, test=Test.objects.create(title=f'اختبار {i}', course=course))
+            conversation = Conversation.objects.create()
+            conversation.participants.add(student, teacher)
+            Message.objects.create(conversation=conversation, sender=teacher, content='مرحباً')
+
+        self.client.force_login(student)
+        for url in (
+            reverse('core:dashboard'), reverse('core:progress_detail'), reverse('academic:course_detail', args=[course.id]),
+            reverse('academic:test_list'), reverse('messaging:inbox'),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
@@ -28,4 +28,10 @@ urlpatterns = [
     # --------------------------------------------------------------------------
     path('progress/', views.progress_detail, name='progress_detail'), # NEW URL
     path('teacher/', views.teacher_dashboard, name='teacher_dashboard'),
+
+    # رابط تفعيل الحساب لمرة واحدة (يُرسل للطالب عند الموافقة على طلب تسجيله)
+    path('activate/<uidb64>/<token>/', views.activate_account, name='activate_account'),
+
+    # عدادات الكاش لأداة المراقبة (Prometheus)
+    path('metrics/cache/', views.cache_metrics, name='cache_metrics'),
 ]
\ No newline at end of file
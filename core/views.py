@@ -4,12 +4,20 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth import update_session_auth_hash # لتحديث الجلسة بعد تغيير كلمة المرور
-from django.http import Http404
+from django.contrib.auth.forms import SetPasswordForm
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
 from django.apps import apps # لاستخدام apps.get_model لضمان عدم وجود استيراد دائري
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
 
 # استيراد الفورمز (تأكد من أن هذه الفورمز معرفة في ملف forms.py الخاص بنفس التطبيق)
+from .cache import cache_public_page, prometheus_metrics
 from .forms import ProfileEditForm, CustomPasswordChangeForm
 from .models import User 
+from .provisioning import activation_token_generator
+from .queries import query_budget
 
 # استيراد النماذج من تطبيق academic
 # بما أننا نستخدمها في دوال عرض متعددة، سنقوم باستيرادها مباشرة لتجنب التكرار
@@ -17,17 +25,20 @@ from .models import User
 # فاستخدم apps.get_model() داخل الدوال التي تحتاجها فقط.
 # ولكن عادةً هذا لا يكون مشكلة إذا كان academic لا يستورد من core مباشرة في models.py
 from academic.models import Program, Course, Class, Lesson, EducationalFile, Assignment, Submission, Test, TestResult, LessonProgress
+from academic.progress import LessonCompletionIndex, lessons_by_course
 
 # --------------------------------------------------------------------------
 # دوال العرض العامة/الطلابية
 # --------------------------------------------------------------------------
 
 # الدالة الخاصة بالصفحة الرئيسية
+@cache_public_page()
 def index(request):
     return render(request, 'core/index.html')
 
 # الدالة الخاصة بلوحة التحكم (Dashboard) - للطالب
 @login_required
+@query_budget(8)
 def dashboard(request):
     user_programs_and_courses = []
     upcoming_classes = []
@@ -35,9 +46,11 @@ def dashboard(request):
 
     show_activation_message = False
     if request.user.role == 'student':
-        user_programs_and_courses = request.user.get_enrolled_programs()
+        # حساب التقدم مرة واحدة وإعادة استخدامه لتجميع المواد حسب البرنامج
+        progress = request.user.get_progress()
+        user_programs_and_courses = progress.programs_with_courses()
         upcoming_classes = request.user.get_upcoming_classes()
-        overall_progress_percentage = request.user.get_overall_progress_percentage() 
+        overall_progress_percentage = progress.overall_percentage
 
         if not request.user.is_active and request.user.determined_arabic_level != 'unassigned':
             show_activation_message = True
@@ -101,56 +114,32 @@ def change_password_view(request):
 
 # الدالة الجديدة والمحسّنة لصفحة تفاصيل التقدم
 @login_required
+@query_budget(10)
 def progress_detail(request):
     if request.user.role != 'student':
         messages.error(request, "لا تملك صلاحية الوصول إلى هذه الصفحة.")
         return redirect('core:dashboard') # أو حيث تريد توجيههم
 
-    overall_completion_percentage = request.user.get_overall_progress_percentage() 
+    progress = request.user.get_progress()
+    overall_completion_percentage = progress.overall_percentage
 
-    # 1. تفاصيل تقدم الدروس:
-    enrolled_courses = request.user.get_enrolled_courses()
-    
+    # 1. تفاصيل تقدم الدروس (المجاميع لكل مادة تأتي من محرك التقدم):
     courses_progress_data = []
     first_course_recommendation = None 
     
-    for course in enrolled_courses:
-        total_lessons_in_course = Lesson.objects.filter(course=course).count()
-        completed_lessons_in_course = LessonProgress.objects.filter(
-            student=request.user,
-            lesson__course=course,
-            status='completed' 
-        ).count()
-        
-        lessons_data = []
-        try:
-            # افتراض وجود حقل 'order' في نموذج الدرس. إذا لم يكن موجودًا، استخدم 'id'.
-            all_lessons_in_course = Lesson.objects.filter(course=course).order_by('order') 
-        except Exception: # Catch if 'order' field does not exist
-             all_lessons_in_course = Lesson.objects.filter(course=course).order_by('id') 
-
-        for lesson in all_lessons_in_course:
-            is_completed = LessonProgress.objects.filter(
-                student=request.user,
-                lesson=lesson,
-                status='completed' 
-            ).exists()
-            lessons_data.append({
-                'lesson': lesson,
-                'is_completed': is_completed
-            })
-
-        course_completion_percentage = 0
-        if total_lessons_in_course > 0:
-            course_completion_percentage = (completed_lessons_in_course / total_lessons_in_course) * 100
-        
-        current_course_data = {
-            'course': course,
-            'total_lessons': total_lessons_in_course,
-            'completed_lessons': completed_lessons_in_course,
-            'completion_percentage': round(course_completion_percentage, 2),
-            'lessons_data': lessons_data, # تفاصيل كل درس
-        }
+    # فهرس الإكمال ودروس جميع المواد تُحمّل مرة واحدة بدلاً من استعلام لكل درس
+    course_ids = [course_data['course'].id for course_data in progress.courses]
+    completion_index = LessonCompletionIndex(request.user, course_ids=course_ids)
+    course_lessons = lessons_by_course(course_ids)
+
+    for course_data in progress.courses:
+        course = course_data['course']
+        lessons_data = [
+            {'lesson': lesson, 'is_completed': completion_index.is_completed(lesson)}
+            for lesson in course_lessons[course.id]
+        ]
+
+        current_course_data = dict(course_data, lessons_data=lessons_data) # تفاصيل كل درس
         courses_progress_data.append(current_course_data)
 
         # المنطق الجديد: البحث عن توصية واحدة للدورة في Python
@@ -198,9 +187,46 @@ def test_404_view(request):
     raise Http404("هذه صفحة اختبار 404. تم الوصول إليها عبر مسار مخصص.")
 
 
+@cache_public_page()
 def about_platform(request):
     return render(request, 'core/about_platform.html')
 
+
+def cache_metrics(request):
+    """عدادات إصابة وإخفاق الكاش بصيغة Prometheus (للمشرفين أو لأداة المراقبة بالرمز CACHE_METRICS_TOKEN)."""
+    token = settings.CACHE_METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    authorized = request.user.is_staff or (token and constant_time_compare(authorization, f'Bearer {token}'))
+    if not authorized:
+        return HttpResponse(status=403)
+    return HttpResponse(prometheus_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def activate_account(request, uidb64, token):
+    """
+    تفعيل حساب جديد برابط لمرة واحدة: يختار الطالب كلمة مروره هنا،
+    ومن ثم يبطل الرمز لأنه مبني على كلمة المرور المخزنة.
+    """
+    try:
+        user = User.objects.get(pk=force_str(urlsafe_base64_decode(uidb64)))
+    except (TypeError, ValueError, OverflowError, User.DoesNotExist):
+        user = None
+
+    if user is None or not activation_token_generator.check_token(user, token):
+        return render(request, 'core/activate_account.html', {'validlink': False})
+
+    if request.method == 'POST':
+        form = SetPasswordForm(user, request.POST)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'تم تفعيل حسابك بنجاح! يمكنك الآن تسجيل الدخول.')
+            return redirect('login')
+        messages.error(request, 'تعذر تعيين كلمة المرور. يرجى مراجعة الأخطاء أدناه.')
+    else:
+        form = SetPasswordForm(user)
+
+    return render(request, 'core/activate_account.html', {'form': form, 'validlink': True})
+
 # --------------------------------------------------------------------------
 # دوال العرض الخاصة بالمعلم
 # --------------------------------------------------------------------------
@@ -0,0 +1,343 @@
+# dashboard/exports.py
+
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from academic.models import TestResult
+from core.models import User
+from registration.models import RegistrationRequest
+
+# عدد الصفوف التي تُجلب من قاعدة البيانات في كل دفعة؛ الذاكرة ثابتة مهما كان عدد الصفوف
+EXPORT_CHUNK_SIZE = 2000
+# حجم البيانات المضغوطة التي تُجمع قبل إرسالها للمتصفح في تصدير XLSX
+XLSX_FLUSH_BYTES = 64 * 1024
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+FORMATS = ('csv', 'xlsx')
+# خلايا تبدأ بأحد هذه المحارف يفسرها Excel/LibreOffice كصيغة (CSV injection)، فتُسبق بـ '
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+# --------------------------------------------------------------------------
+# تعريف التصديرات
+# --------------------------------------------------------------------------
+class Export:
+    """
+    تعريف تصدير لنموذج: الأعمدة (العنوان، مسار الحقل لـ values_list) وحقول الفلاتر المشتركة
+    (الحالة، نطاق التاريخ، الدولة، المستوى).
+    """
+    name = None
+    model = None
+    columns = ()
+    date_field = None
+    status_field = None
+    country_field = None
+    level_field = None
+    # تحويل قيمة فلتر الحالة إلى قيمة الحقل (إذا لم تكن الحالة حقلاً نصياً)
+    status_values = None
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def filter(self, queryset, status=None, date_from=None, date_to=None, country=None, level=None):
+        if status:
+            value = self.status_value(status)
+            queryset = queryset.filter(**{self.status_field: value})
+        if date_from:
+            queryset = queryset.filter(**{f'{self.date_field}__date__gte': date_from})
+        if date_to:
+            queryset = queryset.filter(**{f'{self.date_field}__date__lte': date_to})
+        if country:
+            queryset = queryset.filter(**{f'{self.country_field}__iexact': country})
+        if level:
+            queryset = queryset.filter(**{self.level_field: level})
+        return queryset
+
+    def status_value(self, status):
+        if not self.status_values:
+            return status
+        if status not in self.status_values:
+            raise ValueError(f"قيمة الحالة يجب أن تكون إحدى: {', '.join(self.status_values)}")
+        return self.status_values[status]
+
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def rows(self, queryset):
+        """يولّد الصفوف من values_list مع iterator، مع عرض تسميات الاختيارات بدل قيمها المخزنة."""
+        lookups = [lookup for _, lookup in self.columns]
+        choices = [dict(_resolve_field(self.model, lookup).flatchoices) for lookup in lookups]
+        rows = queryset.order_by('pk').values_list(*lookups).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for row in rows:
+            yield [
+                _format_value(labels.get(value, value) if labels else value)
+                for value, labels in zip(row, choices)
+            ]
+
+    def filename(self, file_format):
+        return f'{self.name}-{timezone.localdate():%Y%m%d}.{file_format}'
+
+
+class RegistrationRequestExport(Export):
+    name = 'registration_requests'
+    model = RegistrationRequest
+    columns = (
+        ('المعرف', 'id'),
+        ('الاسم الكامل', 'full_name'),
+        ('البريد الإلكتروني', 'email'),
+        ('رقم واتساب', 'whatsapp_number'),
+        ('الجنس', 'gender'),
+        ('تاريخ الميلاد', 'date_of_birth'),
+        ('الدولة', 'country'),
+        ('المكان الحالي', 'current_location'),
+        ('المستوى الدراسي', 'study_level'),
+        ('البرنامج', 'program'),
+        ('الصف', 'grade'),
+        ('مستوى اللغة العربية', 'arabic_level'),
+        ('اللغة الأم', 'native_language'),
+        ('طريقة الدفع المفضلة', 'preferred_payment_method'),
+        ('حالة الطلب', 'status'),
+        ('تاريخ الطلب', 'created_at'),
+        ('تاريخ الموافقة', 'approved_at'),
+    )
+    date_field = 'created_at'
+    status_field = 'status'
+    country_field = 'country'
+    level_field = 'arabic_level'
+
+
+class UserExport(Export):
+    name = 'users'
+    model = User
+    columns = (
+        ('المعرف', 'id'),
+        ('اسم المستخدم', 'username'),
+        ('الاسم الأول', 'first_name'),
+        ('الاسم الأخير', 'last_name'),
+        ('البريد الإلكتروني', 'email'),
+        ('الدور', 'role'),
+        ('رقم الواتساب', 'phone_number'),
+        ('الدولة', 'country'),
+        ('مستوى اللغة العربية', 'determined_arabic_level'),
+        ('مفعل', 'is_active'),
+        ('تاريخ الانضمام', 'date_joined'),
+        ('آخر دخول', 'last_login'),
+    )
+    date_field = 'date_joined'
+    status_field = 'is_active'
+    status_values = {'active': True, 'inactive': False}
+    country_field = 'country'
+    level_field = 'determined_arabic_level'
+
+
+class TestResultExport(Export):
+    name = 'test_results'
+    model = TestResult
+    columns = (
+        ('المعرف', 'id'),
+        ('اسم المستخدم', 'student__username'),
+        ('البريد الإلكتروني', 'student__email'),
+        ('الدولة', 'student__country'),
+        ('الاختبار', 'test__title'),
+        ('المادة', 'test__course__name'),
+        ('النتيجة', 'score'),
+        ('اجتاز', 'passed'),
+        ('المستوى المحدد', 'determined_level_at_this_stage'),
+        ('نتيجة تحديد المستوى النهائية', 'is_final_placement_result'),
+        ('حالة الاختبار', 'status'),
+        ('وقت البدء', 'start_time'),
+        ('وقت الانتهاء', 'end_time'),
+    )
+    date_field = 'start_time'
+    status_field = 'status'
+    country_field = 'student__country'
+    level_field = 'determined_level_at_this_stage'
+
+
+EXPORTS = {export.name: export for export in (RegistrationRequestExport(), UserExport(), TestResultExport())}
+
+
+def _resolve_field(model, lookup):
+    field = None
+    for part in lookup.split('__'):
+        field = model._meta.get_field(part)
+        model = field.related_model or model
+    return field
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'نعم' if value else 'لا'
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if timezone.is_aware(value) else value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+# --------------------------------------------------------------------------
+# الكتابة المتدفقة
+# --------------------------------------------------------------------------
+class _Echo:
+    """كائن بواجهة ملف يعيد ما يُكتب فيه، ليُستخدم مع csv.writer في مولّد."""
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    # البيانات مدخلة من الزوار (الاسم، الواتساب...)، فلا تُترك خلية نصية تُنفذ كصيغة عند فتح الملف
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_stream(headers, rows):
+    writer = csv.writer(_Echo())
+    # BOM حتى يتعرف Excel على الترميز UTF-8 ويعرض العربية بشكل صحيح
+    yield '\ufeff' + writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+class _ZipBuffer:
+    """
+    مخزن للكتابة فقط يستقبل مخرجات ZipFile. لا يدعم seek، فيكتب ZipFile كل ملف بـ data descriptor
+    ويمكن إرسال ما تجمّع أولاً بأول بدل بناء الملف كاملاً في الذاكرة.
+    """
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pending(self):
+        return self._size
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        return data
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView rightToLeft="1" workbookViewId="0"/></sheetViews>'
+    '<sheetData>'
+)
+_XLSX_SHEET_END = '</sheetData></worksheet>'
+
+# المحارف غير المسموحة في XML 1.0
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return ('<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>').encode('utf-8')
+
+
+def xlsx_stream(headers, rows, sheet_name='Sheet1'):
+    """
+    يولّد ملف XLSX (ورقة واحدة بنصوص مضمّنة) على دفعات أثناء قراءة الصفوف،
+    دون الاعتماد على مكتبة خارجية ودون الاحتفاظ بالملف كاملاً في الذاكرة.
+    """
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _XLSX_WORKBOOK.format(name=escape(sheet_name[:31])))
+        archive.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS)
+        yield buffer.pop()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(_XLSX_SHEET_START.encode('utf-8'))
+            sheet.write(_xlsx_row(headers))
+            for row in rows:
+                sheet.write(_xlsx_row(row))
+                if buffer.pending() >= XLSX_FLUSH_BYTES:
+                    yield buffer.pop()
+            sheet.write(_XLSX_SHEET_END.encode('utf-8'))
+    yield buffer.pop()
+
+
+def export_stream(export, queryset, file_format):
+    if file_format == 'xlsx':
+        return xlsx_stream(export.headers(), export.rows(queryset), sheet_name=export.name)
+    return csv_stream(export.headers(), export.rows(queryset))
+
+
+def export_response(export, queryset, file_format='csv'):
+    response = StreamingHttpResponse(
+        export_stream(export, queryset, file_format),
+        content_type=XLSX_CONTENT_TYPE if file_format == 'xlsx' else CSV_CONTENT_TYPE,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export.filename(file_format)}"'
+    return response
+
+
+def export_actions(export):
+    """إجراءات لوحة الإدارة لتصدير الصفوف المحددة (أو كل الصفوف المفلترة) بصيغتي CSV وXLSX."""
+    def export_csv(modeladmin, request, queryset):
+        return export_response(export, queryset, 'csv')
+    export_csv.short_description = 'تصدير المحدد إلى CSV'
+
+    def export_xlsx(modeladmin, request, queryset):
+        return export_response(export, queryset, 'xlsx')
+    export_xlsx.short_description = 'تصدير المحدد إلى Excel (XLSX)'
+
+    return [export_csv, export_xlsx]
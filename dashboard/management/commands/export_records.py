@@ -0,0 +1,48 @@
+# dashboard/management/commands/export_records.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.exports import EXPORTS, FORMATS, export_stream
+
+
+class Command(BaseCommand):
+    help = 'تصدير طلبات التسجيل أو المستخدمين أو نتائج الاختبارات إلى CSV أو XLSX بشكل متدفق (ذاكرة ثابتة).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS), help='نوع البيانات المراد تصديرها.')
+        parser.add_argument('--format', choices=FORMATS, default='csv', help='صيغة الملف.')
+        parser.add_argument('--output', '-o', help='مسار الملف الناتج (الافتراضي: المخرجات القياسية لملفات CSV).')
+        parser.add_argument('--status', help='الحالة (للمستخدمين: active أو inactive).')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help='من تاريخ (YYYY-MM-DD).')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help='حتى تاريخ (YYYY-MM-DD).')
+        parser.add_argument('--country', help='الدولة.')
+        parser.add_argument('--level', help='المستوى.')
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['export']]
+        file_format = options['format']
+        if file_format == 'xlsx' and not options['output']:
+            raise CommandError('تصدير XLSX يتطلب تحديد --output.')
+
+        try:
+            queryset = export.filter(
+                export.get_queryset(),
+                status=options['status'], date_from=options['date_from'], date_to=options['date_to'],
+                country=options['country'], level=options['level'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        chunks = export_stream(export, queryset, file_format)
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        mode, encoding = ('wb', None) if file_format == 'xlsx' else ('w', 'utf-8')
+        with open(options['output'], mode, encoding=encoding, newline=None if encoding is None else '') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"تم التصدير إلى {options['output']}."))
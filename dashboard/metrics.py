@@ -0,0 +1,46 @@
+# dashboard/metrics.py
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from core.cache import get_or_compute
+from core.models import User
+from registration.models import RegistrationRequest
+
+DASHBOARD_METRICS_CACHE_KEY = 'dashboard:metrics:1'
+# مهلة قصيرة: الإشارات تحذف اللقطة عند أي تغيير، والمهلة حد أقصى احتياطي للتقادم
+DASHBOARD_METRICS_TIMEOUT = 60
+
+
+def compute_metrics():
+    """
+    يحسب لقطة عدادات لوحة التحكم باستعلامين فقط:
+    - GROUP BY واحد على (status, gender) في طلبات التسجيل يعطي عدد كل حالة وتوزيع الجنس معاً.
+    - COUNT واحد للمستخدمين.
+    الجنس غير موجود في نموذج المستخدم، لذلك يُؤخذ من طلبات التسجيل المقبولة (أي الطلاب الذين أُنشئت حساباتهم).
+    """
+    status_counts = {status: 0 for status, _ in RegistrationRequest.STATUS_CHOICES}
+    gender_counts = {'male': 0, 'female': 0}
+
+    rows = (
+        RegistrationRequest.objects.values('status', 'gender')
+        .annotate(count=Count('id')).order_by()
+    )
+    for row in rows:
+        status_counts[row['status']] = status_counts.get(row['status'], 0) + row['count']
+        if row['status'] == 'approved' and row['gender'] in gender_counts:
+            gender_counts[row['gender']] += row['count']
+
+    return {
+        'total_users': User.objects.count(),
+        'status_counts': status_counts,
+        'gender_counts': gender_counts,
+    }
+
+
+def get_metrics():
+    return get_or_compute(DASHBOARD_METRICS_CACHE_KEY, compute_metrics, DASHBOARD_METRICS_TIMEOUT, 'dashboard:metrics')
+
+
+def invalidate_metrics():
+    cache.delete(DASHBOARD_METRICS_CACHE_KEY)
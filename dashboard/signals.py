@@ -0,0 +1,28 @@
+# dashboard/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import User
+from registration.models import RegistrationRequest
+from .metrics import invalidate_metrics
+
+
+@receiver(post_save, sender=RegistrationRequest)
+@receiver(post_delete, sender=RegistrationRequest)
+def registration_request_changed(sender, **kwargs):
+    # بعد نجاح المعاملة حتى لا يعيد طلب متزامن ملء الكاش بقيم ما قبل التغيير
+    transaction.on_commit(invalidate_metrics)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, created, **kwargs):
+    # حفظ المستخدم (مثل تحديث last_login) لا يغير العدد إلا عند الإنشاء
+    if created:
+        transaction.on_commit(invalidate_metrics)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, **kwargs):
+    transaction.on_commit(invalidate_metrics)
@@ -1,3 +1,131 @@
-from django.test import TestCase
+# dashboard/tests.py
+import csv
+import io
+import zipfile
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+
+from core.models import User
+from core.testing import DhadTestCase
+from registration.models import RegistrationRequest
+from .exports import EXPORTS, export_stream
+from .metrics import DASHBOARD_METRICS_CACHE_KEY, get_metrics
+
+
+def make_request(email, gender='male', status='pending', country='سوريا', arabic_level='مبتدئ'):
+    return RegistrationRequest.objects.create(
+        full_name='طالب', date_of_birth=date(2010, 1, 1), gender=gender, country=country,
+        study_level='ابتدائي', program='عام', grade='الأول', arabic_level=arabic_level,
+        native_language='العربية', email=email, whatsapp_number='000', status=status,
+    )
+
+
+class DashboardMetricsTests(DhadTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('dash_admin', password='pass', role='admin', is_staff=True)
+        make_request('a@example.com', 'male', 'approved')
+        make_request('b@example.com', 'female', 'approved')
+        make_request('c@example.com', 'female', 'pending')
+        make_request('d@example.com', 'male', 'rejected')
+
+    def setUp(self):
+        cache.delete(DASHBOARD_METRICS_CACHE_KEY)
+
+    def test_snapshot_counts_in_two_queries(self):
+        with self.assertNumQueries(2):
+            metrics = get_metrics()
+        self.assertEqual(metrics['status_counts'], {'pending': 1, 'approved': 2, 'rejected': 1})
+        self.assertEqual(metrics['gender_counts'], {'male': 1, 'female': 1})
+        self.assertEqual(metrics['total_users'], 1)
+
+        with self.assertNumQueries(0):
+            get_metrics()
+
+    def test_save_signal_refreshes_snapshot(self):
+        get_metrics()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_request('e@example.com', 'male', 'pending')
+        self.assertEqual(get_metrics()['status_counts']['pending'], 2)
+
+    def test_chart_endpoint_answers_from_cache(self):
+        self.client.login(username='dash_admin', password='pass')
+        get_metrics()
+        response = self.client.get(reverse('dashboard:user_data_api'))
+        self.assertEqual(response.json()['status_counts']['approved'], 2)
+        self.assertEqual(response.json()['gender_counts'], {'male': 1, 'female': 1})
+
+
+class ExportTests(DhadTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('export_admin', 'admin@example.com', 'pass')
+        make_request('a@example.com', status='approved', country='مصر')
+        make_request('b@example.com', status='pending', country='مصر', arabic_level='متقدم')
+        make_request('c@example.com', status='pending', country='سوريا')
+
+    def _csv_rows(self, chunks):
+        return list(csv.reader(io.StringIO(''.join(chunks).lstrip('\ufeff'))))
+
+    def test_csv_export_filters_and_shows_choice_labels(self):
+        export = EXPORTS['registration_requests']
+        queryset = export.filter(export.get_queryset(), status='pending', country='مصر')
+        rows = self._csv_rows(export_stream(export, queryset, 'csv'))
+        self.assertEqual(rows[0][:3], ['المعرف', 'الاسم الكامل', 'البريد الإلكتروني'])
+        self.assertEqual([row[2] for row in rows[1:]], ['b@example.com'])
+        self.assertEqual(rows[1][export.headers().index('حالة الطلب')], 'قيد الانتظار')
+
+        tomorrow = date.today() + timedelta(days=1)
+        self.assertEqual(len(list(export.rows(export.filter(export.get_queryset(), date_from=tomorrow)))), 0)
+        self.assertEqual(len(list(export.rows(export.filter(export.get_queryset(), level='متقدم')))), 1)
+
+    def test_xlsx_export_is_a_valid_workbook(self):
+        export = EXPORTS['users']
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(export_stream(export, export.get_queryset(), 'xlsx'))))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertIn('export_admin', sheet)
+        self.assertEqual(sheet.count('<row>'), 2)
+
+    def test_admin_action_streams_selected_rows(self):
+        self.client.force_login(self.admin)
+        selected = RegistrationRequest.objects.filter(country='مصر').values_list('pk', flat=True)
+        response = self.client.post(reverse('admin:registration_registrationrequest_changelist'), {
+            'action': 'export_csv', '_selected_action': list(selected),
+        })
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = self._csv_rows(chunk.decode('utf-8') for chunk in response.streaming_content)
+        self.assertEqual(len(rows), 3)
+
+    def test_management_command_writes_file(self):
+        out = io.StringIO()
+        call_command('export_records', 'registration_requests', '--status', 'approved', stdout=out)
+        rows = self._csv_rows([out.getvalue()])
+        self.assertEqual([row[2] for row in rows[1:]], ['a@example.com'])
+
+    def test_csv_neutralises_formula_cells(self):
+        make_request('d@example.com', country='=HYPERLINK("http://evil.example","x")')
+        RegistrationRequest.objects.filter(email='d@example.com').update(
+            full_name='@SUM(1+1)', whatsapp_number='+963000', current_location='\tمكان',
+        )
+        export = EXPORTS['registration_requests']
+        rows = self._csv_rows(export_stream(export, export.get_queryset().filter(email='d@example.com'), 'csv'))
+        row = dict(zip(rows[0], rows[1]))
+        self.assertEqual(row['الدولة'], '\'=HYPERLINK("http://evil.example","x")')
+        self.assertEqual(row['الاسم الكامل'], "'@SUM(1+1)")
+        self.assertEqual(row['رقم واتساب'], "'+963000")
+        self.assertEqual(row['المكان الحالي'], "'\tمكان")
+        self.assertEqual(row['البريد الإلكتروني'], 'd@example.com')
+
+    def test_unknown_user_status_is_rejected(self):
+        export = EXPORTS['users']
+        self.assertEqual(export.filter(export.get_queryset(), status='active').count(), 1)
+        with self.assertRaises(ValueError):
+            export.filter(export.get_queryset(), status='banned')
+        with self.assertRaises(CommandError):
+            call_command('export_records', 'users', '--status', 'banned', stdout=io.StringIO())
@@ -1,12 +1,11 @@
 # dashboard/views.py
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Count
 from django.http import JsonResponse
-from core.models import User 
 from registration.models import RegistrationRequest 
+from registration.services import ALREADY_APPROVED, APPROVED, approve_requests
+from .metrics import get_metrics
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger 
-from django.utils import timezone 
 from django.contrib import messages 
 # من الآن فصاعدًا، لن نحتاج إلى send_mail أو ما شابهها هنا
 # from django.core.mail import send_mail 
@@ -22,9 +21,7 @@ def is_admin_or_staff(user):
 @login_required 
 @user_passes_test(is_admin_or_staff) 
 def admin_dashboard(request):
-    total_users = User.objects.count()
-    pending_requests = RegistrationRequest.objects.filter(status='pending').count()
-    approved_requests = RegistrationRequest.objects.filter(status='approved').count()
+    metrics = get_metrics()
 
     all_requests = RegistrationRequest.objects.order_by('-created_at')
 
@@ -39,9 +36,9 @@ def admin_dashboard(request):
         recent_requests = paginator.page(paginator.num_pages)
 
     context = {
-        'total_users': total_users,
-        'pending_requests': pending_requests,
-        'approved_requests': approved_requests,
+        'total_users': metrics['total_users'],
+        'pending_requests': metrics['status_counts']['pending'],
+        'approved_requests': metrics['status_counts']['approved'],
         'recent_requests': recent_requests, 
         'paginator': paginator, 
     }
@@ -50,28 +47,8 @@ def admin_dashboard(request):
 @login_required
 @user_passes_test(is_admin_or_staff)
 def user_data_api(request):
-    gender_data = User.objects.values('gender').annotate(count=Count('gender'))
-    
-    gender_counts = {'male': 0, 'female': 0}
-    for item in gender_data:
-        if item['gender'] == 'male':
-            gender_counts['male'] = item['count']
-        elif item['gender'] == 'female':
-            gender_counts['female'] = item['count']
-
-    status_data = RegistrationRequest.objects.values('status').annotate(count=Count('status'))
-    
-    status_counts = {'pending': 0, 'approved': 0, 'rejected': 0}
-    for item in status_data:
-        status_counts[item['status']] = item['count']
-
-    data = {
-        'gender_counts': gender_counts,
-        'status_counts': status_counts,
-        'total_users': User.objects.count() 
-    }
-    
-    return JsonResponse(data)
+    # تُقرأ بيانات الرسوم البيانية من لقطة العدادات المخزنة في الكاش
+    return JsonResponse(get_metrics())
 
 
 @login_required
@@ -80,60 +57,23 @@ def approve_registration_request(request, request_id):
     if request.method == 'POST':
         registration_request = get_object_or_404(RegistrationRequest, pk=request_id)
 
-        if registration_request.status == 'approved':
-            messages.warning(request, f'طلب التسجيل من {registration_request.full_name} تمت الموافقة عليه مسبقاً.')
-            return JsonResponse({'status': 'warning', 'message': f'طلب التسجيل من {registration_request.full_name} تمت الموافقة عليه مسبقاً.'})
+        # نفس مسار الموافقة الجماعية: لا تشفير لكلمة مرور أثناء الطلب في طريقة التفعيل،
+        # والإشعار يُضاف إلى طابور المهام
+        [result] = approve_requests([registration_request.pk], site_url=request.build_absolute_uri('/').rstrip('/'))
 
-        try:
-            if User.objects.filter(email=registration_request.email).exists():
-                messages.error(request, f'فشل إنشاء حساب للطالب {registration_request.full_name}: يوجد مستخدم بالفعل بهذا البريد الإلكتروني ({registration_request.email}).')
-                return JsonResponse({'status': 'error', 'message': f'فشل إنشاء حساب للطالب {registration_request.full_name}: يوجد مستخدم بالفعل بهذا البريد الإلكتروني ({registration_request.email}).'})
-            
-            # الحصول على كلمة المرور من بيانات POST إذا كانت موجودة (من زر التوليد اليدوي)
-            # أو توليد واحدة عشوائية إذا لم يتم توفيرها.
-            generated_password = request.POST.get('generated_password')
-            if not generated_password:
-                # إذا لم يتم توليدها بواسطة الزر، قم بتوليدها هنا بشكل تلقائي
-                generated_password = User.objects.make_random_password(length=12, 
-                                                                       allowed_chars=string.ascii_letters + string.digits + string.punctuation)
-
-
-            # إنشاء كائن User جديد
-            user = User(
-                username=registration_request.email, 
-                email=registration_request.email,
-                role='student', 
-                is_active=True, 
-                first_name=registration_request.full_name.split(' ')[0] if registration_request.full_name else '',
-                last_name=' '.join(registration_request.full_name.split(' ')[1:]) if registration_request.full_name and len(registration_request.full_name.split(' ')) > 1 else '',
-                phone_number=registration_request.whatsapp_number,
-                country=registration_request.country,
-            )
-            
-            # تعيين كلمة المرور المشفرة (باستخدام set_password لضمان التشفير الصحيح)
-            user.set_password(generated_password)
-            user.save()
-
-            # تحديث حالة طلب التسجيل إلى "approved"
-            registration_request.status = 'approved'
-            registration_request.approved_at = timezone.now() 
-            registration_request.user = user 
-            registration_request.save()
-            
-            # لا يوجد إرسال بريد إلكتروني تلقائي للطالب هنا
-
-            messages.success(request, f'تمت الموافقة على طلب {registration_request.full_name} وتم إنشاء حسابه بنجاح. كلمة المرور التي تم إنشاؤها: "{generated_password}"')
+        if result.outcome == APPROVED:
+            messages.success(request, result.message)
             return JsonResponse({
-                'status': 'success', 
-                'message': f'تمت الموافقة على طلب {registration_request.full_name} وتم إنشاء حسابه بنجاح.',
-                'user_username': user.username, 
-                'user_pk': user.pk,
-                'generated_password': generated_password # إرجاع كلمة المرور للإدارة لعرضها
+                'status': 'success',
+                'message': result.message,
+                'user_username': registration_request.email,
+                'user_pk': result.user_id,
             })
-
-        except Exception as e:
-            messages.error(request, f'فشل في الموافقة على طلب {registration_request.full_name}: {e}')
-            return JsonResponse({'status': 'error', 'message': f'فشل في الموافقة على الطلب: {str(e)}'}, status=500)
+        if result.outcome == ALREADY_APPROVED:
+            messages.warning(request, result.message)
+            return JsonResponse({'status': 'warning', 'message': result.message})
+        messages.error(request, result.message)
+        return JsonResponse({'status': 'error', 'message': result.message})
     
     return JsonResponse({'status': 'error', 'message': 'طريقة غير مسموح بها.'}, status=405)
 
@@ -0,0 +1,19 @@
+# jobs/admin.py
+from django.contrib import admin, messages
+
+from .models import Job
+from .queue import retry_jobs
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'last_error')
+    readonly_fields = ('locked_by', 'locked_at', 'created_at', 'finished_at', 'last_error')
+    actions = ['retry_selected_jobs']
+
+    @admin.action(description='إعادة المهام المحددة إلى الطابور')
+    def retry_selected_jobs(self, request, queryset):
+        count = retry_jobs(queryset)
+        self.message_user(request, f'تمت إعادة {count} مهمة إلى الطابور.', level=messages.SUCCESS)
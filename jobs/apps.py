@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+    verbose_name = 'المهام الخلفية'
+
+    def ready(self):
+        # تسجيل المهام المعرّفة في ملفات tasks.py لكل التطبيقات
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('tasks')
@@ -0,0 +1,67 @@
+# jobs/management/commands/run_jobs.py
+
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from jobs.queue import claim_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'تشغيل عامل المهام الخلفية (إرسال البريد والإشعارات) مع إعادة المحاولة عند الفشل.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='عدد الخيوط التي تنفذ المهام بالتوازي.')
+        parser.add_argument('--batch-size', type=int, default=10, help='عدد المهام التي يحجزها كل خيط في كل مرة.')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='الانتظار بالثواني عندما يكون الطابور فارغاً.')
+        parser.add_argument('--once', action='store_true', help='تنفيذ المهام المستحقة حالياً ثم الخروج.')
+
+    def handle(self, *args, **options):
+        concurrency = max(options['concurrency'], 1)
+        stop = threading.Event()
+
+        def work(index):
+            worker_id = f'{socket.gethostname()}:{os.getpid()}:{index}'
+            processed = failed = 0
+            while not stop.is_set():
+                jobs = claim_jobs(worker_id, options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    stop.wait(options['poll_interval'])
+                    continue
+                for job in jobs:
+                    processed += 1
+                    failed += not run_job(job)
+            return processed, failed
+
+        def threaded_work(index):
+            try:
+                return work(index)
+            finally:
+                # لكل خيط اتصال خاص بقاعدة البيانات
+                connection.close()
+
+        self.stdout.write(f'بدء العامل بـ {concurrency} خيط...')
+        try:
+            if concurrency == 1:
+                results = [work(0)]
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    futures = [pool.submit(threaded_work, index) for index in range(concurrency)]
+                    try:
+                        results = [future.result() for future in futures]
+                    except KeyboardInterrupt:
+                        stop.set()
+                        results = [future.result() for future in futures]
+        except KeyboardInterrupt:
+            stop.set()
+            return
+
+        processed = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        self.stdout.write(self.style.SUCCESS(f'تم تنفيذ {processed} مهمة (فشل منها {failed}).'))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100, verbose_name='المهمة')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='البيانات')),
+                ('status', models.CharField(choices=[('queued', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('succeeded', 'نجحت'), ('dead', 'فشلت نهائياً')], default='queued', max_length=10, verbose_name='الحالة')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='عدد المحاولات')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='الحد الأقصى للمحاولات')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='موعد التنفيذ')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='العامل المنفذ')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='وقت الحجز')),
+                ('last_error', models.TextField(blank=True, verbose_name='آخر خطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ الانتهاء')),
+            ],
+            options={
+                'verbose_name': 'مهمة خلفية',
+                'verbose_name_plural': 'المهام الخلفية',
+                'ordering': ['run_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_at', 'id'], name='job_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# jobs/models.py
+
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    مهمة خلفية في طابور قاعدة البيانات (مثل إرسال بريد إلكتروني).
+    ينفذها الأمر run_jobs خارج دورة الطلب، مع إعادة المحاولة عند الفشل.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'في الانتظار'),
+        ('running', 'قيد التنفيذ'),
+        ('succeeded', 'نجحت'),
+        ('dead', 'فشلت نهائياً'),
+    ]
+
+    task = models.CharField(max_length=100, verbose_name="المهمة")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="البيانات")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', verbose_name="الحالة")
+
+    attempts = models.PositiveIntegerField(default=0, verbose_name="عدد المحاولات")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="الحد الأقصى للمحاولات")
+    # لا تُنفذ المهمة قبل هذا الوقت (يُؤجَّل عند إعادة المحاولة)
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="موعد التنفيذ")
+
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="العامل المنفذ")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="وقت الحجز")
+    last_error = models.TextField(blank=True, verbose_name="آخر خطأ")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="تاريخ الانتهاء")
+
+    class Meta:
+        verbose_name = "مهمة خلفية"
+        verbose_name_plural = "المهام الخلفية"
+        ordering = ['run_at', 'id']
+        indexes = [
+            # لاختيار المهام المستحقة: status='queued' AND run_at <= now ORDER BY run_at, id
+            models.Index(fields=['status', 'run_at', 'id'], name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
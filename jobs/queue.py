@@ -0,0 +1,146 @@
+# jobs/queue.py
+
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# سجل المهام: اسم المهمة -> الدالة المنفذة (يُملأ من ملفات tasks.py عند تشغيل التطبيقات)
+_TASKS = {}
+
+
+def task(name):
+    """مزخرف لتسجيل دالة كمهمة خلفية تُستدعى بمحتوى payload كوسائط مسماة."""
+    def decorator(func):
+        _TASKS[name] = func
+        return func
+    return decorator
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _check_task(task_name):
+    if task_name not in _TASKS:
+        raise LookupError(f'مهمة غير مسجلة: {task_name}')
+
+
+def enqueue(task_name, payload=None, run_at=None, max_attempts=None):
+    """
+    يضيف مهمة إلى الطابور. إذا استُدعي داخل معاملة فلن يراها العامل إلا بعد نجاحها،
+    فلا تُرسل إشعارات لتغييرات تم التراجع عنها.
+    """
+    _check_task(task_name)
+    return Job.objects.create(
+        task=task_name,
+        payload=payload or {},
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or _setting('JOBS_MAX_ATTEMPTS', 5),
+    )
+
+
+def enqueue_many(task_name, payloads, max_attempts=None):
+    """يضيف مهمة لكل payload بعبارة INSERT واحدة."""
+    _check_task(task_name)
+    now = timezone.now()
+    max_attempts = max_attempts or _setting('JOBS_MAX_ATTEMPTS', 5)
+    return Job.objects.bulk_create([
+        Job(task=task_name, payload=payload, run_at=now, max_attempts=max_attempts) for payload in payloads
+    ])
+
+
+def backoff_delay(attempts):
+    """تأخير أُسّي قبل المحاولة التالية مع عشوائية بسيطة حتى لا تتزامن المحاولات."""
+    base = _setting('JOBS_BACKOFF_BASE_SECONDS', 30)
+    delay = min(base * 2 ** max(attempts - 1, 0), _setting('JOBS_BACKOFF_MAX_SECONDS', 60 * 60))
+    return timedelta(seconds=delay + random.uniform(0, delay / 10))
+
+
+def _stale_before(now):
+    return now - timedelta(seconds=_setting('JOBS_LOCK_TIMEOUT_SECONDS', 10 * 60))
+
+
+def _claimable(now):
+    # المهام المستحقة، والمهام العالقة في "قيد التنفيذ" بعد توقف عاملها ما دامت لها محاولات متبقية
+    return Q(status='queued', run_at__lte=now) | Q(
+        status='running', locked_at__lt=_stale_before(now), attempts__lt=F('max_attempts'),
+    )
+
+
+def _bury_stale(now):
+    """
+    المهام العالقة التي استنفدت محاولاتها (توقف عاملها في كل مرة، كمهمة تُسقط العملية)
+    تنتقل إلى "فشلت نهائياً" بدلاً من إعادة حجزها بلا نهاية.
+    """
+    buried = Job.objects.filter(
+        status='running', locked_at__lt=_stale_before(now), attempts__gte=F('max_attempts'),
+    ).update(
+        status='dead', finished_at=now, locked_by='', locked_at=None,
+        last_error='توقف العامل أثناء التنفيذ في آخر محاولة.',
+    )
+    if buried:
+        logger.error('نُقلت %s مهمة عالقة إلى "فشلت نهائياً" بعد استنفاد محاولاتها', buried)
+    return buried
+
+
+def claim_jobs(worker_id, limit=10):
+    """
+    يحجز حتى limit مهمة مستحقة للعامل. كل مهمة تُحجز بعبارة UPDATE مشروطة على حالتها،
+    فلا يمكن لعاملين متزامنين تنفيذ المهمة نفسها.
+    """
+    now = timezone.now()
+    _bury_stale(now)
+    candidate_ids = list(
+        Job.objects.filter(_claimable(now)).order_by('run_at', 'id').values_list('id', flat=True)[:limit]
+    )
+    claimed = [
+        job_id for job_id in candidate_ids
+        if Job.objects.filter(_claimable(now), pk=job_id).update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+        )
+    ]
+    return list(Job.objects.filter(pk__in=claimed, locked_by=worker_id).order_by('run_at', 'id'))
+
+
+def run_job(job):
+    """
+    ينفذ مهمة محجوزة. عند الفشل تُعاد إلى الطابور بتأخير أُسّي،
+    وبعد استنفاد المحاولات تنتقل إلى حالة "فشلت نهائياً" مع آخر خطأ.
+    يرجع True عند النجاح.
+    """
+    try:
+        _TASKS[job.task](**job.payload)
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            changes = {'status': 'dead', 'finished_at': now}
+            logger.error('المهمة %s #%s فشلت نهائياً بعد %s محاولات', job.task, job.pk, job.attempts)
+        else:
+            changes = {'status': 'queued', 'run_at': now + backoff_delay(job.attempts)}
+            logger.warning('فشلت المهمة %s #%s (المحاولة %s)', job.task, job.pk, job.attempts)
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            last_error=error, locked_by='', locked_at=None, **changes
+        )
+        return False
+
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status='succeeded', finished_at=timezone.now(), locked_by='', locked_at=None,
+    )
+    return True
+
+
+def retry_jobs(queryset):
+    """يعيد المهام (عادةً الفاشلة نهائياً) إلى الطابور بعداد محاولات جديد."""
+    return queryset.exclude(status='running').update(
+        status='queued', attempts=0, run_at=timezone.now(), finished_at=None,
+    )
@@ -0,0 +1,37 @@
+# jobs/tasks.py
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from .queue import enqueue, enqueue_many, task
+
+SEND_EMAIL = 'jobs.send_email'
+
+
+@task(SEND_EMAIL)
+def send_email(subject, to, template_name=None, context=None, body='', html_body='', from_email=None):
+    if template_name:
+        html_body = render_to_string(template_name, context or {})
+        body = strip_tags(html_body)
+    message = EmailMultiAlternatives(subject, body, from_email or settings.DEFAULT_FROM_EMAIL, to)
+    if html_body:
+        message.attach_alternative(html_body, 'text/html')
+    message.send(fail_silently=False)
+
+
+def email_payload(to, subject, template_name, context):
+    """
+    يبني بيانات مهمة البريد: اسم القالب وسياقه (قيم نصية قابلة للتخزين في JSON).
+    القالب يُعرض في العامل عند الإرسال، فلا تدفع الدفعات الكبيرة (الموافقات والاستيراد) ثمن العرض.
+    """
+    return {'subject': subject, 'to': list(to), 'template_name': template_name, 'context': context}
+
+
+def enqueue_email(to, subject, template_name, context):
+    return enqueue(SEND_EMAIL, email_payload(to, subject, template_name, context))
+
+
+def enqueue_emails(payloads):
+    return enqueue_many(SEND_EMAIL, payloads)
@@ -0,0 +1,106 @@
+# jobs/tests.py
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from academic.models import Class, Course, Program
+from core.models import User
+from core.testing import DhadTestCase
+from .models import Job
+from .queue import claim_jobs, enqueue, retry_jobs, run_job, task
+from .tasks import SEND_EMAIL, enqueue_email
+
+calls = []
+
+
+@task('jobs.tests.flaky')
+def flaky(fail_times):
+    calls.append(fail_times)
+    if len(calls) <= fail_times:
+        raise ConnectionError('خادم البريد غير متاح')
+
+
+class JobQueueTests(DhadTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_email_job_sent_by_worker(self):
+        enqueue_email(['student@example.com'], 'عنوان', 'contacts/emails/contact_acknowledgement_email.html',
+                      {'name': 'سارة', 'subject': 'استفسار'})
+        self.assertEqual(mail.outbox, [])
+
+        out = StringIO()
+        call_command('run_jobs', once=True, stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('سارة', mail.outbox[0].body)
+        self.assertEqual(Job.objects.get().status, 'succeeded')
+
+    @override_settings(JOBS_BACKOFF_BASE_SECONDS=60)
+    def test_failure_backs_off_then_dead_letters(self):
+        job = enqueue('jobs.tests.flaky', {'fail_times': 5}, max_attempts=2)
+
+        with self.assertLogs('jobs.queue', level='WARNING'):
+            self.assertFalse(run_job(claim_jobs('w1')[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreaterEqual(job.run_at, timezone.now() + timedelta(seconds=55))
+        self.assertIn('ConnectionError', job.last_error)
+        # لم يحن موعد المحاولة التالية بعد
+        self.assertEqual(claim_jobs('w1'), [])
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('jobs.queue', level='ERROR'):
+            self.assertFalse(run_job(claim_jobs('w1')[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('dead', 2))
+
+        retry_jobs(Job.objects.filter(pk=job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 0))
+
+    def test_claimed_job_not_claimed_twice(self):
+        enqueue('jobs.tests.flaky', {'fail_times': 0})
+        self.assertEqual(len(claim_jobs('w1')), 1)
+        self.assertEqual(claim_jobs('w2'), [])
+
+        # مهمة عالقة بعد توقف عاملها يعاد حجزها
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        [job] = claim_jobs('w2')
+        self.assertEqual((job.locked_by, job.attempts), ('w2', 2))
+        self.assertTrue(run_job(job))
+
+    def test_stale_job_without_attempts_left_goes_dead(self):
+        job = enqueue('jobs.tests.flaky', {'fail_times': 0}, max_attempts=2)
+        claim_jobs('w1')
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        [reclaimed] = claim_jobs('w2')
+        self.assertEqual(reclaimed.attempts, 2)
+
+        # العامل الثاني توقف أيضاً: لا حجز ثالث، والمهمة تنتقل إلى "فشلت نهائياً"
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('jobs.queue', level='ERROR'):
+            self.assertEqual(claim_jobs('w3'), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('dead', 2, ''))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(calls, [])
+
+    def test_contact_form_and_class_assignment_enqueue_notices(self):
+        self.client.post(reverse('contacts:contact'), {
+            'name': 'سارة', 'email': 'sara@example.com', 'subject': 'استفسار', 'message': 'مرحباً',
+        })
+        student = User.objects.create_user('s1', email='s1@example.com', role='student')
+        course = Course.objects.create(name='القواعد', program=Program.objects.create(name='عام'))
+        cls = Class.objects.create(
+            course=course, start_time=timezone.now(), end_time=timezone.now() + timedelta(hours=1),
+        )
+        cls.students.add(student)
+
+        recipients = sorted(job.payload['to'][0] for job in Job.objects.filter(task=SEND_EMAIL))
+        self.assertEqual(recipients, ['s1@example.com', 'sara@example.com'])
+        self.assertEqual(mail.outbox, [])
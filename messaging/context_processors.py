@@ -0,0 +1,20 @@
+# messaging/context_processors.py
+
+from .unread import unread_total
+
+
+def unread_messages(request):
+    """
+    يوفر unread_messages_count لقالب base.html.
+    القيمة كسولة: لا يُقرأ الكاش إلا إذا استخدمها القالب، ومرة واحدة لكل طلب.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+
+    def count():
+        if not hasattr(request, '_unread_messages_count'):
+            request._unread_messages_count = unread_total(user.id)
+        return request._unread_messages_count
+
+    return {'unread_messages_count': count}
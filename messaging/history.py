@@ -0,0 +1,29 @@
+# messaging/history.py
+
+from .models import Message
+
+# عدد الرسائل في الصفحة الأولى وفي كل دفعة تحميل لاحقة
+HISTORY_PAGE_SIZE = 50
+
+
+def message_page(conversation_id, before_id=None, after_id=None, limit=HISTORY_PAGE_SIZE):
+    """
+    صفحة من رسائل المحادثة بترقيم keyset على (conversation, id) باستخدام الفهرس المركب:
+    - بدون مؤشر: أحدث limit رسالة.
+    - before_id: الرسائل الأقدم من before_id (للتحميل عند التمرير للأعلى).
+    - after_id: الرسائل الأحدث من after_id.
+    يرجع (messages, has_more) والرسائل مرتبة دائماً من الأقدم للأحدث،
+    وhas_more تعني وجود رسائل أخرى في اتجاه الترقيم.
+    """
+    messages = Message.objects.filter(conversation_id=conversation_id).select_related('sender')
+    if after_id is not None:
+        page = list(messages.filter(id__gt=after_id).order_by('id')[:limit + 1])
+        return page[:limit], len(page) > limit
+
+    if before_id is not None:
+        messages = messages.filter(id__lt=before_id)
+    page = list(messages.order_by('-id')[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    page.reverse()
+    return page, has_more
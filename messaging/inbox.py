@@ -0,0 +1,90 @@
+# messaging/inbox.py
+
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import User
+from .models import Conversation, ConversationReadState, Message
+
+INBOX_PAGE_SIZE = 20
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(conversation):
+    # الوقت بالميكروثانية منذ 1970 حتى يبقى المؤشر آمناً في الرابط ودقيقاً تماماً
+    return f'{(conversation.updated_at - _EPOCH) // _MICROSECOND}_{conversation.id}'
+
+
+def decode_cursor(cursor):
+    """يرجع (updated_at, id) أو None إذا كان المؤشر غير صالح."""
+    try:
+        microseconds, conversation_id = cursor.split('_', 1)
+        return _EPOCH + int(microseconds) * _MICROSECOND, int(conversation_id)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def inbox_queryset(user):
+    """
+    محادثات المستخدم مع آخر رسالة وعدد الرسائل غير المقروءة (بعد مؤشر القراءة) في استعلام واحد،
+    والمشاركون الآخرون في استعلام prefetch واحد لكل الصفحة.
+    """
+    last_message = Message.objects.filter(conversation_id=OuterRef('pk')).order_by('-id')
+    last_read = ConversationReadState.objects.filter(conversation_id=OuterRef('pk'), user_id=user.id)
+    unread = (
+        Message.objects.filter(conversation_id=OuterRef('pk'), id__gt=OuterRef('last_read_message_id'))
+        .exclude(sender_id=user.id)
+        .order_by().values('conversation_id').annotate(n=Count('*')).values('n')
+    )
+    return (
+        Conversation.objects.filter(participants=user)
+        .annotate(
+            last_message_content=Subquery(last_message.values('content')[:1]),
+            last_message_sender_id=Subquery(last_message.values('sender_id')[:1]),
+            last_message_timestamp=Subquery(last_message.values('timestamp')[:1]),
+            last_read_message_id=Coalesce(Subquery(last_read.values('last_read_message_id')[:1]), 0),
+        )
+        .annotate(unread_count=Coalesce(Subquery(unread, output_field=IntegerField()), 0))
+        .prefetch_related(Prefetch(
+            'participants',
+            queryset=User.objects.exclude(pk=user.pk).only('id', 'username', 'first_name', 'last_name'),
+            to_attr='other_participants',
+        ))
+        .order_by('-updated_at', '-id')
+    )
+
+
+def inbox_page(user, cursor=None, page_size=INBOX_PAGE_SIZE):
+    """
+    صفحة من صندوق الوارد بترقيم keyset على (updated_at, id): تكلفة كل صفحة ثابتة
+    مهما كان عدد محادثات المستخدم، بخلاف OFFSET.
+    يرجع (conversations, next_cursor).
+    """
+    conversations = inbox_queryset(user)
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        updated_at, conversation_id = position
+        conversations = conversations.filter(
+            Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=conversation_id)
+        )
+
+    page = list(conversations[:page_size + 1])
+    has_next = len(page) > page_size
+    page = page[:page_size]
+
+    for conv in page:
+        others = conv.other_participants
+        conv.other_participant = others[0] if conv.conversation_type == 'private' and len(others) == 1 else None
+        if conv.last_message_sender_id == user.id:
+            conv.last_message_sender = user
+        else:
+            conv.last_message_sender = next(
+                (participant for participant in others if participant.id == conv.last_message_sender_id), None
+            )
+
+    next_cursor = encode_cursor(page[-1]) if has_next else None
+    return page, next_cursor
@@ -0,0 +1,79 @@
+# messaging/management/commands/benchmark_message_poll.py
+
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from core.models import User
+from messaging import views
+from messaging.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = (
+        'قياس تكلفة استطلاع "لا جديد" في المحادثة عبر نقطة poll_messages '
+        '(طلبات/ثانية واستعلامات لكل طلب). '
+        'تُنشأ بيانات مؤقتة داخل معاملة يتم التراجع عنها.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='عدد الطلبات لكل نقطة.')
+        parser.add_argument('--messages', type=int, default=200, help='عدد الرسائل في المحادثة التجريبية.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            conversation, user = self._create_fixture(options['messages'])
+            latest_id = conversation.messages.order_by('-id').values_list('id', flat=True).first()
+
+            factory = RequestFactory()
+            poll_url = f'/messages/{conversation.id}/poll/'
+
+            etag = None
+
+            def long_poll():
+                headers = {'If-None-Match': etag} if etag else {}
+                request = factory.get(poll_url, {'after': latest_id}, headers=headers)
+                request.user = user
+                request.auser = self._auser(user)
+                return async_to_sync(views.poll_messages)(request, conversation_id=conversation.id)
+
+            # طلب تمهيدي يملأ الكاش ويعطينا ETag الحالي
+            etag = long_poll()['ETag']
+
+            requests_per_second, queries_per_request, status = self._measure(long_poll, options['requests'])
+            self.stdout.write(
+                f'poll_messages: {requests_per_second:,.0f} طلب/ثانية، '
+                f'{queries_per_request:.2f} استعلام لكل طلب، الحالة {status}'
+            )
+
+            transaction.set_rollback(True)
+
+    def _create_fixture(self, message_count):
+        teacher = User.objects.create_user('__poll_bench_teacher', role='teacher')
+        student = User.objects.create_user('__poll_bench_student', role='student')
+        conversation = Conversation.objects.create(conversation_type='private')
+        conversation.participants.add(teacher, student)
+        Message.objects.bulk_create([
+            Message(conversation=conversation, sender=teacher if i % 2 else student, content=f'رسالة {i}')
+            for i in range(message_count)
+        ])
+        return conversation, student
+
+    @staticmethod
+    def _auser(user):
+        async def auser():
+            return user
+        return auser
+
+    @staticmethod
+    def _measure(poll, count):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            for _ in range(count):
+                response = poll()
+            elapsed = time.perf_counter() - started
+        return count / elapsed, len(ctx) / count, response.status_code
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:35
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def backfill_updated_at(apps, schema_editor):
+    # ترتيب صندوق الوارد أصبح حسب آخر رسالة، فنضبط المحادثات القديمة على وقت آخر رسالة فيها
+    Conversation = apps.get_model('messaging', 'Conversation')
+    Message = apps.get_model('messaging', 'Message')
+    last_timestamp = (
+        Message.objects.filter(conversation_id=OuterRef('pk'))
+        .order_by().values('conversation_id').annotate(latest=Max('timestamp')).values('latest')[:1]
+    )
+    Conversation.objects.filter(messages__isnull=False).distinct().update(updated_at=Subquery(last_timestamp))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['-updated_at', '-id'], name='conversation_recent_idx'),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
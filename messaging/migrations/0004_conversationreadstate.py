@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def create_read_states(apps, schema_editor):
+    # لم يكن is_read يُحدَّث سابقاً، لذلك نعتبر كل الرسائل الموجودة مقروءة عند بدء العمل بالمؤشرات
+    Conversation = apps.get_model('messaging', 'Conversation')
+    ConversationReadState = apps.get_model('messaging', 'ConversationReadState')
+    latest_ids = dict(
+        Conversation.objects.annotate(latest=Max('messages__id')).values_list('id', 'latest')
+    )
+    rows = [
+        ConversationReadState(conversation_id=conversation_id, user_id=user_id, last_read_message_id=latest_ids.get(conversation_id) or 0)
+        for conversation_id, user_id in Conversation.participants.through.objects.values_list('conversation_id', 'user_id')
+    ]
+    ConversationReadState.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0003_message_conversation_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0, verbose_name='معرف آخر رسالة مقروءة')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ آخر قراءة')),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='messaging.conversation', verbose_name='المحادثة')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_read_states', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'مؤشر قراءة',
+                'verbose_name_plural': 'مؤشرات القراءة',
+                'unique_together': {('conversation', 'user')},
+            },
+        ),
+        migrations.RunPython(create_read_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+def backfill_private_keys(apps, schema_editor):
+    """
+    يملأ private_key للمحادثات الفردية ذات الطرفين.
+    إذا وُجدت محادثات مكررة لنفس الطرفين يأخذ المفتاحَ أحدثُها نشاطاً،
+    وتبقى الأخرى بلا مفتاح (يمكن الوصول إليها من صندوق الوارد لكنها لا تُستخدم عند بدء محادثة).
+    """
+    Conversation = apps.get_model('messaging', 'Conversation')
+    Through = Conversation.participants.through
+
+    participants = {}
+    for conversation_id, user_id in Through.objects.filter(
+        conversation__conversation_type='private'
+    ).values_list('conversation_id', 'user_id'):
+        participants.setdefault(conversation_id, set()).add(user_id)
+
+    keyed = {}
+    for conversation in Conversation.objects.filter(id__in=participants).order_by('-updated_at', '-id').only('id'):
+        user_ids = participants[conversation.id]
+        if len(user_ids) != 2:
+            continue
+        low, high = sorted(user_ids)
+        keyed.setdefault(f'{low}:{high}', conversation.id)
+
+    for key, conversation_id in keyed.items():
+        Conversation.objects.filter(pk=conversation_id).update(private_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_conversationreadstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='private_key',
+            field=models.CharField(blank=True, editable=False, max_length=41, null=True, verbose_name='مفتاح المحادثة الفردية'),
+        ),
+        migrations.RunPython(backfill_private_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='conversation',
+            name='private_key',
+            field=models.CharField(blank=True, editable=False, max_length=41, null=True, unique=True, verbose_name='مفتاح المحادثة الفردية'),
+        ),
+    ]
@@ -16,6 +16,10 @@ class Conversation(models.Model):
     ]
     conversation_type = models.CharField(max_length=10, choices=CONVERSATION_TYPE_CHOICES, default='private', verbose_name="نوع المحادثة")
 
+    # مفتاح ثابت للمحادثة الفردية: معرفا الطرفين مرتبين ("3:17")، وفريد حتى لا تتكرر المحادثة.
+    # يبقى فارغاً (NULL) للمحادثات الجماعية.
+    private_key = models.CharField(max_length=41, unique=True, null=True, blank=True, editable=False, verbose_name="مفتاح المحادثة الفردية")
+
     # تاريخ إنشاء المحادثة
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
     # تاريخ آخر رسالة (لتسهيل ترتيب المحادثات حسب الأحدث)
@@ -25,12 +29,21 @@ class Conversation(models.Model):
         verbose_name = "محادثة"
         verbose_name_plural = "المحادثات"
         ordering = ['-updated_at'] # ترتيب المحادثات من الأحدث للأقدم
+        indexes = [
+            # لترقيم صندوق الوارد بمؤشر keyset على (updated_at, id)
+            models.Index(fields=['-updated_at', '-id'], name='conversation_recent_idx'),
+        ]
 
     def __str__(self):
         # تمثيل بسيط للمحادثة بأسماء المشاركين (مثلاً: "محادثة بين أحمد ومحمد")
         participant_names = ", ".join([user.username for user in self.participants.all()])
         return f"محادثة: {participant_names}"
 
+    @staticmethod
+    def private_key_for(user_id, other_user_id):
+        low, high = sorted((user_id, other_user_id))
+        return f"{low}:{high}"
+
     # دالة مساعدة للحصول على الطرف الآخر في محادثة فردية
     def get_other_participant(self, current_user):
         if self.conversation_type == 'private' and self.participants.count() == 2:
@@ -54,6 +67,28 @@ class Message(models.Model):
         verbose_name = "رسالة"
         verbose_name_plural = "الرسائل"
         ordering = ['timestamp'] # ترتيب الرسائل من الأقدم للأحدث في المحادثة
+        indexes = [
+            # لترقيم سجل المحادثة بمؤشر keyset (before_id / after_id)
+            models.Index(fields=['conversation', 'id'], name='message_conversation_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"رسالة من {self.sender.username} في {self.conversation.id} - {self.timestamp.strftime('%H:%M')}"
+
+
+# 3. نموذج مؤشر القراءة
+# بدلاً من تحديث is_read لكل رسالة، نحفظ لكل مستخدم في كل محادثة معرف آخر رسالة قرأها،
+# وكل رسالة من الطرف الآخر بمعرف أكبر منه تعتبر غير مقروءة.
+class ConversationReadState(models.Model):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_states', verbose_name="المحادثة")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_read_states', verbose_name="المستخدم")
+    last_read_message_id = models.BigIntegerField(default=0, verbose_name="معرف آخر رسالة مقروءة")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ آخر قراءة")
+
+    class Meta:
+        verbose_name = "مؤشر قراءة"
+        verbose_name_plural = "مؤشرات القراءة"
+        unique_together = ('conversation', 'user')
 
     def __str__(self):
-        return f"رسالة من {self.sender.username} في {self.conversation.id} - {self.timestamp.strftime('%H:%M')}"
\ No newline at end of file
+        return f"{self.user.username} قرأ المحادثة {self.conversation_id} حتى الرسالة {self.last_read_message_id}"
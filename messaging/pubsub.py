@@ -0,0 +1,116 @@
+# messaging/pubsub.py
+
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'messaging.pubsub.InProcessBroker'
+
+
+def conversation_channel(conversation_id):
+    return f'conversation:{conversation_id}'
+
+
+def message_payload(message):
+    """
+    يحوّل الرسالة إلى قاموس جاهز للإرسال (JSON) دون أي استعلام إضافي،
+    بشرط أن يكون المرسل محملاً مسبقاً (select_related أو المستخدم الحالي).
+    """
+    sender = message.sender
+    return {
+        'id': message.id,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+        'sender_id': sender.id,
+        'sender_username': sender.username,
+        'sender_full_name': sender.get_full_name() or sender.username,
+    }
+
+
+class Subscription:
+    """اشتراك واحد (اتصال SSE واحد) يستقبل الأحداث في طابور asyncio خاص به."""
+
+    def __init__(self, broker, channel, loop):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    async def get(self, timeout=None):
+        """ينتظر الحدث التالي، ويرجع None إذا انتهت المهلة دون أحداث."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class InProcessBroker:
+    """
+    ناشر/مشترك داخل العملية نفسها.
+    مع عدة عمليات (workers) لا يرى رسائل العمليات الأخرى، فتلتقطها القناة والاستطلاع من علامة المد
+    المشتركة في الكاش بتأخير نبضة keep-alive على الأكثر. للدفع الفوري يمكن استبداله بخادم مشترك
+    (مثل Redis) عبر الإعداد MESSAGING_PUBSUB_BACKEND بفئة توفر نفس الدالتين subscribe و publish.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channel):
+        # يجب استدعاؤها من داخل حلقة asyncio (العرض غير المتزامن)
+        subscription = Subscription(self, channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event):
+        """
+        آمنة للاستدعاء من أي خيط (مثلاً من إشارة post_save في عرض متزامن):
+        يُسلَّم الحدث لكل مشترك عبر call_soon_threadsafe على حلقته.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.queue.put_nowait, event)
+            except RuntimeError:
+                # الحلقة أُغلقت (انقطع الاتصال)؛ نزيل الاشتراك
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, 'MESSAGING_PUBSUB_BACKEND', DEFAULT_BACKEND)
+                _broker = import_string(backend)()
+    return _broker
@@ -0,0 +1,60 @@
+# messaging/signals.py
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from .models import Conversation, ConversationReadState, Message
+from .pubsub import conversation_channel, get_broker, message_payload
+from .unread import ensure_read_states, invalidate_unread_totals, mark_read
+from .watermarks import invalidate_participants, participant_ids, set_latest_message_id
+
+
+@receiver(post_save, sender=Message)
+def message_created(sender, instance, created, **kwargs):
+    if not created:
+        return
+    # نبني الحدث الآن (المرسل محمل في العرض) وننشره فقط بعد نجاح المعاملة
+    conversation_id = instance.conversation_id
+    # تحديث وقت آخر نشاط للمحادثة حتى تُرتب في صندوق الوارد حسب آخر رسالة
+    Conversation.objects.filter(pk=conversation_id).update(updated_at=instance.timestamp)
+    # المرسل قرأ رسالته بالطبع
+    mark_read(conversation_id, instance.sender_id, instance.id)
+    payload = message_payload(instance)
+
+    def publish():
+        set_latest_message_id(conversation_id, payload['id'])
+        invalidate_unread_totals(participant_ids(conversation_id) - {payload['sender_id']})
+        get_broker().publish(conversation_channel(conversation_id), payload)
+
+    transaction.on_commit(publish)
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def conversation_participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # بعد clear لن نعرف الطرف الآخر من العلاقة، لذلك نحفظه قبل الحذف
+        if reverse:
+            instance._cleared_ids = list(instance.conversations.values_list('id', flat=True))
+        else:
+            instance._cleared_ids = list(instance.participants.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    related_ids = getattr(instance, '_cleared_ids', []) if action == 'post_clear' else pk_set
+    if reverse:
+        pairs = {(conversation_id, instance.pk) for conversation_id in related_ids}
+    else:
+        pairs = {(instance.pk, user_id) for user_id in related_ids}
+    conversation_ids = {conversation_id for conversation_id, _ in pairs}
+    user_ids = {user_id for _, user_id in pairs}
+
+    invalidate_participants(conversation_ids)
+    invalidate_unread_totals(user_ids)
+    if action == 'post_add':
+        ensure_read_states(pairs)
+    else:
+        # مؤشر القراءة لمحادثة غادرها المستخدم يجب ألا يدخل في عدد غير المقروء
+        # (أحد طرفي الأزواج ثابت دائماً، فالفلترة بالمجموعتين دقيقة)
+        ConversationReadState.objects.filter(conversation_id__in=conversation_ids, user_id__in=user_ids).delete()
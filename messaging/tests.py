@@ -1,3 +1,351 @@
-from django.test import TestCase
+import asyncio
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import User
+from core.testing import DhadTestCase
+from .inbox import inbox_page
+from .models import Conversation, Message
+from .pubsub import conversation_channel, get_broker, message_payload
+from .unread import unread_total
+from .watermarks import set_latest_message_id
+
+
+def _parse_event(chunk):
+    chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+    data_lines = [line[len('data: '):] for line in chunk.splitlines() if line.startswith('data: ')]
+    return json.loads(''.join(data_lines)) if data_lines else None
+
+
+class ConversationStreamTests(DhadTestCase):
+    """
+    قناة SSE للمحادثة: إرسال الرسائل الفائتة ثم دفع الجديدة عبر الناشر داخل العملية.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.outsider = User.objects.create_user('outsider', role='student')
+        cls.conversation = Conversation.objects.create(conversation_type='private')
+        cls.conversation.participants.add(cls.teacher, cls.student)
+        cls.first = Message.objects.create(conversation=cls.conversation, sender=cls.teacher, content='السلام عليكم')
+
+    def _stream_url(self):
+        return reverse('messaging:conversation_stream', args=[self.conversation.id])
+
+    async def _next_event(self, content):
+        while True:
+            event = _parse_event(await anext(content))
+            if event is not None:
+                return event
+
+    async def test_stream_backfills_then_pushes_new_messages(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(self._stream_url(), query_params={'after': 0})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = aiter(response.streaming_content)
+
+        self.assertEqual((await self._next_event(content))['id'], self.first.id)
+
+        message = await sync_to_async(Message.objects.create)(
+            conversation=self.conversation, sender=self.teacher, content='كيف حالك؟'
+        )
+        get_broker().publish(conversation_channel(self.conversation.id), message_payload(message))
+        event = await self._next_event(content)
+        self.assertEqual(event['id'], message.id)
+        self.assertEqual(event['sender_id'], self.teacher.id)
+        await content.aclose()
+
+    async def test_last_event_id_skips_delivered_messages(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(self._stream_url(), headers={'Last-Event-ID': str(self.first.id)})
+        content = aiter(response.streaming_content)
+        await anext(content)  # retry:
+
+        channel = conversation_channel(self.conversation.id)
+        self.assertEqual(get_broker().subscriber_count(channel), 1)
+        message = await sync_to_async(Message.objects.create)(
+            conversation=self.conversation, sender=self.teacher, content='درس اليوم'
+        )
+        # رسالة سبق تسليمها (إعادة نشر مكررة) يجب ألا تُرسل مرة أخرى
+        get_broker().publish(channel, message_payload(self.first))
+        get_broker().publish(channel, message_payload(message))
+        self.assertEqual((await self._next_event(content))['id'], message.id)
+        await content.aclose()
+
+    @mock.patch('messaging.views.STREAM_HEARTBEAT_SECONDS', 0.01)
+    async def test_message_from_another_worker_arrives_through_the_watermark(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(self._stream_url(), headers={'Last-Event-ID': str(self.first.id)})
+        content = aiter(response.streaming_content)
+        await anext(content)  # retry:
+        self.assertEqual(await anext(content), b': keep-alive\n\n')
+
+        # رسالة حفظها عامل آخر: لا تُنشر على الناشر داخل هذه العملية، لكنها ترفع علامة المد في الكاش المشترك
+        message = await sync_to_async(Message.objects.create)(
+            conversation=self.conversation, sender=self.teacher, content='من عامل آخر'
+        )
+        await sync_to_async(set_latest_message_id)(self.conversation.id, message.id)
+        self.assertEqual(get_broker().subscriber_count(conversation_channel(self.conversation.id)), 1)
+        self.assertEqual((await self._next_event(content))['id'], message.id)
+        await content.aclose()
+
+    async def test_non_participant_is_forbidden(self):
+        await self.async_client.aforce_login(self.outsider)
+        response = await self.async_client.get(self._stream_url())
+        self.assertEqual(response.status_code, 403)
+
+    def test_stream_is_disabled_under_wsgi(self):
+        self.client.force_login(self.student)
+        response = self.client.get(self._stream_url())
+        self.assertEqual(response.status_code, 204)
+
+    def test_new_message_is_published_after_commit(self):
+        received = []
+        broker = get_broker()
+        original_publish = broker.publish
+        broker.publish = lambda channel, event: received.append((channel, event))
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                message = Message.objects.create(conversation=self.conversation, sender=self.student, content='شكراً')
+        finally:
+            broker.publish = original_publish
+
+        self.assertEqual(received, [(conversation_channel(self.conversation.id), message_payload(message))])
+
+
+@override_settings(MESSAGING_POLL_TIMEOUT=0)
+class PollMessagesTests(DhadTestCase):
+    """
+    نقطة الاستطلاع: "لا جديد" يُجاب من الكاش دون استعلام على الرسائل أو المشاركين.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.outsider = User.objects.create_user('outsider', role='student')
+        cls.conversation = Conversation.objects.create(conversation_type='private')
+        cls.conversation.participants.add(cls.teacher, cls.student)
+        cls.first = Message.objects.create(conversation=cls.conversation, sender=cls.teacher, content='مرحباً')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+        self.url = reverse('messaging:poll_messages', args=[self.conversation.id])
+
+    def test_nothing_new_is_answered_without_message_queries(self):
+        etag = self.client.get(self.url, {'after': self.first.id})['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'after': self.first.id}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        touched = [query['sql'] for query in ctx if 'messaging_' in query['sql']]
+        self.assertEqual(touched, [])
+
+    def test_new_messages_are_returned_after_commit(self):
+        self.client.get(self.url, {'after': self.first.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(conversation=self.conversation, sender=self.teacher, content='جديد')
+
+        data = self.client.get(self.url, {'after': self.first.id}).json()
+        self.assertEqual([item['id'] for item in data['messages']], [message.id])
+        self.assertFalse(data['messages'][0]['is_from_me'])
+        self.assertEqual(data['last_id'], message.id)
+
+    def test_removed_participant_loses_access(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.conversation.participants.remove(self.student)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    async def test_long_poll_wakes_up_on_publish(self):
+        await self.async_client.aforce_login(self.student)
+        with self.settings(MESSAGING_POLL_TIMEOUT=5):
+            message = await sync_to_async(Message.objects.create)(
+                conversation=self.conversation, sender=self.teacher, content='وصلت'
+            )
+            channel = conversation_channel(self.conversation.id)
+
+            async def publish_when_subscribed():
+                while not get_broker().subscriber_count(channel):
+                    await asyncio.sleep(0.01)
+                get_broker().publish(channel, message_payload(message))
+
+            # علامة المد في الكاش ما زالت عند الرسالة الأولى (لم يحدث commit)
+            await cache.aset(f'messaging:latest_message_id:{self.conversation.id}', self.first.id)
+            publisher = asyncio.ensure_future(publish_when_subscribed())
+            response = await self.async_client.get(self.url, {'after': self.first.id})
+            await publisher
+
+        self.assertEqual([item['id'] for item in json.loads(response.content)['messages']], [message.id])
+
+
+class InboxTests(DhadTestCase):
+    """
+    صندوق الوارد: عدد ثابت من الاستعلامات لكل صفحة، وترقيم keyset بلا تكرار أو فقدان.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', role='student')
+        for i in range(25):
+            teacher = User.objects.create_user(f'teacher{i}', role='teacher')
+            conversation = Conversation.objects.create(conversation_type='private')
+            conversation.participants.add(cls.student, teacher)
+            Message.objects.create(conversation=conversation, sender=teacher, content=f'رسالة {i}')
+
+    def test_pages_cover_every_conversation_once(self):
+        self.client.force_login(self.student)
+        seen = []
+        params = {}
+        while True:
+            response = self.client.get(reverse('messaging:inbox'), params)
+            seen += [conv.id for conv in response.context['conversations']]
+            if not response.context['next_cursor']:
+                break
+            params = {'cursor': response.context['next_cursor']}
+        self.assertEqual(sorted(seen), sorted(Conversation.objects.values_list('id', flat=True)))
+
+    def test_page_is_annotated_without_per_row_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            conversations, _ = inbox_page(self.student)
+            rows = [(conv.other_participant.username, conv.last_message_content, conv.unread_count) for conv in conversations]
+        self.assertEqual(len(ctx), 2)
+        self.assertEqual(rows[0], ('teacher24', 'رسالة 24', 1))
+
+
+class ConversationHistoryTests(DhadTestCase):
+    """
+    سجل المحادثة: الصفحة الأولى تحمل أحدث الرسائل فقط، والأقدم تُجلب بمؤشر before_id.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.conversation = Conversation.objects.create(conversation_type='private')
+        cls.conversation.participants.add(cls.teacher, cls.student)
+        cls.messages = Message.objects.bulk_create([
+            Message(conversation=cls.conversation, sender=cls.teacher, content=f'رسالة {i}') for i in range(120)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.student)
+
+    def test_first_paint_loads_only_the_latest_page(self):
+        response = self.client.get(reverse('messaging:conversation_detail', args=[self.conversation.id]))
+        shown = [message.id for message in response.context['conversation_messages']]
+        self.assertEqual(shown, [message.id for message in reversed(self.messages[-50:])])
+        self.assertTrue(response.context['has_older_messages'])
+
+    def test_before_id_walks_back_to_the_first_message(self):
+        url = reverse('messaging:conversation_history', args=[self.conversation.id])
+        loaded = [message.id for message in self.messages[-50:]]
+        has_more = True
+        while has_more:
+            data = self.client.get(url, {'before_id': loaded[0]}).json()
+            loaded = [message['id'] for message in data['messages']] + loaded
+            has_more = data['has_more']
+        self.assertEqual(loaded, [message.id for message in self.messages])
+
+    def test_sending_skips_the_history_page_and_read_cursor(self):
+        url = reverse('messaging:conversation_detail', args=[self.conversation.id])
+        with mock.patch('messaging.views.message_page') as message_page, mock.patch('messaging.views.mark_read') as mark_read:
+            response = self.client.post(url, {'content': 'سؤال'}, headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(response.json()['status'], 'success')
+        message_page.assert_not_called()
+        mark_read.assert_not_called()
+
+    def test_legacy_poll_parameter_is_ignored(self):
+        # الاستطلاع القديم عبر ?last_message_id حلت محله poll_messages وconversation_history
+        url = reverse('messaging:conversation_detail', args=[self.conversation.id])
+        response = self.client.get(url, {'last_message_id': 'abc'}, headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'messaging/conversation_detail.html')
+
+    def test_after_id_returns_newer_messages_in_order(self):
+        url = reverse('messaging:conversation_history', args=[self.conversation.id])
+        data = self.client.get(url, {'after_id': self.messages[-3].id}).json()
+        self.assertEqual([message['id'] for message in data['messages']], [message.id for message in self.messages[-2:]])
+        self.assertFalse(data['has_more'])
+
+
+class ReadStateTests(DhadTestCase):
+    """
+    مؤشرات القراءة: فتح المحادثة يقدّم المؤشر، والعدد الإجمالي يُقرأ من الكاش.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+        cls.conversation = Conversation.objects.create(conversation_type='private')
+        cls.conversation.participants.add(cls.teacher, cls.student)
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                Message.objects.create(conversation=self.conversation, sender=self.teacher, content=f'رسالة {i}')
+
+    def test_opening_the_conversation_clears_the_unread_total(self):
+        self.assertEqual(unread_total(self.student.id), 3)
+        self.assertEqual(unread_total(self.teacher.id), 0)
+
+        self.client.force_login(self.student)
+        self.client.get(reverse('messaging:conversation_detail', args=[self.conversation.id]))
+        self.assertEqual(unread_total(self.student.id), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(conversation=self.conversation, sender=self.teacher, content='جديدة')
+        self.assertEqual(unread_total(self.student.id), 1)
+
+    def test_header_badge_reads_the_cached_total(self):
+        self.client.force_login(self.student)
+        self.client.get(reverse('core:profile'))  # يملأ الكاش
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('core:profile'))
+        self.assertContains(response, '>3</span>')
+        self.assertEqual([query['sql'] for query in ctx if 'messaging_' in query['sql']], [])
+
+    def test_leaving_a_conversation_drops_its_unread_messages(self):
+        self.assertEqual(unread_total(self.student.id), 3)
+        self.conversation.participants.remove(self.student)
+        self.assertEqual(unread_total(self.student.id), 0)
+
+
+class StartConversationTests(DhadTestCase):
+    """
+    بدء محادثة فردية: بحث واحد بالمفتاح الثابت دون تكرار المحادثة.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role='teacher')
+        cls.student = User.objects.create_user('student', role='student')
+
+    def test_both_sides_reach_the_same_conversation(self):
+        self.client.force_login(self.student)
+        self.client.get(reverse('messaging:start_or_get_conversation', args=[self.teacher.id]))
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('messaging:start_or_get_conversation', args=[self.student.id]))
+
+        conversation = Conversation.objects.get()
+        self.assertRedirects(response, reverse('messaging:conversation_detail', args=[conversation.id]), fetch_redirect_response=False)
+        self.assertEqual(conversation.private_key, Conversation.private_key_for(self.teacher.id, self.student.id))
+        self.assertEqual(set(conversation.participants.values_list('id', flat=True)), {self.teacher.id, self.student.id})
+
+    def test_group_conversation_with_same_users_is_not_reused(self):
+        group = Conversation.objects.create(conversation_type='group')
+        group.participants.add(self.teacher, self.student)
+        self.client.force_login(self.student)
+        self.client.get(reverse('messaging:start_or_get_conversation', args=[self.teacher.id]))
+        self.assertEqual(Conversation.objects.filter(conversation_type='private').count(), 1)
@@ -0,0 +1,55 @@
+# messaging/unread.py
+
+from django.core.cache import cache
+from django.db.models import F
+
+from core.cache import get_or_compute
+from .models import ConversationReadState, Message
+
+UNREAD_TOTAL_TIMEOUT = 60 * 60
+
+
+def _unread_total_key(user_id):
+    return f'messaging:unread_total:{user_id}'
+
+
+def ensure_read_states(pairs):
+    """ينشئ مؤشرات القراءة الناقصة لأزواج (conversation_id, user_id) عند إضافة مشاركين."""
+    ConversationReadState.objects.bulk_create(
+        [ConversationReadState(conversation_id=conversation_id, user_id=user_id) for conversation_id, user_id in pairs],
+        ignore_conflicts=True,
+    )
+
+
+def mark_read(conversation_id, user_id, message_id):
+    """
+    يقدّم مؤشر القراءة حتى message_id بعبارة UPDATE واحدة (لا يعود للخلف أبداً).
+    يرجع True إذا تغير المؤشر.
+    """
+    updated = ConversationReadState.objects.filter(
+        conversation_id=conversation_id, user_id=user_id, last_read_message_id__lt=message_id
+    ).update(last_read_message_id=message_id)
+    if updated:
+        invalidate_unread_totals([user_id])
+    return bool(updated)
+
+
+def count_unread(user_id):
+    """عدد الرسائل غير المقروءة للمستخدم في كل محادثاته (استعلام واحد)."""
+    return (
+        Message.objects.filter(
+            conversation__read_states__user_id=user_id,
+            id__gt=F('conversation__read_states__last_read_message_id'),
+        )
+        .exclude(sender_id=user_id)
+        .count()
+    )
+
+
+def unread_total(user_id):
+    """العدد الإجمالي للرسائل غير المقروءة من الكاش؛ يُحسب مرة واحدة بعد كل تغيير."""
+    return get_or_compute(_unread_total_key(user_id), lambda: count_unread(user_id), UNREAD_TOTAL_TIMEOUT, 'messaging:unread_total')
+
+
+def invalidate_unread_totals(user_ids):
+    cache.delete_many([_unread_total_key(user_id) for user_id in user_ids])
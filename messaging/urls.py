@@ -5,6 +5,9 @@ app_name = 'messaging'
 urlpatterns = [
     path('messages/', views.inbox, name='inbox'),
     path('messages/<int:conversation_id>/', views.conversation_detail, name='conversation_detail'),
+    path('messages/<int:conversation_id>/stream/', views.conversation_stream, name='conversation_stream'),
+    path('messages/<int:conversation_id>/poll/', views.poll_messages, name='poll_messages'),
+    path('messages/<int:conversation_id>/history/', views.conversation_history, name='conversation_history'),
     path('messages/start/<int:other_user_id>/', views.start_or_get_conversation, name='start_or_get_conversation'),
     # المسار الجديد لصفحة اختيار المستلم
     path('messages/new/', views.new_conversation_selection, name='new_conversation_selection'),
@@ -1,22 +1,44 @@
 # messaging/views.py
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q # مهم جداً لاستخدام OR في الفلترة
-from django.http import JsonResponse # لاستخدامها في AJAX requests
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger # إذا كنت تخطط لتقسيم الرسائل على صفحات
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse # لاستخدامها في AJAX requests
 
 from .models import Conversation, Message
 from .forms import MessageForm
+from .history import message_page
+from .unread import mark_read
+from .inbox import inbox_page
+from .pubsub import conversation_channel, get_broker, message_payload
+from .watermarks import alatest_message_id, aparticipant_ids
+from core.directory import search_users
 from core.models import User # تأكد من أن هذا الاستيراد صحيح لنموذج المستخدم الخاص بك
+from core.queries import query_budget
+
+# مدة بقاء اتصال SSE مفتوحاً قبل أن يعيد المتصفح الاتصال تلقائياً (بالثواني)
+STREAM_MAX_SECONDS = getattr(settings, 'MESSAGING_STREAM_MAX_SECONDS', 300)
+# فاصل رسائل keep-alive حتى لا تغلق الوسائط (proxies) الاتصال الخامل
+STREAM_HEARTBEAT_SECONDS = getattr(settings, 'MESSAGING_STREAM_HEARTBEAT_SECONDS', 15)
+# المدة التي ينتظرها المتصفح قبل إعادة الاتصال (بالملي ثانية)
+STREAM_RETRY_MS = 3000
+# أقصى عدد رسائل تُعاد في استجابة استطلاع واحدة
+POLL_BATCH_SIZE = 100
 
 
 @login_required
+@query_budget(8)
 def inbox(request):
-    conversations = Conversation.objects.filter(participants=request.user).order_by('-updated_at')
-    for conv in conversations:
-        conv.other_participant = conv.get_other_participant(request.user)
+    conversations, next_cursor = inbox_page(request.user, cursor=request.GET.get('cursor'))
     context = {
         'conversations': conversations,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
     }
     return render(request, 'messaging/inbox.html', context)
 
@@ -26,19 +48,13 @@ def conversation_detail(request, conversation_id):
     conversation = get_object_or_404(Conversation, id=conversation_id)
     
     # التأكد من أن المستخدم الحالي جزء من هذه المحادثة
-    if request.user not in conversation.participants.all():
+    if not conversation.participants.filter(pk=request.user.pk).exists():
         # يمكنك إعادة التوجيه إلى صفحة خطأ أو قائمة المحادثات
         return redirect('messaging:inbox') # أو render(request, 'core/access_denied.html')
 
-    # استرجاع الرسائل مرتبة من الأقدم إلى الأحدث
-    # هذا الترتيب (تصاعدي) يعمل بشكل جيد مع flex-col-reverse في CSS
-    # بحيث تظهر أحدث الرسائل في الأسفل.
-    messages = conversation.messages.all().order_by('timestamp')
-
     form = MessageForm()
-    other_user = conversation.get_other_participant(request.user)
 
-    # معالجة طلبات إرسال الرسائل (POST) أو جلب الرسائل الجديدة (AJAX GET)
+    # معالجة طلبات إرسال الرسائل (POST)؛ الرسائل الجديدة تصل عبر conversation_stream أو poll_messages
     if request.method == 'POST':
         form = MessageForm(request.POST)
         if form.is_valid():
@@ -50,17 +66,9 @@ def conversation_detail(request, conversation_id):
             # إذا كان الطلب AJAX، أعد استجابة JSON
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 # يمكن إضافة المزيد من البيانات هنا مثل is_from_me للواجهة الأمامية
-                return JsonResponse({
-                    'status': 'success',
-                    'message': {
-                        'id': message.id,
-                        'content': message.content,
-                        'timestamp': message.timestamp.isoformat(), # تحويل الوقت لتنسيق ISO
-                        'sender_username': message.sender.username,
-                        'sender_full_name': message.sender.get_full_name() if message.sender.get_full_name() else message.sender.username,
-                        'is_from_me': True, # لأن الرسالة تم إرسالها من المستخدم الحالي
-                    }
-                })
+                data = message_payload(message)
+                data['is_from_me'] = True # لأن الرسالة تم إرسالها من المستخدم الحالي
+                return JsonResponse({'status': 'success', 'message': data})
             # إذا لم يكن AJAX، أعد التوجيه
             return redirect('messaging:conversation_detail', conversation_id=conversation.id)
         else:
@@ -70,52 +78,206 @@ def conversation_detail(request, conversation_id):
                     'status': 'error',
                     'errors': form.errors,
                 }, status=400) # Bad Request
-            
-    elif request.headers.get('x-requested-with') == 'XMLHttpRequest' and 'last_message_id' in request.GET:
-        # هذا الجزء يعالج طلبات AJAX لجلب الرسائل الجديدة (Polling)
-        last_message_id = int(request.GET.get('last_message_id', 0))
-        # جلب الرسائل الأحدث من آخر رسالة يعرفها العميل
-        new_messages = conversation.messages.filter(id__gt=last_message_id).order_by('timestamp')
-        
-        # تحويل الرسائل إلى قائمة من القواميس لسهولة الإرسال كـ JSON
-        messages_data = []
-        for msg in new_messages:
-            messages_data.append({
-                'id': msg.id,
-                'content': msg.content,
-                'timestamp': msg.timestamp.isoformat(), # تحويل الوقت لتنسيق ISO
-                'sender_username': msg.sender.username,
-                'sender_full_name': msg.sender.get_full_name() if msg.sender.get_full_name() else msg.sender.username,
-                'is_from_me': msg.sender == request.user,
-            })
-        return JsonResponse({'messages': messages_data})
+
+    # الصفحة الأولى تحمل أحدث HISTORY_PAGE_SIZE رسالة فقط مهما طالت المحادثة،
+    # والأقدم تُحمّل عند التمرير عبر conversation_history.
+    # تُعرض من الأحدث للأقدم في الـ DOM، ومع flex-col-reverse في CSS تظهر أحدث الرسائل في الأسفل.
+    messages, has_older_messages = message_page(conversation.id)
+    messages.reverse()
+    if messages:
+        # فتح المحادثة يعني قراءة كل ما فيها: تحديث واحد لمؤشر القراءة
+        mark_read(conversation.id, request.user.id, messages[0].id)
 
     context = {
         'conversation': conversation,
-        'conversation_messages': messages, # هنا يكون الترتيب من الأقدم للأحدث
+        'conversation_messages': messages, # هنا يكون الترتيب من الأحدث للأقدم
+        'has_older_messages': has_older_messages,
         'form': form,
-        'other_user': other_user,
+        'other_user': conversation.get_other_participant(request.user),
     }
     return render(request, 'messaging/conversation_detail.html', context)
 
 
+def _parse_message_id(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+
+@login_required
+def conversation_history(request, conversation_id):
+    """
+    صفحة JSON من سجل المحادثة: ?before_id=<id> للرسائل الأقدم أو ?after_id=<id> للأحدث.
+    """
+    is_participant = Conversation.participants.through.objects.filter(
+        conversation_id=conversation_id, user_id=request.user.id
+    ).exists()
+    if not is_participant:
+        return HttpResponseForbidden()
+
+    messages, has_more = message_page(
+        conversation_id,
+        before_id=_parse_message_id(request.GET.get('before_id')),
+        after_id=_parse_message_id(request.GET.get('after_id')),
+    )
+    messages_data = []
+    for message in messages:
+        data = message_payload(message)
+        data['is_from_me'] = message.sender_id == request.user.id
+        messages_data.append(data)
+    return JsonResponse({'messages': messages_data, 'has_more': has_more})
+
+
+def _sse_event(payload):
+    return f"id: {payload['id']}\nevent: message\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _messages_after(conversation_id, last_id):
+    return Message.objects.filter(conversation_id=conversation_id, id__gt=last_id).select_related('sender').order_by('id')
+
+
+async def _message_stream(conversation_id, last_id):
+    """
+    مولّد SSE: يشترك في قناة المحادثة أولاً، ثم يرسل ما فات العميل منذ last_id
+    (إعادة الاتصال عبر Last-Event-ID)، ثم يدفع الرسائل الجديدة فور نشرها.
+    الناشر داخل العملية لا يرى رسائل حُفظت في عامل (worker) آخر، فعند كل نبضة keep-alive
+    تُقارن علامة المد المشتركة في الكاش بآخر رسالة مرسلة ويُرسل الفرق من قاعدة البيانات.
+    """
+    deadline = time.monotonic() + STREAM_MAX_SECONDS
+    # الاشتراك قبل قراءة الرسائل الفائتة حتى لا تضيع رسالة بين الخطوتين
+    async with get_broker().subscribe(conversation_channel(conversation_id)) as subscription:
+        yield f'retry: {STREAM_RETRY_MS}\n\n'
+
+        async for message in _messages_after(conversation_id, last_id):
+            payload = message_payload(message)
+            last_id = payload['id']
+            yield _sse_event(payload)
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            payload = await subscription.get(timeout=min(STREAM_HEARTBEAT_SECONDS, remaining))
+            if payload is not None:
+                if payload['id'] > last_id:
+                    last_id = payload['id']
+                    yield _sse_event(payload)
+            elif await alatest_message_id(conversation_id) > last_id:
+                async for message in _messages_after(conversation_id, last_id):
+                    payload = message_payload(message)
+                    last_id = payload['id']
+                    yield _sse_event(payload)
+            else:
+                yield ': keep-alive\n\n'
+
+
+@login_required
+async def conversation_stream(request, conversation_id):
+    """
+    قناة Server-Sent Events تدفع رسائل المحادثة الجديدة للمشاركين فور إرسالها.
+    تعمل فقط تحت خادم ASGI (انظر DhadPlatform/asgi.py)؛ تحت WSGI نرجع 204
+    فيتوقف EventSource وتعود الواجهة إلى الاستطلاع الدوري.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    if user.id not in await aparticipant_ids(conversation_id):
+        return HttpResponseForbidden()
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('after') or 0
+    try:
+        last_id = int(last_event_id)
+    except (TypeError, ValueError):
+        last_id = 0
+
+    response = StreamingHttpResponse(_message_stream(conversation_id, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # منع nginx من تخزين الاستجابة مؤقتاً
+    return response
+
+
+def _poll_etag(conversation_id, latest_id):
+    return f'"conv-{conversation_id}-{latest_id}"'
+
+
+@login_required
+async def poll_messages(request, conversation_id):
+    """
+    استطلاع طويل (long-poll) للرسائل الجديدة بعد ?after=<id>.
+    يُجاب "لا جديد" من علامة المد المخزنة في الكاش دون أي استعلام على Message
+    أو participants: 304 إذا طابق If-None-Match، وإلا قائمة فارغة.
+    تحت ASGI يبقى الطلب معلقاً حتى MESSAGING_POLL_TIMEOUT ثانية بانتظار رسالة جديدة؛
+    تحت WSGI يُجاب فوراً حتى لا يُحجز عامل كامل.
+    """
+    user = await request.auser()
+    if user.id not in await aparticipant_ids(conversation_id):
+        return HttpResponseForbidden()
+
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        after = 0
+
+    latest_id = await alatest_message_id(conversation_id)
+    hold_seconds = getattr(settings, 'MESSAGING_POLL_TIMEOUT', 25) if isinstance(request, ASGIRequest) else 0
+    if latest_id <= after and hold_seconds > 0:
+        async with get_broker().subscribe(conversation_channel(conversation_id)) as subscription:
+            # إعادة الفحص بعد الاشتراك حتى لا تضيع رسالة نُشرت بين الخطوتين
+            latest_id = await alatest_message_id(conversation_id)
+            if latest_id <= after:
+                event = await subscription.get(timeout=hold_seconds)
+                if event is not None:
+                    latest_id = max(latest_id, event['id'])
+                else:
+                    # رسالة حُفظت في عامل آخر لا تصل عبر الناشر داخل العملية، لكنها ترفع علامة المد المشتركة
+                    latest_id = await alatest_message_id(conversation_id)
+
+    etag = _poll_etag(conversation_id, latest_id)
+    if latest_id <= after:
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=304)
+        else:
+            response = JsonResponse({'messages': [], 'last_id': latest_id})
+        response['ETag'] = etag
+        return response
+
+    new_messages = _messages_after(conversation_id, after)[:POLL_BATCH_SIZE]
+    messages_data = []
+    async for message in new_messages:
+        data = message_payload(message)
+        data['is_from_me'] = message.sender_id == user.id
+        messages_data.append(data)
+
+    last_id = messages_data[-1]['id'] if messages_data else after
+    if messages_data:
+        # الرسائل وصلت لصفحة محادثة مفتوحة، فهي مقروءة
+        await sync_to_async(mark_read)(conversation_id, user.id, last_id)
+    response = JsonResponse({'messages': messages_data, 'last_id': last_id})
+    response['ETag'] = _poll_etag(conversation_id, last_id)
+    return response
+
+
 @login_required
 def start_or_get_conversation(request, other_user_id):
     other_user = get_object_or_404(User, id=other_user_id)
     if request.user == other_user:
         return redirect('messaging:inbox')
 
-    conversation = Conversation.objects.filter(
-        conversation_type='private',
-        participants=request.user
-    ).filter(
-        participants=other_user
-    ).first()
-
-    if not conversation:
-        conversation = Conversation.objects.create(conversation_type='private')
-        conversation.participants.add(request.user, other_user)
-        conversation.save()
+    # بحث واحد على الفهرس الفريد private_key بدلاً من ربط participants مرتين،
+    # وget_or_create داخل معاملة يمنع إنشاء محادثتين عند نقرتين متزامنتين
+    private_key = Conversation.private_key_for(request.user.id, other_user.id)
+    try:
+        with transaction.atomic():
+            conversation, created = Conversation.objects.get_or_create(
+                private_key=private_key, defaults={'conversation_type': 'private'}
+            )
+            if created:
+                conversation.participants.add(request.user, other_user)
+    except IntegrityError:
+        # طلب متزامن أنشأ المحادثة نفسها قبلنا
+        conversation = Conversation.objects.get(private_key=private_key)
 
     return redirect('messaging:conversation_detail', conversation_id=conversation.id)
 
@@ -134,20 +296,11 @@ def new_conversation_selection(request):
 
     search_query = request.GET.get('q')
     if search_query:
-        # تطبيق البحث على كل من المعلمين والمسؤولين بشكل منفصل
-        # ******** التعديل الرئيسي هنا: استخدام 'first_name', 'last_name' في Q object للبحث ********
-        teachers = teachers.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query)
-        )
-        admins = admins.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query)
-        )
+        # بحث مرتب ومحدود في دليل المستخدمين (أسماء موحدة الحروف العربية + مقاطع ثلاثية)
+        # بدلاً من icontains على أربعة حقول لكل دور
+        results = search_users(search_query, roles=('teacher', 'admin'), exclude_user_id=request.user.id)
+        teachers = [user for user in results if user.role == 'teacher']
+        admins = [user for user in results if user.role == 'admin']
 
     context = {
         'teachers': teachers,
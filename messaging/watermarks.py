@@ -0,0 +1,63 @@
+# messaging/watermarks.py
+
+from django.core.cache import cache
+from django.db.models import Max
+
+from .models import Conversation, Message
+
+# تُحدَّث علامة المد عند كل رسالة جديدة؛ المهلة القصيرة تحد من أثر أي سباق نادر
+# بين كاتبين متزامنين (تُعاد قراءتها من قاعدة البيانات مرة كل دقيقة على الأكثر)
+WATERMARK_TIMEOUT = 60
+# قائمة المشاركين تُحذف صراحة عند تغييرها عبر m2m_changed
+PARTICIPANTS_TIMEOUT = 60 * 60
+
+
+def _latest_id_key(conversation_id):
+    return f'messaging:latest_message_id:{conversation_id}'
+
+
+def _participants_key(conversation_id):
+    return f'messaging:participants:{conversation_id}'
+
+
+def set_latest_message_id(conversation_id, message_id):
+    """يرفع "علامة المد" (آخر معرف رسالة) للمحادثة في الكاش بعد حفظ رسالة جديدة."""
+    key = _latest_id_key(conversation_id)
+    if message_id > (cache.get(key) or 0):
+        cache.set(key, message_id, WATERMARK_TIMEOUT)
+
+
+async def alatest_message_id(conversation_id):
+    """آخر معرف رسالة في المحادثة من الكاش؛ استعلام Max واحد فقط عند عدم وجوده."""
+    latest_id = await cache.aget(_latest_id_key(conversation_id))
+    if latest_id is None:
+        result = await Message.objects.filter(conversation_id=conversation_id).aaggregate(latest=Max('id'))
+        latest_id = result['latest'] or 0
+        await cache.aadd(_latest_id_key(conversation_id), latest_id, WATERMARK_TIMEOUT)
+    return latest_id
+
+
+def _participants_queryset(conversation_id):
+    return Conversation.participants.through.objects.filter(conversation_id=conversation_id).values_list('user_id', flat=True)
+
+
+def participant_ids(conversation_id):
+    """معرفات المشاركين في المحادثة كمجموعة مخزنة في الكاش."""
+    ids = cache.get(_participants_key(conversation_id))
+    if ids is None:
+        ids = frozenset(_participants_queryset(conversation_id))
+        cache.set(_participants_key(conversation_id), ids, PARTICIPANTS_TIMEOUT)
+    return ids
+
+
+async def aparticipant_ids(conversation_id):
+    """النسخة غير المتزامنة من participant_ids."""
+    ids = await cache.aget(_participants_key(conversation_id))
+    if ids is None:
+        ids = frozenset([user_id async for user_id in _participants_queryset(conversation_id)])
+        await cache.aset(_participants_key(conversation_id), ids, PARTICIPANTS_TIMEOUT)
+    return ids
+
+
+def invalidate_participants(conversation_ids):
+    cache.delete_many([_participants_key(conversation_id) for conversation_id in conversation_ids])
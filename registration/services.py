@@ -0,0 +1,147 @@
+# registration/services.py
+
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.directory import index_users
+from core.models import User
+from core.tasks import account_email_payload, enqueue_account_emails
+from dashboard.metrics import invalidate_metrics
+from .models import RegistrationRequest
+
+APPROVAL_EMAIL_SUBJECT = 'تمت الموافقة على طلب تسجيلك في منصة ضاد التعليمية!'
+
+# نتائج معالجة كل طلب
+APPROVED = 'approved'
+ALREADY_APPROVED = 'already_approved'
+NOT_PENDING = 'not_pending'
+EMAIL_TAKEN = 'email_taken'
+FAILED = 'failed'
+
+
+@dataclass
+class ApprovalResult:
+    request_id: int
+    full_name: str
+    email: str
+    outcome: str
+    message: str
+    user_id: int = None
+
+
+def split_full_name(full_name):
+    parts = (full_name or '').split(' ')
+    return parts[0], ' '.join(parts[1:])
+
+
+def _approval_email(req, user, site_url, mode):
+    return account_email_payload(user, APPROVAL_EMAIL_SUBJECT, 'registration/approved_student_email.html', {
+        'student_name': req.full_name,
+        'email': req.email,
+        'login_link': site_url + settings.LOGIN_URL,
+    }, mode=mode, site_url=site_url)
+
+
+def approve_requests(request_ids, site_url='', mode=None):
+    """
+    الموافقة على دفعة من طلبات التسجيل وإنشاء حسابات الطلاب:
+    - فحص البريد الإلكتروني لكل الدفعة باستعلام واحد.
+    - إنشاء المستخدمين بلا كلمة مرور بـ bulk_create وتحديث الطلبات بـ bulk_update في معاملة واحدة.
+    - إضافة إشعارات البريد إلى طابور المهام الخلفية. بيانات الدخول (رابط تفعيل لمرة واحدة،
+      أو كلمة مرور مولدة في mode='password') يُنشئها عامل المهام عند الإرسال، فلا تُشفَّر
+      كلمات مرور أثناء الطلب ولا تُخزن في طابور المهام.
+    يرجع قائمة ApprovalResult بنتيجة كل طلب.
+    """
+    requests = list(RegistrationRequest.objects.filter(pk__in=request_ids).order_by('pk'))
+    results = {}
+    pending = []
+    for req in requests:
+        if req.status == 'approved':
+            results[req.pk] = ApprovalResult(
+                req.pk, req.full_name, req.email, ALREADY_APPROVED,
+                f'طلب التسجيل من {req.full_name} ({req.email}) تمت الموافقة عليه مسبقاً.',
+            )
+        elif req.status != 'pending':
+            results[req.pk] = ApprovalResult(
+                req.pk, req.full_name, req.email, NOT_PENDING,
+                f'طلب التسجيل من {req.full_name} ليس "قيد الانتظار" ({req.get_status_display()}).',
+            )
+        else:
+            pending.append(req)
+
+    emails = [req.email for req in pending]
+    taken = set()
+    for email, username in User.objects.filter(Q(email__in=emails) | Q(username__in=emails)).values_list('email', 'username'):
+        taken.update((email, username))
+
+    candidates = []
+    for req in pending:
+        if req.email in taken:
+            results[req.pk] = ApprovalResult(
+                req.pk, req.full_name, req.email, EMAIL_TAKEN,
+                f'فشل إنشاء حساب للطالب {req.full_name}: يوجد مستخدم بالفعل بهذا البريد الإلكتروني ({req.email}).',
+            )
+        else:
+            candidates.append(req)
+
+    users = []
+    for req in candidates:
+        first_name, last_name = split_full_name(req.full_name)
+        users.append(User(
+            username=req.email,
+            email=req.email,
+            role='student',
+            is_active=True,
+            first_name=first_name,
+            last_name=last_name,
+            phone_number=req.whatsapp_number,
+            country=req.country,
+        ))
+    for user in users:
+        user.set_unusable_password()
+
+    try:
+        with transaction.atomic():
+            # إعادة التحقق من الحالة داخل المعاملة: قد يكون طلب ما عولج بالتوازي
+            still_pending = set(
+                RegistrationRequest.objects.select_for_update()
+                .filter(pk__in=[req.pk for req in candidates], status='pending').values_list('pk', flat=True)
+            )
+            batch = [(req, user) for req, user in zip(candidates, users) if req.pk in still_pending]
+            for req in candidates:
+                if req.pk not in still_pending:
+                    results[req.pk] = ApprovalResult(
+                        req.pk, req.full_name, req.email, NOT_PENDING,
+                        f'طلب التسجيل من {req.full_name} عولج من قبل مشرف آخر.',
+                    )
+
+            User.objects.bulk_create([user for _, user in batch])
+            approved_at = timezone.now()
+            for req, user in batch:
+                req.status = 'approved'
+                req.approved_at = approved_at
+                req.user = user
+            RegistrationRequest.objects.bulk_update([req for req, _ in batch], ['status', 'approved_at', 'user'])
+
+            # bulk_create وbulk_update لا يطلقان إشارات الحفظ
+            index_users([user for _, user in batch])
+            transaction.on_commit(invalidate_metrics)
+            # الإشعارات تُضاف إلى طابور المهام داخل المعاملة نفسها، ويرسلها العامل run_jobs
+            enqueue_account_emails([_approval_email(req, user, site_url, mode) for req, user in batch])
+    except IntegrityError as e:
+        for req, _ in batch:
+            results[req.pk] = ApprovalResult(
+                req.pk, req.full_name, req.email, FAILED, f'فشل معالجة طلب {req.full_name} ({req.email}): {e}',
+            )
+    else:
+        for req, user in batch:
+            results[req.pk] = ApprovalResult(
+                req.pk, req.full_name, req.email, APPROVED,
+                f'تمت الموافقة على طلب {req.full_name} وتم إنشاء حسابه بنجاح.', user_id=user.pk,
+            )
+
+    return [results[req.pk] for req in requests]
@@ -1,3 +1,84 @@
-from django.test import TestCase
+# registration/tests.py
+import re
+from datetime import date
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.core import mail
+from django.core.management import call_command
+from django.test import override_settings
+
+from core.directory import search_users
+from core.models import User
+from core.tasks import SEND_ACCOUNT_EMAIL
+from core.testing import DhadTestCase
+from jobs.models import Job
+from .models import RegistrationRequest
+from .services import ALREADY_APPROVED, APPROVED, EMAIL_TAKEN, approve_requests
+
+
+def make_request(email, full_name='سارة أحمد', status='pending'):
+    return RegistrationRequest.objects.create(
+        full_name=full_name, date_of_birth=date(2010, 1, 1), gender='female', country='سوريا',
+        study_level='ابتدائي', program='عام', grade='الأول', arabic_level='مبتدئ',
+        native_language='العربية', email=email, whatsapp_number='000', status=status,
+    )
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BatchApprovalTests(DhadTestCase):
+    def test_batch_approval_reports_each_row(self):
+        User.objects.create_user('taken@example.com', email='taken@example.com')
+        fresh = [make_request(f's{i}@example.com', full_name=f'طالب رقم {i}') for i in range(3)]
+        taken = make_request('taken@example.com')
+        done = make_request('done@example.com', status='approved')
+
+        results = approve_requests([req.pk for req in fresh] + [taken.pk, done.pk])
+
+        outcomes = {result.request_id: result.outcome for result in results}
+        self.assertEqual(outcomes, {
+            **{req.pk: APPROVED for req in fresh}, taken.pk: EMAIL_TAKEN, done.pk: ALREADY_APPROVED,
+        })
+        self.assertEqual(Job.objects.filter(task=SEND_ACCOUNT_EMAIL).count(), 3)
+
+        req = RegistrationRequest.objects.select_related('user').get(pk=fresh[0].pk)
+        self.assertEqual(req.status, 'approved')
+        self.assertIsNotNone(req.approved_at)
+        self.assertEqual((req.user.role, req.user.first_name, req.user.last_name), ('student', 'طالب', 'رقم 0'))
+        # المستخدمون المنشأون دفعة واحدة يدخلون فهرس البحث
+        self.assertIn(req.user, search_users('طالب', ['student']))
+
+    def test_notification_queued_with_activation_link(self):
+        req = make_request('notify@example.com')
+        approve_requests([req.pk], site_url='http://testserver')
+        # لا يُرسل شيء أثناء الطلب؛ الإشعار ينتظر في طابور المهام
+        self.assertEqual(mail.outbox, [])
+        user = User.objects.get(email='notify@example.com')
+        payload = Job.objects.get(task=SEND_ACCOUNT_EMAIL).payload
+        self.assertEqual((payload['user_id'], payload['mode']), (user.pk, 'activation'))
+        # رابط التفعيل لا يُخزن في طابور المهام
+        self.assertNotIn('/activate/', str(payload))
+        self.assertFalse(user.has_usable_password())
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        link = re.search(r'http://testserver(/activate/\S+/)', mail.outbox[0].body).group(1)
+
+        response = self.client.post(link, {'new_password1': 'Dhad-Student-2026', 'new_password2': 'Dhad-Student-2026'})
+        self.assertRedirects(response, '/login/', fetch_redirect_response=False)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('Dhad-Student-2026'))
+        # الرابط صالح لمرة واحدة
+        self.assertFalse(self.client.get(link).context['validlink'])
+
+    def test_password_mode_emails_working_password(self):
+        req = make_request('notify@example.com')
+        approve_requests([req.pk], mode='password')
+        # كلمة المرور تُولد وتُشفَّر في العامل عند الإرسال، لا أثناء الموافقة ولا في payload
+        user = User.objects.get(email='notify@example.com')
+        self.assertFalse(user.has_usable_password())
+        self.assertNotIn('password', Job.objects.get(task=SEND_ACCOUNT_EMAIL).payload['context'])
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+        password = re.search(r'المؤقتة التالية:\s*(\w+)', mail.outbox[0].body).group(1)
+        self.assertTrue(check_password(password, User.objects.get(email='notify@example.com').password))